@@ -0,0 +1,343 @@
+import csv
+import hashlib
+import json
+import os
+
+# Name of the cache of fit results inside an analyzed directory
+CACHE_FILENAME = ".pythondaq_analysis.json"
+
+# Version of the cache format, a cache with another version is ignored
+CACHE_VERSION = 2
+
+# Columns of the summary table
+SUMMARY_COLUMNS = [
+    "file",
+    "points",
+    "I_s (A)",
+    "SE_I_s (A)",
+    "V_t (V)",
+    "SE_V_t (V)",
+    "n",
+    "SE_n",
+    "k (J/K)",
+    "chi2_red",
+    "success",
+    "error",
+]
+
+
+def file_hash(filepath):
+    """Return the SHA-256 hash of the content of a file.
+
+    Args:
+        filepath (str): path of the file
+
+    Returns:
+        str: hexadecimal hash
+    """
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as hashed_file:
+        for block in iter(lambda: hashed_file.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def failed_row(error, points=None):
+    """Return the row of the summary table of a scan that could not be read or fitted.
+
+    Args:
+        error (Exception): reason the scan was not fitted
+        points (int): amount of points of the scan, None if it could not be read
+
+    Returns:
+        dict: the columns of the summary table except file, with only points, success and error filled in
+    """
+    row = dict.fromkeys(SUMMARY_COLUMNS[1:])
+    row["points"] = points
+    row["success"] = False
+    row["error"] = str(error) or type(error).__name__
+    return row
+
+
+def analyze_file(filepath, fit_ideality=False, temperature=300):
+    """Fit the Shockley diode formula to a saved scan.
+
+    Args:
+        filepath (str): path of the .csv file
+        fit_ideality (bool): fit the ideality factor n with V_t fixed at kT/q
+        temperature (float): temperature of the LED in Kelvin
+
+    Raises:
+        OSError: if the file cannot be read, which may work another time
+
+    Returns:
+        dict: the columns of the summary table except file, the error is filled in if the content of the file cannot be decoded or fitted
+    """
+    from pythondaq.data_writer import read_points
+    from pythondaq.fitting import FitError, fit_shockley
+
+    row = dict.fromkeys(SUMMARY_COLUMNS[1:])
+
+    # Content that cannot be decoded or fitted is reported in its row, so the other files are still fitted
+    try:
+        voltages, currents, _, errors_currents, _ = read_points(filepath)
+        row["points"] = len(voltages)
+        fit = fit_shockley(
+            voltages, currents, errors_currents, fit_ideality, temperature
+        )
+    except (FitError, UnicodeDecodeError, ValueError) as error:
+        return failed_row(error, row["points"])
+
+    row.update(
+        {
+            "I_s (A)": fit.saturation_current,
+            "SE_I_s (A)": fit.errors.get("saturation_current"),
+            "V_t (V)": fit.thermal_voltage,
+            "SE_V_t (V)": fit.errors.get("thermal_voltage"),
+            "n": fit.ideality,
+            "SE_n": fit.errors.get("ideality"),
+            # k follows from V_t, which is fixed at kT/q when n is fitted
+            "k (J/K)": None if fit_ideality else fit.boltzmann_constant(temperature),
+            "chi2_red": fit.reduced_chi_square,
+            "success": bool(fit.success),
+        }
+    )
+    return row
+
+
+def _analyze_job(filepath, fit_ideality, temperature):
+    """Fit a saved scan in a worker process, reporting a file that cannot be read in its row.
+
+    Args:
+        filepath (str): path of the .csv file
+        fit_ideality (bool): fit the ideality factor n with V_t fixed at kT/q
+        temperature (float): temperature of the LED in Kelvin
+
+    Returns:
+        tuple: the columns of the summary table except file (dict), and whether the row may be cached (bool)
+    """
+    try:
+        return analyze_file(filepath, fit_ideality, temperature), True
+    except OSError as error:
+        return failed_row(error), False
+
+
+class AnalysisCache:
+    """Fit results of the scans in a directory, keyed by the hash of their content and the fit settings.
+
+    The hash of every file is stored together with its size and modification
+    time, so unchanged files are not read again. A file that was renamed or
+    copied keeps its fit, a changed file is fitted again.
+
+    Attributes:
+    path (str): JSON file the cache is stored in
+
+    Methods:
+    hash(filepath)
+    get(content_hash, fit_ideality, temperature)
+    put(content_hash, fit_ideality, temperature, row)
+    save(filepaths)
+    """
+
+    def __init__(self, path):
+        """Read the cache, an unreadable cache is started anew.
+
+        Args:
+            path (str): JSON file the cache is stored in
+        """
+        self.path = path
+        self._files = {}
+        self._fits = {}
+        if os.path.isfile(path):
+            try:
+                with open(path) as cache_file:
+                    data = json.load(cache_file)
+                if data.get("version") == CACHE_VERSION:
+                    self._files = data["files"]
+                    self._fits = data["fits"]
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def hash(self, filepath):
+        """Return the hash of the content of a file, only reading it if it changed.
+
+        Args:
+            filepath (str): path of the file
+
+        Returns:
+            str: hexadecimal hash
+        """
+        status = os.stat(filepath)
+        name = os.path.basename(filepath)
+        known = self._files.get(name)
+        if (
+            known is not None
+            and known["size"] == status.st_size
+            and known["mtime"] == status.st_mtime_ns
+        ):
+            return known["hash"]
+        content_hash = file_hash(filepath)
+        self._files[name] = {
+            "size": status.st_size,
+            "mtime": status.st_mtime_ns,
+            "hash": content_hash,
+        }
+        return content_hash
+
+    @staticmethod
+    def _key(content_hash, fit_ideality, temperature):
+        """Combine a hash with the fit settings.
+
+        Args:
+            content_hash (str): hash of the content of a file
+            fit_ideality (bool): whether n is fitted
+            temperature (float): temperature of the LED in Kelvin
+
+        Returns:
+            str: key of the fit in the cache
+        """
+        return f"{content_hash}:{'n' if fit_ideality else 'V_t'}:{float(temperature)}"
+
+    def get(self, content_hash, fit_ideality, temperature):
+        """Look up a fit.
+
+        Args:
+            content_hash (str): hash of the content of a file
+            fit_ideality (bool): whether n is fitted
+            temperature (float): temperature of the LED in Kelvin
+
+        Returns:
+            dict: row of the summary table without file, None if the file was not fitted with these settings
+        """
+        return self._fits.get(self._key(content_hash, fit_ideality, temperature))
+
+    def put(self, content_hash, fit_ideality, temperature, row):
+        """Store a fit.
+
+        Args:
+            content_hash (str): hash of the content of a file
+            fit_ideality (bool): whether n is fitted
+            temperature (float): temperature of the LED in Kelvin
+            row (dict): row of the summary table without file
+        """
+        self._fits[self._key(content_hash, fit_ideality, temperature)] = row
+
+    def save(self, filepaths):
+        """Write the cache, forgetting files that no longer exist and fits of content that is gone.
+
+        Args:
+            filepaths (list of str): paths of the files that are in the directory now
+        """
+        names = {os.path.basename(filepath) for filepath in filepaths}
+        self._files = {
+            name: known for name, known in self._files.items() if name in names
+        }
+        hashes = {known["hash"] for known in self._files.values()}
+        self._fits = {
+            key: row
+            for key, row in self._fits.items()
+            if key.split(":", 1)[0] in hashes
+        }
+
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as cache_file:
+            json.dump(
+                {"version": CACHE_VERSION, "files": self._files, "fits": self._fits},
+                cache_file,
+            )
+        os.replace(temporary_path, self.path)
+
+
+def analyze_directory(
+    directory, fit_ideality=False, temperature=300, workers=None, summary_path=None
+):
+    """Fit every saved scan in a directory, fitting only new or changed files in a process pool.
+
+    Args:
+        directory (str): directory with .csv files
+        fit_ideality (bool): fit the ideality factor n with V_t fixed at kT/q
+        temperature (float): temperature of the LEDs in Kelvin
+        workers (int): amount of processes, the amount of cores if not given
+        summary_path (str): path the summary table is written to, which is not analyzed when it is in directory
+
+    Returns:
+        tuple: rows of the summary table in file name order (list of dict), and the amount of files that were not taken from the cache
+    """
+    from pythondaq.data_writer import list_scans
+
+    filepaths = list_scans(directory, [summary_path] if summary_path else ())
+    cache = AnalysisCache(os.path.join(directory, CACHE_FILENAME))
+    # Files that cannot be read are reported but not cached, reading them may work next time
+    hashes = {}
+    unreadable = {}
+    unreadable_contents = {}
+    for filepath in filepaths:
+        try:
+            hashes[filepath] = cache.hash(filepath)
+        except OSError as error:
+            unreadable[filepath] = failed_row(error)
+
+    # Files with the same content are fitted once
+    jobs = {}
+    for filepath, content_hash in hashes.items():
+        if cache.get(content_hash, fit_ideality, temperature) is None:
+            jobs.setdefault(content_hash, filepath)
+
+    if len(jobs) > 1 and workers != 1:
+        from concurrent.futures import ProcessPoolExecutor
+        from itertools import repeat
+
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Several small files per task, so starting a task costs less than fitting it
+            outcomes = list(
+                executor.map(
+                    _analyze_job,
+                    jobs.values(),
+                    repeat(fit_ideality),
+                    repeat(temperature),
+                    chunksize=max(1, len(jobs) // (4 * workers)),
+                )
+            )
+    else:
+        outcomes = [
+            _analyze_job(filepath, fit_ideality, temperature)
+            for filepath in jobs.values()
+        ]
+    for content_hash, (row, cacheable) in zip(jobs, outcomes):
+        if cacheable:
+            cache.put(content_hash, fit_ideality, temperature, row)
+        else:
+            unreadable_contents[content_hash] = row
+    cache.save(filepaths)
+
+    def summary_row(filepath):
+        """Row of the summary table of a file without its name."""
+        if filepath in unreadable:
+            return unreadable[filepath]
+        content_hash = hashes[filepath]
+        if content_hash in unreadable_contents:
+            return unreadable_contents[content_hash]
+        return cache.get(content_hash, fit_ideality, temperature)
+
+    summary = [
+        {"file": os.path.basename(filepath), **summary_row(filepath)}
+        for filepath in filepaths
+    ]
+    return summary, len(jobs) + len(unreadable)
+
+
+def write_summary(summary, path):
+    """Write the summary table to a .csv file.
+
+    Args:
+        summary (list of dict): rows of the summary table
+        path (str): path of the .csv file
+    """
+    with open(path, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, SUMMARY_COLUMNS)
+        writer.writeheader()
+        for row in summary:
+            writer.writerow(
+                {key: "" if value is None else value for key, value in row.items()}
+            )
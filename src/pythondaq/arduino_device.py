@@ -1,15 +1,131 @@
-import pyvisa
+import atexit
+import contextlib
+import re
+import threading
+import time
+
+from pythondaq.profiling import active_profile, command_kind, stage
+from pythondaq.simulated_device import (
+    is_simulated_port,
+    open_simulated_resource,
+    simulated_ports,
+)
+
+# ResourceManager shared by every device and resource listing in this process
+_resource_manager = None
+
+# First firmware version that answers SYST:CAP? with the commands it supports,
+# older firmware is never sent the query
+CAPABILITY_FIRMWARE = (1, 1)
+
+# Most repeats asked in a single MEAS:BULK? command, about 600 bytes of answer
+BULK_MAX_REPEATS = 64
+
+
+def get_resource_manager():
+    """Return the process-wide pyvisa-py ResourceManager, creating it on first use.
+
+    Returns:
+        pyvisa.ResourceManager: shared resource manager
+    """
+    global _resource_manager
+    if _resource_manager is None:
+        # pyvisa takes long to import, so only when a real device is used
+        import pyvisa
+
+        _resource_manager = pyvisa.ResourceManager("@py")
+    return _resource_manager
+
+
+def is_connection_error(error):
+    """Check whether an error means the connection to a device failed.
+
+    Args:
+        error (Exception): raised error
+
+    Returns:
+        bool: True for VISA I/O errors and OS errors
+    """
+    import pyvisa
+
+    return isinstance(error, (pyvisa.errors.VisaIOError, OSError))
+
+
+def firmware_version(identification):
+    """Read the firmware version from an identification string.
+
+    Args:
+        identification (str): answer to *IDN?, like "Arduino VISA firmware v1.1.0"
+
+    Returns:
+        tuple of int: major and minor version, (0, 0) if there is none
+    """
+    match = re.search(r"v(\d+)\.(\d+)", identification)
+    if match is None:
+        return (0, 0)
+    return int(match.group(1)), int(match.group(2))
+
+
+def parse_capabilities(answer=None):
+    """Return the optional commands a firmware supports.
+
+    Args:
+        answer (str): answer to SYST:CAP?, None if the firmware is too old to ask
+
+    Returns:
+        frozenset of str: supported optional commands, like MEAS:BULK
+    """
+    if answer is None:
+        return frozenset()
+    return frozenset(
+        capability.strip() for capability in answer.split(",") if capability.strip()
+    )
+
+
+def measure_commands(repeats, bulk=False):
+    """Build the commands that measure channels 2 and 1 repeatedly.
+
+    Args:
+        repeats (int): amount of measurements per channel
+        bulk (bool): use MEAS:BULK?, which measures both channels several times per command
+
+    Returns:
+        list of str: commands, their answers are read by split_measurements
+    """
+    if not bulk:
+        return ["MEAS:CH2?", "MEAS:CH1?"] * repeats
+    return [
+        f"MEAS:BULK? {min(BULK_MAX_REPEATS, repeats - done)}"
+        for done in range(0, repeats, BULK_MAX_REPEATS)
+    ]
+
+
+def split_measurements(answers, bulk=False):
+    """Turn the answers to measure_commands into alternating ADC values of channel 2 and 1.
+
+    Args:
+        answers (list of str): answers to the commands of measure_commands
+        bulk (bool): whether the commands used MEAS:BULK?
+
+    Returns:
+        list of str: ADC values, channel 2 first
+    """
+    if not bulk:
+        return answers
+    return [value for answer in answers for value in answer.split(",")]
 
 
 def list_resources():
     """Retrieves and returns a list of connected resources.
 
+    The simulated Arduinos are added to the list when the simulation is enabled.
+
     Returns:
         list: contains connected resources
     """
-    rm = pyvisa.ResourceManager("@py")
+    rm = get_resource_manager()
     connected_ports = rm.list_resources()
-    return connected_ports
+    return (*connected_ports, *simulated_ports())
 
 
 class ArduinoVisaDevice:
@@ -18,26 +134,64 @@ class ArduinoVisaDevice:
 
     Attributes:
     port (str): port to which the arduino is connected
+    pipelined (bool): send batches of commands before reading the answers
+    batch_size (int): maximum amount of commands sent before reading answers
+    bulk (bool): measure with MEAS:BULK?, None to use it when the firmware supports it
 
 
     Methods:
+    query(command)
     get_identification()
+    capabilities()
+    supports_bulk()
     set_output_value(value)
     get_output_value()
     get_input_value(channel)
     get_input_voltage(channel)
+    query_batch(commands)
+    set_output_and_measure(value, repeats)
+    set_output_and_measure_raw(value, repeats)
+    measure_input_voltages(repeats)
+    close()
     """
 
-    def __init__(self, port):
+    def __init__(self, port, pipelined=True, batch_size=6, bulk=None):
         """Initialize the arduino and make it callable for the rest of the class.
 
+        The Arduino has a 64 byte serial receive buffer, a command is at most
+        about 10 bytes, so by default no more than 6 commands are in flight.
+
         Args:
-            port (str): port to which arduino is connected
+            port (str): port to which arduino is connected, or the simulated port
+            pipelined (bool): send batches of commands before reading the answers
+            batch_size (int): maximum amount of commands sent before reading answers
+            bulk (bool): measure with MEAS:BULK?, None to use it when the firmware supports it
         """
-        rm = pyvisa.ResourceManager("@py")
-        self.device = rm.open_resource(
-            port, read_termination="\r\n", write_termination="\n"
-        )
+        self.port = port
+        self.pipelined = pipelined
+        self.batch_size = batch_size
+        self.bulk = bulk
+        self._capabilities = None
+        if is_simulated_port(port):
+            self.device = open_simulated_resource(port)
+        else:
+            rm = get_resource_manager()
+            self.device = rm.open_resource(
+                port, read_termination="\r\n", write_termination="\n"
+            )
+
+    def query(self, command):
+        """Send a single command and return its answer.
+
+        Args:
+            command (str): command to send
+
+        Returns:
+            str: answer of the arduino
+        """
+        if active_profile() is not None:
+            return self.query_batch([command])[0]
+        return self.device.query(command)
 
     def get_identification(self):
         """Identify the device connected to the port.
@@ -45,16 +199,43 @@ class ArduinoVisaDevice:
         Returns:
             str: identification string from connected device
         """
-        identification = self.device.query("*IDN?")
+        identification = self.query("*IDN?")
         return identification
 
+    def capabilities(self):
+        """Ask the firmware once which optional commands it supports.
+
+        SYST:CAP? is only sent to firmware that identifies as CAPABILITY_FIRMWARE
+        or newer, older firmware does not know it.
+
+        Returns:
+            frozenset of str: supported optional commands, like MEAS:BULK
+        """
+        if self._capabilities is None:
+            identification = self.get_identification()
+            answer = None
+            if firmware_version(identification) >= CAPABILITY_FIRMWARE:
+                answer = self.query("SYST:CAP?")
+            self._capabilities = parse_capabilities(answer)
+        return self._capabilities
+
+    def supports_bulk(self):
+        """Check whether measurements are taken with MEAS:BULK?.
+
+        Returns:
+            bool: bulk if it was set, otherwise whether the firmware supports MEAS:BULK?
+        """
+        if self.bulk is None:
+            return "MEAS:BULK" in self.capabilities()
+        return self.bulk
+
     def set_output_value(self, value):
         """Set ADC output value between 0 and 1023 on channel 0.
 
         Args:
             value (str): integer output voltage
         """
-        self.device.query(f"OUT:CH0 {value}")
+        self.query(f"OUT:CH0 {value}")
 
     def get_output_value(self):
         """Read output value on channel 0.
@@ -62,7 +243,7 @@ class ArduinoVisaDevice:
         Returns:
             str: ADC value outputted on channel 0
         """
-        output_value = self.device.query("OUT:CH0?")
+        output_value = self.query("OUT:CH0?")
         return output_value
 
     def get_input_value(self, channel):
@@ -74,7 +255,7 @@ class ArduinoVisaDevice:
         Returns:
             str: ADC value inputted on set channel
         """
-        input_value = self.device.query(f"MEAS:CH{channel}?")
+        input_value = self.query(f"MEAS:CH{channel}?")
         return input_value
 
     def get_input_voltage(self, channel):
@@ -87,9 +268,355 @@ class ArduinoVisaDevice:
             str: voltage inputted on set channel
         """
         step = 3.3 / 1023
-        input_voltage = (int(self.device.query(f"MEAS:CH{channel}?"))) * step
+        input_voltage = (int(self.query(f"MEAS:CH{channel}?"))) * step
         return input_voltage
 
+    def query_batch(self, commands):
+        """Send commands and return their answers in the same order.
+
+        In pipelined mode the commands are written in batches of batch_size
+        and the answers are read afterwards, so a batch costs a single round trip.
+        Otherwise every command is a separate query.
+
+        Args:
+            commands (list of str): commands to send
+
+        Returns:
+            list of str: answers to the commands
+        """
+        profile = active_profile()
+        if profile is not None:
+            return self._profiled_query_batch(commands, profile)
+
+        if not self.pipelined:
+            return [self.device.query(command) for command in commands]
+
+        answers = []
+        for index in range(0, len(commands), self.batch_size):
+            batch = commands[index : index + self.batch_size]
+            self.device.write(self.device.write_termination.join(batch))
+            for _ in batch:
+                answers.append(self.device.read())
+        return answers
+
+    def _profiled_query_batch(self, commands, profile):
+        """Version of query_batch that records the latency of every command and the failed queries.
+
+        Args:
+            commands (list of str): commands to send
+            profile (Profile): profile to record in
+
+        Returns:
+            list of str: answers to the commands
+        """
+        batch_size = self.batch_size if self.pipelined else 1
+        answers = []
+        for index in range(0, len(commands), batch_size):
+            batch = commands[index : index + batch_size]
+            start = time.perf_counter()
+            try:
+                if self.pipelined:
+                    self.device.write(self.device.write_termination.join(batch))
+                    for command in batch:
+                        answers.append(self.device.read())
+                        now = time.perf_counter()
+                        profile.record_query(command_kind(command), now - start)
+                        start = now
+                else:
+                    answers.append(self.device.query(batch[0]))
+                    profile.record_query(
+                        command_kind(batch[0]), time.perf_counter() - start
+                    )
+            except Exception as error:
+                profile.record_error(error)
+                raise
+        return answers
+
+    def set_output_and_measure(self, value, repeats):
+        """Set output value on channel 0 and measure the voltage on channels 1 and 2 repeatedly.
+
+        Firmware that supports MEAS:BULK? measures both channels up to
+        BULK_MAX_REPEATS times per command, instead of two commands per repeat.
+
+        Args:
+            value (int): ADC output value between 0 and 1023
+            repeats (int): amount of measurements per channel
+
+        Returns:
+            tuple of list: voltages measured on channel 1 and on channel 2
+        """
+        bulk = self.supports_bulk()
+        commands = [f"OUT:CH0 {value}"] + measure_commands(repeats, bulk)
+        answers = self.query_batch(commands)
+        with stage("parsing"):
+            return self._input_voltages(split_measurements(answers[1:], bulk))
+
+    def measure_input_voltages(self, repeats):
+        """Measure the voltage on channels 1 and 2 repeatedly, without changing the output.
+
+        Args:
+            repeats (int): amount of measurements per channel
+
+        Returns:
+            tuple of list: voltages measured on channel 1 and on channel 2
+        """
+        bulk = self.supports_bulk()
+        answers = self.query_batch(measure_commands(repeats, bulk))
+        with stage("parsing"):
+            return self._input_voltages(split_measurements(answers, bulk))
+
+    def set_output_and_measure_raw(self, value, repeats):
+        """Set output value on channel 0 and measure the ADC values on channels 1 and 2 repeatedly.
+
+        Args:
+            value (int): ADC output value between 0 and 1023
+            repeats (int): amount of measurements per channel
+
+        Returns:
+            tuple of numpy.ndarray: uint16 ADC values measured on channel 1 and on channel 2
+        """
+        bulk = self.supports_bulk()
+        commands = [f"OUT:CH0 {value}"] + measure_commands(repeats, bulk)
+        answers = self.query_batch(commands)
+        with stage("parsing"):
+            return self._input_values(split_measurements(answers[1:], bulk))
+
+    def _input_values(self, answers):
+        """Parse alternating answers of channel 2 and channel 1 into uint16 arrays in one step.
+
+        Args:
+            answers (list of str): ADC values, channel 2 first
+
+        Returns:
+            tuple of numpy.ndarray: ADC values on channel 1 and on channel 2
+        """
+        import numpy as np
+
+        values = np.array(answers, dtype=np.uint16)
+        return values[1::2], values[0::2]
+
+    def _input_voltages(self, answers):
+        """Convert alternating answers of channel 2 and channel 1 to voltages.
+
+        Args:
+            answers (list of str): ADC values, channel 2 first
+
+        Returns:
+            tuple of list: voltages on channel 1 and on channel 2
+        """
+        step = 3.3 / 1023
+        voltages_channel_2 = [int(answer) * step for answer in answers[0::2]]
+        voltages_channel_1 = [int(answer) * step for answer in answers[1::2]]
+        return voltages_channel_1, voltages_channel_2
+
+    def close(self):
+        """Close the connection to the arduino."""
+        self.device.close()
+
+
+class DevicePool:
+    """Keeps connections to devices open so they can be reused between actions.
+
+    Opening a serial port resets the Arduino, so reopening it for every action
+    costs seconds. The pool hands out the open device for a port instead, checks
+    whether a device that was idle for a while still answers and closes devices
+    that have not been used for idle_timeout seconds. A device that is leased,
+    for example for the duration of a scan, is never closed as idle. Ports are
+    opened and checked outside the lock of the pool, so opening one port does
+    not hold up the devices on other ports.
+
+    Attributes:
+    idle_timeout (float): seconds after which an unused device is closed
+    health_interval (float): seconds of idle time after which a device is checked before reuse
+
+    Methods:
+    get(port)
+    lease(port)
+    release(port)
+    evict_idle()
+    close_all()
+    """
+
+    def __init__(self, idle_timeout=600, health_interval=30):
+        """Create an empty pool.
+
+        Args:
+            idle_timeout (float): seconds after which an unused device is closed
+            health_interval (float): seconds of idle time after which a device is checked before reuse
+        """
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        # Device, time it was last handed out and amount of leases per port
+        self._sessions = {}
+        self._lock = threading.Lock()
+        # Checkouts of the same port wait for each other while it is opened or checked
+        self._port_locks = {}
+
+    def get(self, port):
+        """Return an open device for port, opening a new connection only if needed.
+
+        Args:
+            port (str): port to which arduino is connected
+
+        Returns:
+            ArduinoVisaDevice: open device
+        """
+        return self._checkout(port, 0)
+
+    @contextlib.contextmanager
+    def lease(self, port):
+        """Check out the device for port for the duration of a with block, it is not closed as idle meanwhile.
+
+        Args:
+            port (str): port to which arduino is connected
+
+        Yields:
+            ArduinoVisaDevice: open device
+        """
+        device = self._checkout(port, 1)
+        try:
+            yield device
+        finally:
+            with self._lock:
+                session = self._sessions.get(port)
+                if session is not None and session[2] > 0:
+                    session[1] = time.monotonic()
+                    session[2] -= 1
+
+    def _checkout(self, port, leases):
+        """Return an open device for port and add leases to it.
+
+        Args:
+            port (str): port to which arduino is connected
+            leases (int): amount of leases to add
+
+        Returns:
+            ArduinoVisaDevice: open device
+        """
+        self.evict_idle()
+        with self._lock:
+            port_lock = self._port_locks.setdefault(port, threading.Lock())
+
+        with port_lock:
+            # Reserve the device with a lease, so it is not evicted as idle while it is checked
+            with self._lock:
+                session = self._sessions.get(port)
+                if session is not None:
+                    stale = (
+                        session[2] == 0
+                        and time.monotonic() - session[1] > self.health_interval
+                    )
+                    session[2] += 1
+
+            try:
+                if session is None:
+                    session = [self._open(port), 0, 1]
+                elif stale and not self._healthy(session[0]):
+                    with self._lock:
+                        self._sessions.pop(port, None)
+                    self._close(session[0])
+                    session = [self._open(port), 0, 1]
+                    profile = active_profile()
+                    if profile is not None:
+                        profile.count("reconnects")
+            except BaseException:
+                with self._lock:
+                    if self._sessions.get(port) is session:
+                        session[2] -= 1
+                raise
+
+            # Publish the device and turn the reservation into the requested leases
+            with self._lock:
+                session[1] = time.monotonic()
+                session[2] += leases - 1
+                self._sessions[port] = session
+            return session[0]
+
+    def release(self, port):
+        """Close the device on port and remove it from the pool.
+
+        Args:
+            port (str): port of the device to close
+        """
+        with self._lock:
+            session = self._sessions.pop(port, None)
+        if session is not None:
+            self._close(session[0])
+
+    def evict_idle(self):
+        """Close all devices that are not leased and have not been used for idle_timeout seconds."""
+        now = time.monotonic()
+        with self._lock:
+            idle_ports = [
+                port
+                for port, (_, last_used, leases) in self._sessions.items()
+                if leases == 0 and now - last_used > self.idle_timeout
+            ]
+            idle_sessions = [self._sessions.pop(port) for port in idle_ports]
+        for device, _, _ in idle_sessions:
+            self._close(device)
+
+    def close_all(self):
+        """Close every device in the pool."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for device, _, _ in sessions:
+            self._close(device)
+
+    def _open(self, port):
+        """Open a new connection to a port, forgetting the discovered resources if that fails.
+
+        Args:
+            port (str): port to which arduino is connected
+
+        Returns:
+            ArduinoVisaDevice: open device
+        """
+        try:
+            return ArduinoVisaDevice(port)
+        except Exception as error:
+            if is_connection_error(error):
+                from pythondaq.discovery import resource_cache
+
+                # The port may be unplugged, so it should not be offered again
+                resource_cache.invalidate()
+            raise
+
+    def _healthy(self, device):
+        """Check whether a device still answers to an identification query.
+
+        Args:
+            device (ArduinoVisaDevice): device to check
+
+        Returns:
+            bool: True if the device answered
+        """
+        try:
+            device.get_identification()
+        except Exception as error:
+            if not is_connection_error(error):
+                raise
+            return False
+        return True
+
+    def _close(self, device):
+        """Close a device, ignoring devices that are already gone.
+
+        Args:
+            device (ArduinoVisaDevice): device to close
+        """
+        try:
+            device.close()
+        except Exception as error:
+            if not is_connection_error(error):
+                raise
+
+
+# Pool of open devices shared by the command line interface, GUI and view
+device_pool = DevicePool()
+atexit.register(device_pool.close_all)
+
 
 if __name__ == "__main__":
     list_resources()
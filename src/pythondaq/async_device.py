@@ -0,0 +1,434 @@
+import asyncio
+import re
+import time
+
+from pythondaq.arduino_device import (
+    CAPABILITY_FIRMWARE,
+    firmware_version,
+    measure_commands,
+    parse_capabilities,
+    split_measurements,
+)
+from pythondaq.profiling import active_profile, command_kind
+from pythondaq.simulated_device import is_simulated_port, open_simulated_resource
+
+# Maximum seconds a read on a worker thread waits for bytes, when the port cannot be watched
+READ_INTERVAL = 0.1
+
+
+def serial_path(port):
+    """Convert a VISA serial resource name to the path of the serial port.
+
+    Args:
+        port (str): VISA resource name, e.g. ASRL/dev/ttyACM0::INSTR or ASRL4::INSTR
+
+    Raises:
+        ValueError: if port is not a serial resource
+
+    Returns:
+        str: path of the serial port, e.g. /dev/ttyACM0 or COM4
+    """
+    match = re.fullmatch(r"ASRL(.+)::INSTR", port)
+    if match is None:
+        raise ValueError(f"Not a serial resource: {port}")
+    path = match.group(1)
+    return f"COM{path}" if path.isdigit() else path
+
+
+class SerialTransport:
+    """Reads and writes lines on a serial port without blocking the event loop.
+
+    The port is opened in non-blocking mode and watched by the event loop,
+    complete lines are collected in a queue as soon as they arrive and writes
+    wait until the port can take the rest of the message. The ProactorEventLoop
+    on Windows cannot watch a serial port, and pyserial's Windows ports have no
+    file descriptor, so there the transport falls back to reads that wait at most
+    READ_INTERVAL seconds and to blocking writes, both on a worker thread of the
+    event loop.
+
+    Attributes:
+    serial (serial.Serial): the serial port
+    watched (bool): whether the event loop watches the port, False when using the worker thread fallback
+
+    Methods:
+    write(message)
+    readline(timeout)
+    close()
+    """
+
+    def __init__(self, path, baudrate=9600, read_termination="\r\n"):
+        """Open the serial port and start watching it for answers.
+
+        Must be called from a running event loop.
+
+        Args:
+            path (str): path of the serial port
+            baudrate (int): baud rate of the serial port, 9600 like pyvisa-py
+            read_termination (str): termination of the lines sent by the device
+        """
+        import serial
+
+        self.serial = serial.Serial(path, baudrate, timeout=0, write_timeout=0)
+        self._termination = read_termination.encode()
+        self._buffer = bytearray()
+        self._lines = asyncio.Queue()
+        self._reading = None
+        self._loop = asyncio.get_running_loop()
+        try:
+            self._loop.add_reader(self.serial.fileno(), self._on_readable)
+            self.watched = True
+        except (AttributeError, NotImplementedError):
+            self.serial.timeout = READ_INTERVAL
+            self.serial.write_timeout = None
+            self.watched = False
+
+    def _read(self):
+        """Read the available bytes, or wait for the first one.
+
+        Returns:
+            bytes: bytes read, empty if none arrived within the timeout of the port
+        """
+        return self.serial.read(self.serial.in_waiting or 1)
+
+    def _on_readable(self):
+        """Move the available bytes into the buffer."""
+        self._receive(self._read())
+
+    def _receive(self, data):
+        """Add bytes to the buffer and queue every complete line.
+
+        Args:
+            data (bytes): bytes read from the serial port
+        """
+        self._buffer += data
+        while self._termination in self._buffer:
+            line, _, rest = self._buffer.partition(self._termination)
+            self._buffer = bytearray(rest)
+            self._lines.put_nowait(line.decode())
+
+    async def _writable(self):
+        """Wait until the watched serial port can take more bytes."""
+        writable = self._loop.create_future()
+
+        def on_writable():
+            if not writable.done():
+                writable.set_result(None)
+
+        self._loop.add_writer(self.serial.fileno(), on_writable)
+        try:
+            await writable
+        finally:
+            self._loop.remove_writer(self.serial.fileno())
+
+    async def write(self, message):
+        """Write a message to the serial port, waiting until every byte has been taken.
+
+        Args:
+            message (str): message including termination
+        """
+        data = message.encode()
+        if not self.watched:
+            await self._loop.run_in_executor(None, self.serial.write, data)
+            return
+        # A non-blocking write takes as much as fits in the output buffer
+        while data:
+            await self._writable()
+            data = data[self.serial.write(data) :]
+
+    async def readline(self, timeout):
+        """Wait for the next line from the device.
+
+        Args:
+            timeout (float): seconds to wait before giving up
+
+        Raises:
+            TimeoutError: if no line arrived within timeout
+
+        Returns:
+            str: line without termination
+        """
+        if self.watched:
+            try:
+                return await asyncio.wait_for(self._lines.get(), timeout)
+            except TimeoutError:
+                raise TimeoutError(f"No answer within {timeout} s") from None
+
+        deadline = self._loop.time() + timeout
+        while self._lines.empty():
+            if self._loop.time() >= deadline:
+                raise TimeoutError(f"No answer within {timeout} s")
+
+            # A read of a cancelled caller is finished by the next one, so no bytes are lost
+            if self._reading is None:
+                self._reading = self._loop.run_in_executor(None, self._read)
+            self._receive(await asyncio.shield(self._reading))
+            self._reading = None
+        return self._lines.get_nowait()
+
+    def close(self):
+        """Stop watching or reading the serial port and close it."""
+        if self.watched:
+            self._loop.remove_reader(self.serial.fileno())
+        elif self._reading is not None:
+            self._reading.cancel()
+        self.serial.close()
+
+
+class SimulatedTransport:
+    """Talks to a simulated Arduino, waiting for its latency with asyncio.sleep.
+
+    Attributes:
+    device (SimulatedArduino): the simulated Arduino
+
+    Methods:
+    write(message)
+    readline(timeout)
+    close()
+    """
+
+    def __init__(self, port):
+        """Open a simulated Arduino with the current simulation settings.
+
+        Args:
+            port (str): name of the simulated port
+        """
+        self.device = open_simulated_resource(port)
+
+    async def write(self, message):
+        """Send one or more commands to the simulated Arduino.
+
+        Args:
+            message (str): commands including termination
+        """
+        self.device.write(message)
+
+    async def readline(self, timeout):
+        """Wait for the next answer of the simulated Arduino.
+
+        Args:
+            timeout (float): seconds to wait before giving up
+
+        Raises:
+            TimeoutError: if the answer takes longer than timeout
+
+        Returns:
+            str: answer of the simulated Arduino
+        """
+        remaining, response = self.device.pop_response()
+        if remaining > timeout:
+            raise TimeoutError(f"No answer within {timeout} s")
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+        return response
+
+    def close(self):
+        """Close the simulated Arduino."""
+        self.device.close()
+
+
+class AsyncArduinoDevice:
+    """Controls Arduino with the same commands as ArduinoVisaDevice, without blocking the event loop.
+
+    Open a device with ``await AsyncArduinoDevice.open(port)``. While one device
+    waits for an answer the event loop is free to drive other devices, write
+    files or update plots.
+
+    Attributes:
+    port (str): port to which the arduino is connected
+    batch_size (int): maximum amount of commands sent before reading answers
+    timeout (float): seconds to wait for an answer
+    bulk (bool): measure with MEAS:BULK?, None to use it when the firmware supports it
+
+    Methods:
+    open(port)
+    query(command)
+    query_batch(commands)
+    get_identification()
+    capabilities()
+    supports_bulk()
+    set_output_value(value)
+    get_input_voltage(channel)
+    set_output_and_measure(value, repeats)
+    measure_input_voltages(repeats)
+    close()
+    """
+
+    def __init__(self, port, transport, batch_size=6, timeout=2.0, bulk=None):
+        """Wrap an open transport, use AsyncArduinoDevice.open instead.
+
+        Args:
+            port (str): port to which the arduino is connected
+            transport: SerialTransport or SimulatedTransport for the port
+            batch_size (int): maximum amount of commands sent before reading answers
+            timeout (float): seconds to wait for an answer
+            bulk (bool): measure with MEAS:BULK?, None to use it when the firmware supports it
+        """
+        self.port = port
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.bulk = bulk
+        self._capabilities = None
+        self._transport = transport
+        self._write_termination = "\n"
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    async def open(cls, port, batch_size=6, timeout=2.0, bulk=None):
+        """Open the arduino on a serial port, or a simulated arduino.
+
+        Args:
+            port (str): VISA resource name of the port, or the simulated port
+            batch_size (int): maximum amount of commands sent before reading answers
+            timeout (float): seconds to wait for an answer
+            bulk (bool): measure with MEAS:BULK?, None to use it when the firmware supports it
+
+        Returns:
+            AsyncArduinoDevice: the opened device
+        """
+        if is_simulated_port(port):
+            transport = SimulatedTransport(port)
+        else:
+            transport = SerialTransport(serial_path(port))
+        return cls(port, transport, batch_size, timeout, bulk)
+
+    async def query_batch(self, commands):
+        """Send commands in batches of batch_size and return their answers in order.
+
+        Args:
+            commands (list of str): commands to send
+
+        Returns:
+            list of str: answers to the commands
+        """
+        profile = active_profile()
+        answers = []
+        # Answers of different callers must not be interleaved
+        async with self._lock:
+            for index in range(0, len(commands), self.batch_size):
+                batch = commands[index : index + self.batch_size]
+                start = time.perf_counter()
+                await self._transport.write(
+                    "".join(command + self._write_termination for command in batch)
+                )
+                for command in batch:
+                    try:
+                        answers.append(await self._transport.readline(self.timeout))
+                    except Exception as error:
+                        if profile is not None:
+                            profile.record_error(error)
+                        raise
+                    if profile is not None:
+                        now = time.perf_counter()
+                        profile.record_query(command_kind(command), now - start)
+                        start = now
+        return answers
+
+    async def query(self, command):
+        """Send a single command and wait for its answer.
+
+        Args:
+            command (str): command to send
+
+        Returns:
+            str: answer of the arduino
+        """
+        answers = await self.query_batch([command])
+        return answers[0]
+
+    async def get_identification(self):
+        """Identify the device connected to the port.
+
+        Returns:
+            str: identification string from connected device
+        """
+        return await self.query("*IDN?")
+
+    async def capabilities(self):
+        """Ask the firmware once which optional commands it supports, see ArduinoVisaDevice.capabilities.
+
+        Returns:
+            frozenset of str: supported optional commands, like MEAS:BULK
+        """
+        if self._capabilities is None:
+            identification = await self.get_identification()
+            answer = None
+            if firmware_version(identification) >= CAPABILITY_FIRMWARE:
+                answer = await self.query("SYST:CAP?")
+            self._capabilities = parse_capabilities(answer)
+        return self._capabilities
+
+    async def supports_bulk(self):
+        """Check whether measurements are taken with MEAS:BULK?.
+
+        Returns:
+            bool: bulk if it was set, otherwise whether the firmware supports MEAS:BULK?
+        """
+        if self.bulk is None:
+            return "MEAS:BULK" in await self.capabilities()
+        return self.bulk
+
+    async def set_output_value(self, value):
+        """Set ADC output value between 0 and 1023 on channel 0.
+
+        Args:
+            value (int): integer output voltage
+        """
+        await self.query(f"OUT:CH0 {value}")
+
+    async def get_input_voltage(self, channel):
+        """Measure inputted voltage on given channel.
+
+        Args:
+            channel (int): channel you want to measure voltage on
+
+        Returns:
+            float: voltage inputted on set channel
+        """
+        step = 3.3 / 1023
+        return int(await self.query(f"MEAS:CH{channel}?")) * step
+
+    async def set_output_and_measure(self, value, repeats):
+        """Set output value on channel 0 and measure the voltage on channels 1 and 2 repeatedly.
+
+        Args:
+            value (int): ADC output value between 0 and 1023
+            repeats (int): amount of measurements per channel
+
+        Returns:
+            tuple of list: voltages measured on channel 1 and on channel 2
+        """
+        bulk = await self.supports_bulk()
+        commands = [f"OUT:CH0 {value}"] + measure_commands(repeats, bulk)
+        answers = await self.query_batch(commands)
+        return self._input_voltages(split_measurements(answers[1:], bulk))
+
+    async def measure_input_voltages(self, repeats):
+        """Measure the voltage on channels 1 and 2 repeatedly, without changing the output.
+
+        Args:
+            repeats (int): amount of measurements per channel
+
+        Returns:
+            tuple of list: voltages measured on channel 1 and on channel 2
+        """
+        bulk = await self.supports_bulk()
+        answers = await self.query_batch(measure_commands(repeats, bulk))
+        return self._input_voltages(split_measurements(answers, bulk))
+
+    def _input_voltages(self, answers):
+        """Convert alternating answers of channel 2 and channel 1 to voltages.
+
+        Args:
+            answers (list of str): ADC values, channel 2 first
+
+        Returns:
+            tuple of list: voltages on channel 1 and on channel 2
+        """
+        step = 3.3 / 1023
+        voltages_channel_2 = [int(answer) * step for answer in answers[0::2]]
+        voltages_channel_1 = [int(answer) * step for answer in answers[1::2]]
+        return voltages_channel_1, voltages_channel_2
+
+    async def close(self):
+        """Close the connection to the arduino."""
+        self._transport.close()
@@ -0,0 +1,540 @@
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from pythondaq.diode_experiment import DiodeExperiment
+
+# Stages reported by the benchmark, in the order they happen during a scan
+STAGES = ["visa", "parsing", "statistics", "save", "plot"]
+
+# Commands timed by the startup benchmark, run against the simulated Arduino
+STARTUP_COMMANDS = {
+    "help": ["--help"],
+    "list": ["list"],
+    "info": ["info", "SIM"],
+    "runs": ["runs"],
+    "scan": ["scan", "SIM", "-s", "1.6", "-e", "1.61", "-r", "1"],
+}
+
+# Packages that take long to import, reported when a command loads them
+HEAVY_MODULES = ["numpy", "pyvisa", "rich", "matplotlib", "lmfit", "scipy", "asyncio"]
+
+
+class StageTimer:
+    """Accumulates wall clock time and call counts per stage.
+
+    Attributes:
+    totals (dict): total time in seconds per stage
+    counts (dict): number of timed calls per stage
+
+    Methods:
+    add(stage, seconds)
+    """
+
+    def __init__(self):
+        """Start with no time recorded for any stage."""
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def add(self, stage, seconds):
+        """Add a single timed call to a stage.
+
+        Args:
+            stage (str): name of the stage
+            seconds (float): duration of the call
+        """
+        self.totals[stage] += seconds
+        self.counts[stage] += 1
+
+
+class TimedResource:
+    """Wraps a pyvisa resource and times every round trip to the device.
+
+    Attributes:
+    resource: the wrapped pyvisa (or simulated) resource
+    timer (StageTimer): timer that receives the "visa" stage
+
+    Methods:
+    write(message)
+    read()
+    query(message)
+    """
+
+    def __init__(self, resource, timer):
+        """Wrap resource and report to timer.
+
+        Args:
+            resource: pyvisa resource to wrap
+            timer (StageTimer): timer that receives the "visa" stage
+        """
+        self.resource = resource
+        self.timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self.resource, name)
+
+    def write(self, message):
+        """Time writing a message to the device.
+
+        Args:
+            message (str): message to write
+        """
+        start = time.perf_counter()
+        self.resource.write(message)
+        self.timer.add("visa", time.perf_counter() - start)
+
+    def read(self):
+        """Time reading an answer from the device.
+
+        Returns:
+            str: answer of the device
+        """
+        start = time.perf_counter()
+        answer = self.resource.read()
+        self.timer.add("visa", time.perf_counter() - start)
+        self.timer.counts["queries"] += 1
+        return answer
+
+    def query(self, message):
+        """Time a full query round trip.
+
+        Args:
+            message (str): command to send
+
+        Returns:
+            str: answer of the device
+        """
+        start = time.perf_counter()
+        answer = self.resource.query(message)
+        self.timer.add("visa", time.perf_counter() - start)
+        self.timer.counts["queries"] += 1
+        return answer
+
+
+class TimedDevice:
+    """Wraps an ArduinoVisaDevice and times every method call made by the experiment.
+
+    Time spent inside these calls that is not a VISA round trip is parsing and
+    conversion of the answers.
+
+    Attributes:
+    device (ArduinoVisaDevice): the wrapped device
+    timer (StageTimer): timer that receives the "device" stage
+    """
+
+    def __init__(self, device, timer):
+        """Wrap device and report to timer.
+
+        Args:
+            device (ArduinoVisaDevice): device to wrap
+            timer (StageTimer): timer that receives the "device" stage
+        """
+        self.device = device
+        self.timer = timer
+
+    def __getattr__(self, name):
+        attribute = getattr(self.device, name)
+        if not callable(attribute):
+            return attribute
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = attribute(*args, **kwargs)
+            self.timer.add("device", time.perf_counter() - start)
+            return result
+
+        return timed
+
+
+def parse_ranges(ranges):
+    """Convert a string like "0:1023,300:700" into a list of (start, stop) ADC values.
+
+    Args:
+        ranges (str): comma separated start:stop pairs
+
+    Returns:
+        list of tuple: (start, stop) pairs
+    """
+    parsed = []
+    for scan_range in ranges.split(","):
+        start, stop = scan_range.split(":")
+        parsed.append((int(start), int(stop)))
+    return parsed
+
+
+def benchmark_scan(
+    port, start, stop, repeats, save=True, plot=True, pipelined=True, bulk=None
+):
+    """Run a single scan and time every stage of it.
+
+    Args:
+        port (str): port connected to arduino, or the simulated port
+        start (int): starting ADC voltage value
+        stop (int): stopping ADC voltage value
+        repeats (int): amount of measurements per ADC voltage value
+        save (bool): also time saving the data to a .csv file
+        plot (bool): also time plotting the data
+        pipelined (bool): send commands to the device in batches
+        bulk (bool): measure with MEAS:BULK?, None to use it when the firmware supports it
+
+    Returns:
+        dict: throughput and time per stage of the scan
+    """
+    from pythondaq.cli import save_data
+
+    timer = StageTimer()
+    experiment = DiodeExperiment(port)
+
+    # The device comes from the device pool, so undo the wrapping afterwards
+    arduino = experiment.arduino
+    resource, original_pipelined = arduino.device, arduino.pipelined
+    original_bulk = arduino.bulk
+    arduino.pipelined, arduino.bulk = pipelined, bulk
+    arduino.device = TimedResource(resource, timer)
+    experiment.arduino = TimedDevice(arduino, timer)
+    try:
+        scan_start = time.perf_counter()
+        voltages_LED, currents_LED, errors_voltages_LED, errors_currents_LED = (
+            experiment.scan(start, stop, repeats)
+        )
+        scan_time = time.perf_counter() - scan_start
+    finally:
+        arduino.device, arduino.pipelined = resource, original_pipelined
+        arduino.bulk = original_bulk
+
+    # Whatever is not spent in the device is loop and statistics overhead,
+    # whatever is spent in the device but not on the wire is parsing
+    stages = {
+        "visa": timer.totals["visa"],
+        "parsing": timer.totals["device"] - timer.totals["visa"],
+        "statistics": scan_time - timer.totals["device"],
+    }
+
+    if save:
+        with tempfile.TemporaryDirectory() as directory:
+            save_start = time.perf_counter()
+            save_data(
+                currents_LED,
+                voltages_LED,
+                errors_currents_LED,
+                errors_voltages_LED,
+                "benchmark",
+                directory,
+            )
+            stages["save"] = time.perf_counter() - save_start
+
+    if plot:
+        from matplotlib.figure import Figure
+
+        plot_start = time.perf_counter()
+        figure = Figure()
+        axes = figure.add_subplot()
+        axes.errorbar(
+            voltages_LED,
+            currents_LED,
+            xerr=errors_voltages_LED,
+            yerr=errors_currents_LED,
+            ecolor="red",
+            fmt="o",
+            markersize=4,
+        )
+        figure.savefig(io.BytesIO(), format="png")
+        stages["plot"] = time.perf_counter() - plot_start
+
+    points = stop - start + 1
+    return {
+        "start": start,
+        "stop": stop,
+        "repeats": repeats,
+        "points": points,
+        "queries": timer.counts["queries"],
+        "scan_time": scan_time,
+        "points_per_second": points / scan_time,
+        "queries_per_second": timer.counts["queries"] / scan_time,
+        "stages": stages,
+    }
+
+
+def run_benchmark(
+    port, ranges, repeat_counts, save=True, plot=True, pipelined=True, bulk=None
+):
+    """Benchmark a scan for every combination of range and repeat count.
+
+    Args:
+        port (str): port connected to arduino, or the simulated port
+        ranges (list of tuple): (start, stop) ADC value pairs
+        repeat_counts (list of int): repeat counts to benchmark
+        save (bool): also time saving the data
+        plot (bool): also time plotting the data
+        pipelined (bool): send commands to the device in batches
+        bulk (bool): measure with MEAS:BULK?, None to use it when the firmware supports it
+
+    Returns:
+        list of dict: results of benchmark_scan for every case
+    """
+    results = []
+    for start, stop in ranges:
+        for repeats in repeat_counts:
+            results.append(
+                benchmark_scan(port, start, stop, repeats, save, plot, pipelined, bulk)
+            )
+    return results
+
+
+def case_key(result):
+    """Build the key under which a benchmark case is stored in a baseline.
+
+    Args:
+        result (dict): result of benchmark_scan
+
+    Returns:
+        str: key like "0:1023x3"
+    """
+    return f"{result['start']}:{result['stop']}x{result['repeats']}"
+
+
+def save_baseline(results, path, key=case_key):
+    """Store benchmark results as a baseline for later comparison.
+
+    Args:
+        results (list of dict): results of run_benchmark or run_startup_benchmark
+        path (str): path of the .json baseline file
+        key (callable): function that returns the key of a result
+    """
+    baseline = {key(result): result for result in results}
+    with open(path, "w") as baseline_file:
+        json.dump(baseline, baseline_file, indent=2)
+
+
+def load_baseline(path):
+    """Read a baseline stored by save_baseline.
+
+    Args:
+        path (str): path of the .json baseline file
+
+    Raises:
+        FileNotFoundError: if the baseline file does not exist
+
+    Returns:
+        dict: stored results by key
+    """
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Baseline file does not exist: {path}")
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+
+def compare_baseline(results, path, threshold):
+    """Compare benchmark results to a stored baseline.
+
+    Args:
+        results (list of dict): results of run_benchmark
+        path (str): path of the .json baseline file
+        threshold (float): allowed relative drop in points per second
+
+    Returns:
+        list of str: description of every case that regressed
+    """
+    baseline = load_baseline(path)
+
+    regressions = []
+    for result in results:
+        reference = baseline.get(case_key(result))
+        if reference is None:
+            continue
+        minimum = reference["points_per_second"] * (1 - threshold)
+        if result["points_per_second"] < minimum:
+            regressions.append(
+                f"{case_key(result)}: {result['points_per_second']:.1f} points/s, "
+                f"baseline {reference['points_per_second']:.1f} points/s"
+            )
+    return regressions
+
+
+def print_report(results):
+    """Print a table with throughput and the time split per stage.
+
+    Args:
+        results (list of dict): results of run_benchmark
+    """
+    from rich.console import Console
+    from rich.table import Table
+
+    table = Table(title="Scan benchmark")
+    table.add_column("case")
+    table.add_column("points/s", justify="right")
+    table.add_column("queries/s", justify="right")
+    for stage in STAGES:
+        table.add_column(stage, justify="right")
+
+    for result in results:
+        total = sum(result["stages"].values())
+        stage_cells = []
+        for stage in STAGES:
+            if stage in result["stages"]:
+                seconds = result["stages"][stage]
+                stage_cells.append(f"{seconds:.3f}s ({seconds / total:.0%})")
+            else:
+                stage_cells.append("-")
+        table.add_row(
+            case_key(result),
+            f"{result['points_per_second']:.1f}",
+            f"{result['queries_per_second']:.1f}",
+            *stage_cells,
+        )
+
+    Console().print(table)
+
+
+def imported_modules(importtime_output):
+    """Collect the time it took to import the heavy packages from the output of python -X importtime.
+
+    Args:
+        importtime_output (str): standard error of a run with -X importtime
+
+    Returns:
+        dict: cumulative import time in seconds of every heavy package that was imported
+    """
+    modules = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        name = name.strip()
+        if name in HEAVY_MODULES and cumulative.strip().isdigit():
+            modules[name] = max(
+                modules.get(name, 0.0), int(cumulative.strip()) / 1_000_000
+            )
+    return modules
+
+
+def time_startup(name, arguments, runs=5):
+    """Time a diode command from process start to exit.
+
+    The command runs in a temporary directory with its own discovery cache, so
+    the first timed run starts without a cached resource list. A last run with
+    -X importtime records which heavy packages the command imports once the
+    discovery cache is filled.
+
+    Args:
+        name (str): name of the case
+        arguments (list of str): arguments of the diode command
+        runs (int): amount of timed runs
+
+    Returns:
+        dict: fastest and median wall clock time and the imported heavy packages
+    """
+    command = [sys.executable, "-m", "pythondaq.cli", "--simulate", *arguments]
+    with tempfile.TemporaryDirectory() as directory:
+        # Make sure this copy of pythondaq is timed, also from the temporary directory
+        package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        environment = dict(
+            os.environ,
+            XDG_CACHE_HOME=directory,
+            PYTHONPATH=os.pathsep.join(
+                filter(None, [package_parent, os.environ.get("PYTHONPATH")])
+            ),
+        )
+
+        def run(*options):
+            return subprocess.run(
+                [command[0], *options, *command[1:]],
+                cwd=directory,
+                env=environment,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+        modules = imported_modules(run("-X", "importtime").stderr)
+
+    return {
+        "command": name,
+        "arguments": arguments,
+        "min": min(times),
+        "median": statistics.median(times),
+        "modules": modules,
+    }
+
+
+def run_startup_benchmark(names, runs=5):
+    """Time the startup of several diode commands.
+
+    Args:
+        names (list of str): names of commands in STARTUP_COMMANDS
+        runs (int): amount of timed runs per command
+
+    Returns:
+        list of dict: results of time_startup for every command
+    """
+    return [time_startup(name, STARTUP_COMMANDS[name], runs) for name in names]
+
+
+def compare_startup_baseline(results, path, threshold):
+    """Compare startup times to a stored baseline.
+
+    Args:
+        results (list of dict): results of run_startup_benchmark
+        path (str): path of the .json baseline file
+        threshold (float): allowed relative increase of the median startup time
+
+    Returns:
+        list of str: description of every command that regressed
+    """
+    baseline = load_baseline(path)
+
+    regressions = []
+    for result in results:
+        reference = baseline.get(result["command"])
+        if reference is None:
+            continue
+        maximum = reference["median"] * (1 + threshold)
+        if result["median"] > maximum:
+            regressions.append(
+                f"{result['command']}: {result['median'] * 1000:.0f} ms, "
+                f"baseline {reference['median'] * 1000:.0f} ms"
+            )
+    return regressions
+
+
+def print_startup_report(results):
+    """Print a table with the startup time and the heavy packages of every command.
+
+    Args:
+        results (list of dict): results of run_startup_benchmark
+    """
+    from rich.console import Console
+    from rich.table import Table
+
+    table = Table(title="Startup benchmark")
+    table.add_column("command")
+    table.add_column("min", justify="right")
+    table.add_column("median", justify="right")
+    table.add_column("heavy imports")
+
+    for result in results:
+        modules = ", ".join(
+            f"{name} {seconds * 1000:.0f} ms"
+            for name, seconds in sorted(
+                result["modules"].items(), key=lambda item: -item[1]
+            )
+        )
+        table.add_row(
+            " ".join(["diode", *result["arguments"]]),
+            f"{result['min'] * 1000:.0f} ms",
+            f"{result['median'] * 1000:.0f} ms",
+            modules or "-",
+        )
+
+    Console().print(table)
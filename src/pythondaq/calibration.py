@@ -0,0 +1,362 @@
+import json
+import os
+
+import numpy as np
+
+from pythondaq.discovery import default_cache_path
+from pythondaq.raw_capture import ADC_STEP
+
+# Amount of values of the 10 bit ADC and DAC
+ADC_VALUES = 1024
+
+
+def default_calibration_path():
+    """Return the file in which calibrations are stored.
+
+    Returns:
+        str: path next to the resource cache, inside $XDG_CACHE_HOME (or ~/.cache) /pythondaq
+    """
+    return os.path.join(os.path.dirname(default_cache_path()), "calibrations.json")
+
+
+class Calibration:
+    """Corrections for the systematic errors of the channels and the resistor of one Arduino.
+
+    An input channel is corrected with a gain and offset, V = gain * V_ideal + offset,
+    or with a lookup table that gives the voltage for every ADC count. V_ideal is
+    the ADC count times the ideal step of 3.3 / 1023 V. The output channel is
+    corrected with a gain and offset in the same way. All corrections work on whole
+    arrays at once, so a scan is corrected in a single pass.
+
+    Attributes:
+    identification (str): identification string of the Arduino, None for the ideal calibration
+    gains (tuple of float): gain of channel 1 and of channel 2
+    offsets (tuple of float): offset in Volts of channel 1 and of channel 2
+    tables (dict): lookup table of ADC_VALUES voltages per channel number, for the channels that have one
+    output_gain (float): gain of the output channel 0
+    output_offset (float): offset in Volts of the output channel 0
+    resistance (float): measured resistance in Ohm of the resistor in series with the LED
+
+    Methods:
+    from_dict(data)
+    to_dict()
+    is_ideal()
+    describe()
+    voltages(channel, counts)
+    correct(channel, voltages)
+    output_value(value)
+    """
+
+    def __init__(
+        self,
+        identification=None,
+        gains=(1.0, 1.0),
+        offsets=(0.0, 0.0),
+        tables=None,
+        output_gain=1.0,
+        output_offset=0.0,
+        resistance=220,
+    ):
+        """Store the corrections, the defaults describe an ideal Arduino.
+
+        Args:
+            identification (str): identification string of the Arduino
+            gains (tuple of float): gain of channel 1 and of channel 2
+            offsets (tuple of float): offset in Volts of channel 1 and of channel 2
+            tables (dict): lookup table of ADC_VALUES voltages per channel number
+            output_gain (float): gain of the output channel 0
+            output_offset (float): offset in Volts of the output channel 0
+            resistance (float): resistance in Ohm of the resistor in series with the LED
+        """
+        self.identification = identification
+        self.gains = tuple(float(gain) for gain in gains)
+        self.offsets = tuple(float(offset) for offset in offsets)
+        self.tables = {
+            int(channel): np.asarray(table, dtype=float)
+            for channel, table in (tables or {}).items()
+        }
+        self.output_gain = float(output_gain)
+        self.output_offset = float(output_offset)
+        self.resistance = float(resistance)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a calibration from the dictionary made by to_dict.
+
+        Args:
+            data (dict): stored calibration
+
+        Returns:
+            Calibration: the calibration
+        """
+        return cls(**data)
+
+    def to_dict(self):
+        """Describe the calibration with JSON types.
+
+        Returns:
+            dict: identification, gains, offsets, tables, output_gain, output_offset and resistance
+        """
+        return {
+            "identification": self.identification,
+            "gains": list(self.gains),
+            "offsets": list(self.offsets),
+            "tables": {
+                str(channel): table.tolist() for channel, table in self.tables.items()
+            },
+            "output_gain": self.output_gain,
+            "output_offset": self.output_offset,
+            "resistance": self.resistance,
+        }
+
+    def is_ideal(self):
+        """Check whether the input channels need no correction.
+
+        Returns:
+            bool: True without tables, with gains of 1 and offsets of 0
+        """
+        return (
+            not self.tables and self.gains == (1.0, 1.0) and self.offsets == (0.0, 0.0)
+        )
+
+    def describe(self):
+        """Summarize the calibration for the header of a data file.
+
+        Returns:
+            str: ideal, or the kind of correction of every channel and the resistance
+        """
+        if self.is_ideal() and self.output_gain == 1.0 and self.output_offset == 0.0:
+            return f"ideal, R = {self.resistance:g} Ohm"
+        channels = []
+        for channel in (1, 2):
+            if channel in self.tables:
+                channels.append(f"CH{channel} table")
+            else:
+                channels.append(
+                    f"CH{channel} gain {self.gains[channel - 1]:.5g}"
+                    f" offset {self.offsets[channel - 1]:.3g} V"
+                )
+        return ", ".join(channels) + f", R = {self.resistance:g} Ohm"
+
+    def voltages(self, channel, counts):
+        """Convert ADC counts of an input channel to calibrated voltages.
+
+        Args:
+            channel (int): input channel, 1 or 2
+            counts (array_like of int): ADC counts
+
+        Returns:
+            numpy.ndarray: calibrated voltages
+        """
+        counts = np.asarray(counts)
+        if channel in self.tables:
+            return self.tables[channel][counts]
+        return self.gains[channel - 1] * ADC_STEP * counts + self.offsets[channel - 1]
+
+    def correct(self, channel, voltages):
+        """Correct voltages that were converted with the ideal ADC step.
+
+        The lookup table is interpolated, so NaN entries of unused measurements stay NaN.
+
+        Args:
+            channel (int): input channel, 1 or 2
+            voltages (array_like of float): voltages converted with the ideal step
+
+        Returns:
+            numpy.ndarray: calibrated voltages
+        """
+        voltages = np.asarray(voltages, dtype=float)
+        if channel in self.tables:
+            table = self.tables[channel]
+            return np.interp(voltages / ADC_STEP, np.arange(len(table)), table)
+        return self.gains[channel - 1] * voltages + self.offsets[channel - 1]
+
+    def output_value(self, value):
+        """Return the ADC output value at which channel 0 gives the voltage an ideal DAC gives at value.
+
+        Args:
+            value (array_like of int): ADC output value of an ideal DAC
+
+        Returns:
+            numpy.ndarray or int: corrected ADC output value between 0 and 1023
+        """
+        corrected = (np.asarray(value) * ADC_STEP - self.output_offset) / (
+            self.output_gain * ADC_STEP
+        )
+        corrected = np.clip(np.rint(corrected), 0, ADC_VALUES - 1).astype(int)
+        return int(corrected) if corrected.ndim == 0 else corrected
+
+
+def fit_calibration(
+    identification,
+    values,
+    counts,
+    reference_voltages=None,
+    table=False,
+    resistance=220,
+    base=None,
+):
+    """Build a calibration from a reference sweep of the output channel.
+
+    During the sweep the input channels measure the output of channel 0, so the
+    voltage they should read is known: the reference voltage if it was measured
+    with a multimeter, otherwise the voltage of an ideal DAC. A measured reference
+    also calibrates the output channel. Counts at either end of the ADC range
+    are clipped and left out.
+
+    Args:
+        identification (str): identification string of the Arduino
+        values (array_like of int): ADC output values of the sweep
+        counts (dict): mean ADC counts measured per value, per input channel number
+        reference_voltages (array_like of float): measured output voltage per value, None for an ideal DAC
+        table (bool): store a lookup table for every channel instead of a gain and offset
+        resistance (float): measured resistance in Ohm of the resistor in series with the LED
+        base (Calibration): calibration whose corrections are kept for the channels not in counts, and for the output without reference
+
+    Raises:
+        ValueError: if a channel has fewer than two unclipped values
+
+    Returns:
+        Calibration: calibration of the channels in counts
+    """
+    base = base if base is not None else Calibration()
+    values = np.asarray(values, dtype=float)
+    ideal_voltages = values * ADC_STEP
+    output_gain, output_offset = base.output_gain, base.output_offset
+    if reference_voltages is None:
+        reference_voltages = ideal_voltages
+    else:
+        reference_voltages = np.asarray(reference_voltages, dtype=float)
+        output_gain, output_offset = np.polyfit(ideal_voltages, reference_voltages, 1)
+
+    gains, offsets = list(base.gains), list(base.offsets)
+    tables = {
+        channel: table
+        for channel, table in base.tables.items()
+        if channel not in counts
+    }
+    for channel, channel_counts in counts.items():
+        channel_counts = np.asarray(channel_counts, dtype=float)
+        unclipped = (channel_counts > 0) & (channel_counts < ADC_VALUES - 1)
+        if np.count_nonzero(unclipped) < 2:
+            raise ValueError(
+                f"Channel {channel} needs at least two unclipped values to calibrate"
+            )
+        measured = channel_counts[unclipped] * ADC_STEP
+        reference = reference_voltages[unclipped]
+        gain, offset = np.polyfit(measured, reference, 1)
+        gains[channel - 1], offsets[channel - 1] = gain, offset
+        if table:
+            # Interpolate between the sweep values and extrapolate with the fitted line
+            order = np.argsort(measured)
+            grid = np.arange(ADC_VALUES) * ADC_STEP
+            tables[channel] = np.where(
+                (grid >= measured[order[0]]) & (grid <= measured[order[-1]]),
+                np.interp(grid, measured[order], reference[order]),
+                gain * grid + offset,
+            )
+
+    return Calibration(
+        identification,
+        gains,
+        offsets,
+        tables,
+        output_gain,
+        output_offset,
+        resistance,
+    )
+
+
+class CalibrationStore:
+    """Calibrations of all Arduinos, keyed by their identification string and stored in a JSON file.
+
+    Arduinos that answer *IDN? with the same string share a calibration.
+
+    Attributes:
+    path (str): JSON file the calibrations are stored in, None to only keep them in memory
+
+    Methods:
+    get(identification)
+    put(calibration)
+    remove(identification)
+    identifications()
+    """
+
+    def __init__(self, path=None):
+        """Create a store, the file is only read when a calibration is first needed.
+
+        Args:
+            path (str): JSON file the calibrations are stored in, None to only keep them in memory
+        """
+        self.path = path
+        self._calibrations = None
+
+    def get(self, identification):
+        """Return the calibration of an Arduino.
+
+        Args:
+            identification (str): identification string of the Arduino
+
+        Returns:
+            Calibration: the stored calibration, or an ideal one if there is none
+        """
+        data = self._load().get(identification)
+        if data is None:
+            return Calibration(identification)
+        return Calibration.from_dict(data)
+
+    def put(self, calibration):
+        """Store the calibration of an Arduino, replacing an earlier one.
+
+        Args:
+            calibration (Calibration): calibration with the identification string of the Arduino
+        """
+        self._load()[calibration.identification] = calibration.to_dict()
+        self._store()
+
+    def remove(self, identification):
+        """Forget the calibration of an Arduino, so it is treated as ideal again.
+
+        Args:
+            identification (str): identification string of the Arduino
+        """
+        if self._load().pop(identification, None) is not None:
+            self._store()
+
+    def identifications(self):
+        """Return the identification strings of the calibrated Arduinos.
+
+        Returns:
+            list of str: identification strings
+        """
+        return list(self._load())
+
+    def _load(self):
+        """Read the calibrations stored on disk on first use.
+
+        Returns:
+            dict: stored calibrations per identification string
+        """
+        if self._calibrations is None:
+            self._calibrations = {}
+            if self.path and os.path.isfile(self.path):
+                try:
+                    with open(self.path) as calibration_file:
+                        self._calibrations = json.load(calibration_file)
+                except (OSError, ValueError):
+                    self._calibrations = {}
+        return self._calibrations
+
+    def _store(self):
+        """Write the calibrations to disk, replacing the old file in one step."""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as calibration_file:
+            json.dump(self._calibrations, calibration_file)
+        os.replace(temporary_path, self.path)
+
+
+# Store shared by the command line interface, GUI and experiments
+calibration_store = CalibrationStore(default_calibration_path())
@@ -0,0 +1,245 @@
+import datetime
+import json
+import os
+import sqlite3
+
+# Name of the catalog database inside an output directory
+CATALOG_FILENAME = ".pythondaq_runs.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    port TEXT,
+    identification TEXT,
+    parameters TEXT,
+    started TEXT NOT NULL,
+    finished TEXT,
+    status TEXT NOT NULL,
+    points INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_name ON runs (name);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started);
+"""
+
+
+def _now():
+    """Return the current local time as ISO 8601 string, which sorts chronologically.
+
+    Returns:
+        str: current time, to the second
+    """
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+class RunCatalog:
+    """Index of the scans saved in an output directory, stored in a SQLite database in that directory.
+
+    Every run gets a unique id from the database, so picking a filename that does
+    not overwrite an earlier run takes the same time however many runs the
+    directory holds. The first run with a name is saved as name.csv, later runs
+    as name(id).csv.
+
+    Attributes:
+    directory (str): output directory the catalog belongs to
+    path (str): path of the database file
+
+    Methods:
+    add_run(name, port, identification, parameters, filepath)
+    finish_run(run_id, status, points)
+    resume_run(run_id)
+    get_run(run_id)
+    runs(port, since, until, status)
+    """
+
+    def __init__(self, directory):
+        """Open the catalog of a directory, creating the database if needed.
+
+        Args:
+            directory (str): output directory
+        """
+        self.directory = directory
+        self.path = os.path.join(directory, CATALOG_FILENAME)
+        with self._connect() as connection:
+            connection.executescript(_SCHEMA)
+        connection.close()
+
+    def _connect(self):
+        """Open a connection to the database, for use in a with statement.
+
+        A connection per operation lets scans on several threads share a catalog.
+
+        Returns:
+            sqlite3.Connection: connection that commits when the with block ends
+        """
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def add_run(
+        self, name, port=None, identification=None, parameters=None, filepath=None
+    ):
+        """Register a new run and pick the .csv file it is saved to.
+
+        Args:
+            name (str): name for the .csv file
+            port (str): port of the scanned device
+            identification (str): identification string of the scanned device
+            parameters (dict): settings of the scan
+            filepath (str): path chosen by the user, otherwise a new file in the directory is picked
+
+        Returns:
+            tuple: id of the run and path of its .csv file
+        """
+        with self._connect() as connection:
+            # The id is reserved first, so the file name derived from it is unique
+            cursor = connection.execute(
+                "INSERT INTO runs (name, path, port, identification, parameters, started, status)"
+                " VALUES (?, '', ?, ?, ?, ?, 'running')",
+                (
+                    name,
+                    port,
+                    identification,
+                    json.dumps(parameters or {}, default=str),
+                    _now(),
+                ),
+            )
+            run_id = cursor.lastrowid
+
+            if filepath is None:
+                filepath = self._new_filepath(connection, name, run_id)
+            connection.execute(
+                "UPDATE runs SET path = ? WHERE id = ?",
+                (os.path.abspath(filepath), run_id),
+            )
+        connection.close()
+        return run_id, filepath
+
+    def _new_filepath(self, connection, name, run_id):
+        """Pick name.csv for the first run with a name, name(id).csv for later ones.
+
+        Args:
+            connection (sqlite3.Connection): open connection to the database
+            name (str): name for the .csv file
+            run_id (int): id of the new run
+
+        Returns:
+            str: path of a .csv file that does not exist yet
+        """
+        earlier = connection.execute(
+            "SELECT 1 FROM runs WHERE name = ? AND id != ? LIMIT 1", (name, run_id)
+        ).fetchone()
+        filepath = os.path.join(self.directory, f"{name}.csv")
+        if earlier is None and not self._exists(filepath):
+            return filepath
+
+        # Files saved before the catalog existed may still use the same name
+        filepath = os.path.join(self.directory, f"{name}({run_id}).csv")
+        suffix = 0
+        while self._exists(filepath):
+            suffix += 1
+            filepath = os.path.join(self.directory, f"{name}({run_id}-{suffix}).csv")
+        return filepath
+
+    def _exists(self, filepath):
+        """Check whether a .csv file, or the .partial file of an interrupted scan, exists.
+
+        Args:
+            filepath (str): path of the .csv file
+
+        Returns:
+            bool: True if either file exists
+        """
+        return os.path.exists(filepath) or os.path.exists(f"{filepath}.partial")
+
+    def finish_run(self, run_id, status="complete", points=None):
+        """Record that a run has ended.
+
+        Args:
+            run_id (int): id of the run
+            status (str): complete, or interrupted if the data is in the .partial file
+            points (int): amount of points saved
+        """
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE runs SET finished = ?, status = ?, points = ? WHERE id = ?",
+                (_now(), status, points, run_id),
+            )
+        connection.close()
+
+    def resume_run(self, run_id):
+        """Record that an interrupted run is running again.
+
+        Args:
+            run_id (int): id of the run
+        """
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE runs SET finished = NULL, status = 'running' WHERE id = ?",
+                (run_id,),
+            )
+        connection.close()
+
+    def get_run(self, run_id):
+        """Look up a single run.
+
+        Args:
+            run_id (int): id of the run
+
+        Returns:
+            dict: id, name, path, port, identification, parameters, started, finished, status and points of the run, None if there is no such run
+        """
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT * FROM runs WHERE id = ?", (run_id,)
+            ).fetchone()
+        connection.close()
+
+        if row is None:
+            return None
+        run = dict(row)
+        run["parameters"] = json.loads(run["parameters"] or "{}")
+        return run
+
+    def runs(self, port=None, since=None, until=None, status=None):
+        """Look up runs, newest first.
+
+        Args:
+            port (str): only runs on ports containing this string
+            since (datetime.datetime): only runs started at or after this time
+            until (datetime.datetime): only runs started before this time
+            status (str): only runs with this status
+
+        Returns:
+            list of dict: id, name, path, port, identification, parameters, started, finished, status and points of every run
+        """
+        conditions, arguments = [], []
+        if port is not None:
+            conditions.append("port LIKE ?")
+            arguments.append(f"%{port}%")
+        if since is not None:
+            conditions.append("started >= ?")
+            arguments.append(since.isoformat(timespec="seconds"))
+        if until is not None:
+            conditions.append("started < ?")
+            arguments.append(until.isoformat(timespec="seconds"))
+        if status is not None:
+            conditions.append("status = ?")
+            arguments.append(status)
+
+        query = "SELECT * FROM runs"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY started DESC, id DESC"
+
+        with self._connect() as connection:
+            rows = connection.execute(query, arguments).fetchall()
+        connection.close()
+
+        runs = []
+        for row in rows:
+            run = dict(row)
+            run["parameters"] = json.loads(run["parameters"] or "{}")
+            runs.append(run)
+        return runs
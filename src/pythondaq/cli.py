@@ -1,12 +1,12 @@
-import csv
 import os
+import re
 
 import click
-import matplotlib.pyplot as plt
-import numpy as np
-from lmfit import Model
 
-from pythondaq.diode_experiment import DiodeExperiment, list_connected_resources
+from pythondaq.catalog import RunCatalog
+from pythondaq.data_writer import ScanWriter
+from pythondaq.discovery import configure_discovery
+from pythondaq.simulated_device import SIMULATED_PORT, enable_simulation
 
 
 class SearchError(Exception):
@@ -15,7 +15,14 @@ class SearchError(Exception):
     pass
 
 
-def plot_data(voltages_LED, currents_LED, errors_voltages_LED, errors_currents_LED):
+def plot_data(
+    voltages_LED,
+    currents_LED,
+    errors_voltages_LED,
+    errors_currents_LED,
+    label=None,
+    show=True,
+):
     """Plots data from scan in diode_experiment.
 
     Args:
@@ -23,21 +30,55 @@ def plot_data(voltages_LED, currents_LED, errors_voltages_LED, errors_currents_L
         currents_LED (list of float): List of measured currents (in Amps).
         errors_voltages_LED (list of float): List of voltage measurement errors.
         errors_currents_LED (list of float): List of current measurement errors.
+        label (str): Label of the data in the legend.
+        show (bool): Show the plot, set to False to add more data first.
     """
+    import matplotlib.pyplot as plt
+
+    from pythondaq.rendering import draw_scan
 
-    plt.errorbar(
+    draw_scan(
+        plt.gca(),
         voltages_LED,
         currents_LED,
-        xerr=errors_voltages_LED,
-        yerr=errors_currents_LED,
-        ecolor="red",
-        fmt="o",
-        markersize=4,
+        errors_voltages_LED,
+        errors_currents_LED,
+        label,
     )
-    plt.title("I-U diagram of LED")
-    plt.xlabel("Voltage U (V)")
-    plt.ylabel("Current I (Amp)")
-    plt.show()
+    if show:
+        plt.show()
+
+
+def output_catalog(output_directory):
+    """Open the run catalog of a set or current directory.
+    \n
+
+    Savedata directory priority:
+        (1) output_directory
+        (2) current directory
+
+
+    Args:
+        output_directory (str): directory to save .csv files in
+
+    Raises:
+        ValueError: if output_directory does not exist
+
+    Returns:
+        RunCatalog: catalog of the runs saved in the directory
+    """
+
+    # Set directory to given directory, or to current if no directory is given
+    if output_directory:
+        directory = os.path.normpath(output_directory)
+        if not os.path.isdir(directory):
+            raise ValueError(
+                f"The specified output directory does not exist: {directory}"
+            )
+    else:
+        directory = os.getcwd()
+
+    return RunCatalog(directory)
 
 
 def save_data(
@@ -47,6 +88,7 @@ def save_data(
     errors_voltages_LED,
     filename,
     output_directory,
+    counts=None,
 ):
     """Save scan data into a new .csv file in a set or current directory.
     \n
@@ -63,53 +105,615 @@ def save_data(
         errors_voltages_LED (list of float): standard errors of the voltages
         filename (str): name for the .csv file containing scan data
         output_directory (str): directory to save .csv file in
+        counts (list of int): optional amount of measurements per point, stored in an extra N column
 
     """
 
-    # Save data only if filename is given
-    if output_directory:
-        # Set directory to given directory, or to current if no directory is given
-        directory = os.path.normpath(output_directory)
-        if not os.path.isdir(directory):
-            raise ValueError(
-                f"The specified output directory does not exist: {directory}"
+    # Register the run, which picks a new filename, and write scan data
+    # into the .csv file located at filepath, which only appears once complete
+    catalog = output_catalog(output_directory)
+    run_id, filepath = catalog.add_run(filename)
+
+    with ScanWriter(filepath, counts=counts is not None) as writer:
+        if counts is None:
+            counts = [None] * len(currents_LED)
+        for current, voltage, error_current, error_voltage, count in zip(
+            currents_LED, voltages_LED, errors_currents_LED, errors_voltages_LED, counts
+        ):
+            writer.write_point(voltage, current, error_voltage, error_current, count)
+    catalog.finish_run(run_id, points=writer.rows)
+
+    print(f"Data saved successfully to {filepath}")
+
+
+def open_scan_writer(
+    LED_scan,
+    starting_value,
+    stopping_value,
+    repeats,
+    options,
+    output,
+    output_directory,
+    identification=None,
+):
+    """Add a scan to the run catalog and open the .csv file its points are appended to.
+
+    Args:
+        LED_scan (DiodeExperiment): experiment on the device to scan
+        starting_value (int): starting ADC voltage value, corrected for the calibration
+        stopping_value (int): stopping ADC voltage value, corrected for the calibration
+        repeats (int): amount of measurements per ADC voltage value
+        options (dict): adaptive, budget, coarse_step, max_repeats, target_sem_voltage, target_sem_current and raw of the scan
+        output (str): name for the .csv file
+        output_directory (str): directory to save .csv file in
+        identification (str): identification string of the arduino, asked through the device pool if not given
+
+    Returns:
+        tuple: the RunCatalog, id of the run and the ScanWriter
+    """
+    catalog = output_catalog(output_directory)
+    metadata = LED_scan.scan_metadata(
+        starting_value, stopping_value, repeats, identification, **options
+    )
+    run_id, filepath = catalog.add_run(
+        output, LED_scan.port, metadata["identification"], metadata
+    )
+    return catalog, run_id, ScanWriter(filepath, {"run": run_id, **metadata})
+
+
+def scan_device(
+    device,
+    starting_value,
+    stopping_value,
+    repeats,
+    options,
+    output,
+    output_directory,
+    keep_data,
+    progress=None,
+    cancel=None,
+):
+    """Scan a single device, printing and saving every point as it is measured.
+
+    Args:
+        device (str): port of the device to scan
+        starting_value (int): starting ADC voltage value
+        stopping_value (int): stopping ADC voltage value
+        repeats (int): amount of measurements per ADC voltage value
+        options (dict): adaptive, budget, coarse_step, max_repeats, target_sem_voltage, target_sem_current and raw of the scan
+        output (str): name for the .csv file, no file is written if not given
+        output_directory (str): directory to save .csv file in
+        keep_data (bool): keep all points in a ScanResult, otherwise only the current point is kept
+        progress (callable): function called with the amount of completed and total steps, instead of printing every point
+        cancel (threading.Event): event that stops the scan before its next step, the run is then saved as interrupted
+
+    Returns:
+        ScanResult: all points if keep_data, adaptive or raw, otherwise None
+    """
+
+    from pythondaq.diode_experiment import DiodeExperiment
+    from pythondaq.journal import ScanJournal, journal_path
+    from pythondaq.scan_result import ScanResult
+
+    # Measure steps until they reach the target standard errors, if given
+    convergence = {
+        "max_repeats": options["max_repeats"],
+        "target_sem_voltage": options["target_sem_voltage"],
+        "target_sem_current": options["target_sem_current"],
+    }
+
+    LED_scan = DiodeExperiment(device, progress=progress, cancel=cancel)
+
+    # Correct the ADC output values for the calibrated output channel
+    starting_value = LED_scan.calibration.output_value(starting_value)
+    stopping_value = LED_scan.calibration.output_value(stopping_value)
+
+    # Only keep the measurements in memory when they are graphed or fitted
+    width = LED_scan.result_width(repeats, **convergence)
+    result = None
+    if keep_data:
+        result = ScanResult(
+            range(starting_value, stopping_value + 1),
+            width,
+            LED_scan.resistance,
+            LED_scan.calibration,
+        )
+
+    # Open the .csv file before the scan so every step is appended as it is measured
+    writer = None
+    if output:
+        catalog, run_id, writer = open_scan_writer(
+            LED_scan,
+            starting_value,
+            stopping_value,
+            repeats,
+            options,
+            output,
+            output_directory,
+        )
+
+    # Journal the measurements of every step, so 'diode scan --resume' can continue the scan
+    journal = None
+    if writer is not None and not (options["raw"] or options["adaptive"]):
+        journal = ScanJournal(journal_path(writer.filepath), width)
+
+    try:
+        # An adaptive scan measures out of order, so its points are only shown once sorted
+        if options["raw"]:
+            capture = LED_scan.scan_raw(
+                starting_value, stopping_value, repeats, options["raw"]
+            )
+            result = capture.to_result(
+                LED_scan.resistance, calibration=LED_scan.calibration
+            )
+            points = list(zip(*result, result.counts))
+            if writer is not None:
+                for point in points:
+                    writer.write_point(*point)
+        elif options["adaptive"]:
+            result = LED_scan.adaptive_scan(
+                starting_value,
+                stopping_value,
+                repeats,
+                options["budget"],
+                options["coarse_step"],
+                **convergence,
+                writer=writer,
+            )
+            points = zip(*result, result.counts)
+        else:
+            points = LED_scan.iter_scan(
+                starting_value,
+                stopping_value,
+                repeats,
+                result,
+                **convergence,
+                writer=writer,
+                journal=journal,
+            )
+
+        for voltage, current, error_voltage, error_current, count in points:
+            if progress is None:
+                print(f"U = {voltage} V, I = {current} A")
+    except BaseException:
+        # Keep what was measured so far in the .partial file
+        if writer is not None:
+            writer.abort()
+            catalog.finish_run(run_id, "interrupted", writer.rows)
+            print(f"Scan interrupted, partial data saved to {writer.partial_path}")
+        if journal is not None:
+            journal.close()
+            print(f"Continue the scan with 'diode scan --resume {run_id}'")
+        raise
+
+    if journal is not None:
+        journal.remove()
+    if writer is not None:
+        writer.finalize()
+        catalog.finish_run(run_id, points=writer.rows)
+        print(f"Data saved successfully to {writer.filepath}")
+
+    return result
+
+
+async def ascan_device(
+    device,
+    starting_value,
+    stopping_value,
+    repeats,
+    options,
+    output,
+    output_directory,
+    keep_data,
+    progress=None,
+):
+    """Scan a single device from the event loop, saving every point as it is measured.
+
+    The arduino is opened once as an AsyncArduinoDevice, its identification and
+    calibration are asked over that connection. Only full scans are measured
+    this way, raw captures and adaptive scans are not, and the scan is not
+    journaled so it cannot be resumed.
+
+    Args:
+        device (str): port of the device to scan
+        starting_value (int): starting ADC voltage value
+        stopping_value (int): stopping ADC voltage value
+        repeats (int): amount of measurements per ADC voltage value
+        options (dict): adaptive, budget, coarse_step, max_repeats, target_sem_voltage, target_sem_current and raw of the scan
+        output (str): name for the .csv file, no file is written if not given
+        output_directory (str): directory to save .csv file in
+        keep_data (bool): keep all points in a ScanResult, otherwise only the current point is kept
+        progress (callable): function called with the amount of completed and total steps, instead of printing every point
+
+    Returns:
+        ScanResult: all points if keep_data, otherwise None
+    """
+
+    from pythondaq.diode_experiment import DiodeExperiment
+
+    convergence = {
+        "max_repeats": options["max_repeats"],
+        "target_sem_voltage": options["target_sem_voltage"],
+        "target_sem_current": options["target_sem_current"],
+    }
+
+    LED_scan = DiodeExperiment(device, progress=progress)
+    arduino = await LED_scan.aopen()
+    writer = None
+    try:
+        starting_value = LED_scan.calibration.output_value(starting_value)
+        stopping_value = LED_scan.calibration.output_value(stopping_value)
+
+        if output:
+            catalog, run_id, writer = open_scan_writer(
+                LED_scan,
+                starting_value,
+                stopping_value,
+                repeats,
+                options,
+                output,
+                output_directory,
+                identification=await arduino.get_identification(),
+            )
+
+        result = None
+        if keep_data:
+            result = await LED_scan.ascan(
+                starting_value,
+                stopping_value,
+                repeats,
+                **convergence,
+                writer=writer,
+                arduino=arduino,
+            )
+        else:
+            async for voltage, current, *_ in LED_scan.aiter_scan(
+                starting_value,
+                stopping_value,
+                repeats,
+                **convergence,
+                writer=writer,
+                arduino=arduino,
+            ):
+                if progress is None:
+                    print(f"U = {voltage} V, I = {current} A")
+    except BaseException:
+        # Keep what was measured so far in the .partial file
+        if writer is not None:
+            writer.abort()
+            catalog.finish_run(run_id, "interrupted", writer.rows)
+            print(f"Scan interrupted, partial data saved to {writer.partial_path}")
+        raise
+    finally:
+        await arduino.close()
+
+    if writer is not None:
+        writer.finalize()
+        catalog.finish_run(run_id, points=writer.rows)
+        print(f"Data saved successfully to {writer.filepath}")
+
+    return result
+
+
+def resume_scan(run_id, device, output_directory, keep_data):
+    """Continue an interrupted scan after its last completed step, using the journal next to its .csv file.
+
+    The steps in the journal are written to the .csv file again, followed by the
+    remaining steps, so the file equals that of a scan that was never interrupted.
+
+    Args:
+        run_id (int): id of the interrupted run in the catalog
+        device (str): port to continue on, None for the port of the run
+        output_directory (str): directory whose run catalog holds the run
+        keep_data (bool): return all points of the run in a ScanResult
+
+    Raises:
+        click.ClickException: if the run cannot be resumed
+
+    Returns:
+        ScanResult: all points of the run if keep_data, otherwise None
+    """
+    import datetime
+
+    from pythondaq.diode_experiment import DiodeExperiment
+    from pythondaq.journal import ScanJournal, journal_path
+
+    catalog = output_catalog(output_directory)
+    run = catalog.get_run(run_id)
+    if run is None:
+        raise click.ClickException(f"There is no run {run_id} in {catalog.directory}")
+    if run["status"] == "complete":
+        raise click.ClickException(f"Run {run_id} is already complete")
+    parameters = run["parameters"]
+    if parameters.get("adaptive") or parameters.get("raw"):
+        raise click.ClickException(
+            f"Run {run_id} is an adaptive or raw scan, which cannot be resumed"
+        )
+    path = journal_path(run["path"])
+    if not os.path.isfile(path):
+        raise click.ClickException(f"Run {run_id} has no journal to resume from")
+
+    # Reconnect to the port of the run, unless another one is given
+    if device is None:
+        device = run["port"]
+
+    # The ADC output values in the parameters are already corrected for the calibration
+    starting_value = parameters["start"]
+    stopping_value = parameters["stop"]
+    repeats = parameters["repeats"]
+    convergence = {
+        "max_repeats": parameters.get("max_repeats"),
+        "target_sem_voltage": parameters.get("target_sem_voltage"),
+        "target_sem_current": parameters.get("target_sem_current"),
+    }
+
+    LED_scan = DiodeExperiment(device)
+    if LED_scan.get_identification() != run["identification"]:
+        raise click.ClickException(
+            f"Run {run_id} was measured with {run['identification']}, not with the device on {device}"
+        )
+    journal = ScanJournal.resume(path)
+    if journal.width != LED_scan.result_width(repeats, **convergence):
+        raise click.ClickException(
+            f"The journal of run {run_id} does not match its settings"
+        )
+
+    # Write the journaled steps again, the .partial file may lag behind the journal
+    catalog.resume_run(run_id)
+    resumed = datetime.datetime.now().isoformat(timespec="seconds")
+    writer = ScanWriter(run["path"], {"run": run_id, **parameters, "resumed": resumed})
+    completed = journal.result(LED_scan.resistance, LED_scan.calibration)
+    for point in zip(*completed, completed.counts):
+        writer.write_point(*point)
+    print(f"Resuming run {run_id} after {journal.steps} completed steps")
+
+    try:
+        points = LED_scan.iter_scan(
+            starting_value + journal.steps,
+            stopping_value,
+            repeats,
+            **convergence,
+            writer=writer,
+            journal=journal,
+        )
+        for voltage, current, error_voltage, error_current, count in points:
+            print(f"U = {voltage} V, I = {current} A")
+    except BaseException:
+        writer.abort()
+        catalog.finish_run(run_id, "interrupted", writer.rows)
+        journal.close()
+        print(f"Scan interrupted, partial data saved to {writer.partial_path}")
+        print(f"Continue the scan with 'diode scan --resume {run_id}'")
+        raise
+
+    result = None
+    if keep_data:
+        result = journal.result(LED_scan.resistance, LED_scan.calibration)
+    journal.remove()
+    writer.finalize()
+    catalog.finish_run(run_id, points=writer.rows)
+    print(f"Data saved successfully to {writer.filepath}")
+    return result
+
+
+def port_suffix(port):
+    """Turn a port into a suffix for file names.
+
+    Args:
+        port (str): port of a device
+
+    Returns:
+        str: the port with every run of other characters than letters and digits replaced by _
+    """
+    return re.sub(r"[^A-Za-z0-9]+", "_", port).strip("_")
+
+
+def scan_parallel(
+    devices_list,
+    starting_value,
+    stopping_value,
+    repeats,
+    options,
+    output,
+    output_directory,
+    keep_data,
+    asynchronous=False,
+):
+    """Scan several devices at the same time with a shared progress display.
+
+    Every device gets its own .csv file, and raw .npy file, named after output and the port.
+    The devices are scanned on worker threads, or from a single event loop if asynchronous.
+
+    Args:
+        devices_list (list of str): ports of the devices to scan
+        starting_value (int): starting ADC voltage value
+        stopping_value (int): stopping ADC voltage value
+        repeats (int): amount of measurements per ADC voltage value
+        options (dict): adaptive, budget, coarse_step, max_repeats, target_sem_voltage, target_sem_current and raw of the scan
+        output (str): name for the .csv files, no files are written if not given
+        output_directory (str): directory to save .csv files in
+        keep_data (bool): keep all points of every device
+        asynchronous (bool): scan with ascan_device on one event loop instead of threads, only for full scans
+
+    Returns:
+        dict: ScanResult (or None) for every port
+    """
+    from rich.progress import Progress
+
+    from pythondaq.diode_experiment import ascan_devices, scan_devices
+
+    with Progress() as progress_display:
+        tasks = {
+            device: progress_display.add_task(f"[cyan]{device}", total=None)
+            for device in devices_list
+        }
+
+        def arguments(device):
+            def progress(completed, total):
+                progress_display.update(tasks[device], completed=completed, total=total)
+
+            suffix = port_suffix(device)
+            filename = None
+            if output:
+                filename = f"{output}_{suffix}"
+            device_options = dict(options)
+            if options["raw"]:
+                root, extension = os.path.splitext(options["raw"])
+                device_options["raw"] = f"{root}_{suffix}{extension or '.npy'}"
+            return (
+                device,
+                starting_value,
+                stopping_value,
+                repeats,
+                device_options,
+                filename,
+                output_directory,
+                keep_data,
+                progress,
             )
+
+        if asynchronous:
+            import asyncio
+
+            async def ascan(device):
+                return await ascan_device(*arguments(device))
+
+            return asyncio.run(ascan_devices(devices_list, ascan))
+
+        return scan_devices(
+            devices_list,
+            lambda device, cancel: scan_device(*arguments(device), cancel=cancel),
+        )
+
+
+def report_profile(summary, output):
+    """Stop profiling, then print the recorded profile and/or write it to a .json file.
+
+    Args:
+        summary (bool): print tables with the latencies and stage durations
+        output (str): .json file to write the histograms to, None to not write them
+    """
+    from pythondaq.profiling import print_profile_report, stop_profiling
+
+    recorded = stop_profiling()
+    if summary:
+        print_profile_report(recorded)
+    if output:
+        recorded.dump(output)
+        print(f"Profile saved to {output}")
+
+
+def plot_shockley(
+    result, device, fit_ideality=False, temperature=300, renderer=None, path=None
+):
+    """Fit the Shockley diode formula to a scan, print the fit report and plot the fit.
+
+    Args:
+        result (ScanResult): measured scan
+        device (str): port of the scanned device, used in the title
+        fit_ideality (bool): fit the ideality factor n with V_t fixed at kT/q
+        temperature (float): temperature of the diode in Kelvin
+        renderer (FigureRenderer): renderer that writes the plot to path in the background, instead of showing it
+        path (str): .png or .svg file to write the plot to with renderer
+    """
+
+    from pythondaq import fitting
+    from pythondaq.rendering import draw_shockley, new_figure
+
+    # Shockley formula: I = Is * (exp(Vd/n*Vt) - 1)
+    fit = fitting.fit_scan(result, fit_ideality, temperature)
+
+    print(fit.report())
+    print(f"I_s = {fit.saturation_current} A")
+    if fit_ideality:
+        print(f"n = {fit.ideality} +/- {fit.errors.get('ideality')}")
     else:
-        directory = os.getcwd()
+        print(f"V_t = {fit.thermal_voltage} V +/- {fit.errors.get('thermal_voltage')}")
+        print(f"Boltzmann constant = {fit.boltzmann_constant(temperature)}")
+
+    voltages_LED, currents_LED, _, _ = result
+    if renderer is not None:
+        figure, axes = new_figure()
+        draw_shockley(
+            axes, voltages_LED, currents_LED, fit.currents(voltages_LED), device
+        )
+        renderer.submit(figure, path)
+        return
 
-    # Check if the current filename already exists in the specified directory
-    # If so, iterate the filename to filename(1), filename(2), etc.
-    entries = os.listdir(directory)
-
-    original_filename = filename
-    if f"{original_filename}.csv" in entries:
-        counter = 0
-        while f"{filename}.csv" in entries:
-            counter += 1
-            filename = f"{original_filename}({counter})"
-
-    # Write scan data into .csv file located at filepath
-    filepath = os.path.join(directory, filename)
-
-    with open(f"{filepath}.csv", "w", newline="") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(["I (A)", "U (V)", "SEM_I (A)", "SEM_U (V)"])
-        for (
-            current,
-            voltage,
-            error_current,
-            error_voltage,
-        ) in zip(currents_LED, voltages_LED, errors_currents_LED, errors_voltages_LED):
-            writer.writerow([current, voltage, error_current, error_voltage])
+    import matplotlib.pyplot as plt
 
-    print(f"Data saved successfully to {filepath}")
+    draw_shockley(
+        plt.gca(), voltages_LED, currents_LED, fit.currents(voltages_LED), device
+    )
+    plt.show()
 
 
 # Create group of commands for diode
 @click.group()
-def diode():
+@click.option(
+    "--simulate",
+    is_flag=True,
+    default=False,
+    envvar="PYTHONDAQ_SIMULATE",
+    help="Add a simulated Arduino (SIM::ARDUINO::INSTR) to the connected devices.",
+)
+@click.option(
+    "--sim-latency",
+    default=0.0,
+    help="Time in seconds every query to the simulated Arduino takes.",
+)
+@click.option(
+    "--sim-jitter",
+    default=0.0,
+    help="Maximum random time in seconds added to the simulated latency.",
+)
+@click.option(
+    "--sim-noise",
+    default=1.0,
+    help="Standard deviation of the simulated ADC noise in ADC counts.",
+)
+@click.option(
+    "--sim-devices",
+    default=1,
+    help="Amount of simulated Arduinos to add to the connected devices.",
+)
+@click.option(
+    "--sim-firmware",
+    type=click.Choice(["1.0.0", "1.1.0"]),
+    default="1.1.0",
+    help="Firmware version of the simulated Arduinos, 1.0.0 has no bulk measurements.",
+)
+@click.option(
+    "--discovery-ttl",
+    default=10.0,
+    envvar="PYTHONDAQ_DISCOVERY_TTL",
+    help="Seconds the list of connected devices is cached, 0 disables caching.",
+)
+@click.option(
+    "--discovery-cache/--no-discovery-cache",
+    default=True,
+    help="Toggle sharing the cached list of connected devices between runs.",
+)
+def diode(
+    simulate,
+    sim_latency,
+    sim_jitter,
+    sim_noise,
+    sim_devices,
+    sim_firmware,
+    discovery_ttl,
+    discovery_cache,
+):
     """Parent command of info, list, scan."""
-    pass
+    configure_discovery(ttl=discovery_ttl, persist=discovery_cache)
+    if simulate:
+        enable_simulation(
+            latency=sim_latency,
+            jitter=sim_jitter,
+            noise=sim_noise,
+            devices=sim_devices,
+            firmware=sim_firmware,
+        )
 
 
 @diode.command("info")
@@ -124,11 +728,9 @@ def info(search):
         SearchError: if search string does not yield a single device
     """
 
-    connected_ports = list_connected_resources()
-    devices_list = []
-    for device in connected_ports:
-        if search in device:
-            devices_list.append(device)
+    from pythondaq.diode_experiment import DiodeExperiment, search_connected_resources
+
+    devices_list = search_connected_resources(search)
 
     if len(devices_list) > 1 or len(devices_list) == 0:
         raise SearchError(
@@ -144,22 +746,29 @@ def info(search):
 
 @diode.command("list")
 @click.option("-s", "--search", required=False)
-def view_list(search):
+@click.option(
+    "--refresh",
+    is_flag=True,
+    default=False,
+    help="Look for connected devices again instead of using the cached list.",
+)
+def view_list(search, refresh):
     """Retreive and print list of connected devices.
 
     Args:
         search (str): string to look for in list of connected devices
+        refresh (bool): look for connected devices instead of using the cached list
     """
-    connected_ports = list_connected_resources()
+    # The discovery cache is used directly, listing needs no experiment
+    from pythondaq.discovery import resource_cache
+
     if search:
-        search_devices = []
-        for device in connected_ports:
-            if search in device:
-                search_devices.append(device)
+        search_devices = resource_cache.search(search, refresh)
         print("The devices that match your search string:\n")
         for device in search_devices:
             print(device)
     else:
+        connected_ports = resource_cache.list(refresh)
         print("The device connected to your computer:\n")
         for port in connected_ports:
             print(port)
@@ -167,9 +776,7 @@ def view_list(search):
 
 # Command to start LED scan
 @diode.command("scan")
-@click.argument(
-    "port",
-)
+@click.argument("port", nargs=-1, required=False)
 @click.option(
     "-s",
     "-start",
@@ -191,6 +798,20 @@ def view_list(search):
     default=3,
     help="Amount of measurements to run per ADC voltage value of the scan.",
 )
+@click.option(
+    "-m",
+    "--multiple",
+    is_flag=True,
+    default=False,
+    help="Scan every device that matches the search strings at the same time, saving one .csv file per device.",
+)
+@click.option(
+    "--async",
+    "asynchronous",
+    is_flag=True,
+    default=False,
+    help="Drive the devices from a single event loop instead of a thread per device.",
+)
 @click.option(
     "-o",
     "--output",
@@ -218,15 +839,105 @@ def view_list(search):
     default=False,
     help="Toggle fitting the data to shockley formula.",
 )
+@click.option(
+    "--ideality",
+    is_flag=True,
+    default=False,
+    help="Fit the ideality factor n of the Shockley formula, with V_t fixed by the temperature.",
+)
+@click.option(
+    "--temperature",
+    default=300.0,
+    help="Temperature of the LED in Kelvin, used for V_t and the Boltzmann constant.",
+)
+@click.option(
+    "--adaptive",
+    is_flag=True,
+    default=False,
+    help="Toggle a coarse scan refined where the current changes quickly, instead of measuring every ADC value.",
+)
+@click.option(
+    "--budget",
+    default=120,
+    help="Total amount of ADC values measured in an adaptive scan.",
+)
+@click.option(
+    "--coarse-step",
+    default=32,
+    help="Distance between ADC values in the coarse pass of an adaptive scan.",
+)
+@click.option(
+    "--target-sem-voltage",
+    type=float,
+    required=False,
+    help="Keep measuring a step in batches of repeats until the standard error of the voltage (V) is this small.",
+)
+@click.option(
+    "--target-sem-current",
+    type=float,
+    required=False,
+    help="Keep measuring a step in batches of repeats until the standard error of the current (A) is this small.",
+)
+@click.option(
+    "--max-repeats",
+    type=int,
+    required=False,
+    help="Maximum amount of measurements per step when a target standard error is given, 10 times repeats by default.",
+)
+@click.option(
+    "--raw",
+    type=click.Path(dir_okay=False),
+    required=False,
+    help="Keep the raw ADC values in this memory-mapped .npy file, to convert them again later with 'diode convert'.",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Time every query per command kind and every stage of the scan, and print a summary.",
+)
+@click.option(
+    "--profile-output",
+    type=click.Path(dir_okay=False),
+    required=False,
+    help="Also write the query and stage histograms of --profile to this .json file.",
+)
+@click.option(
+    "--resume",
+    type=int,
+    required=False,
+    help="Continue the interrupted run with this id (see 'diode runs') after its last completed step, on PORT if given.",
+)
+@click.option(
+    "--figure",
+    type=click.Path(dir_okay=False),
+    required=False,
+    help="Write the graph to this .png or .svg file in the background instead of showing it, Shockley fits are written next to it. Without a display this is scan.png.",
+)
 def view_scan(
     port,
     starting_voltage,
     stopping_voltage,
     repeats,
+    multiple,
+    asynchronous,
     output,
     output_directory,
     graph,
     shockley,
+    ideality,
+    temperature,
+    adaptive,
+    budget,
+    coarse_step,
+    target_sem_voltage,
+    target_sem_current,
+    max_repeats,
+    raw,
+    profile,
+    profile_output,
+    resume,
+    figure,
 ):
     """Start a LED scan in a given voltage range. Plot and optionally save the data.
     \n
@@ -235,76 +946,942 @@ def view_scan(
         (1) If output_directory correctly provided, savedata goes there.
         (2) If output_directoy not provided, savedata goes to current directory.
     \b
+    With --multiple, every device matching one of the search strings is scanned
+    at the same time and saved to its own .csv file. With --async the devices
+    are driven from a single event loop, for full scans that are not resumable.
+    \b
+    With --resume, an interrupted run continues after its last completed step
+    with its original settings, and is saved to its original .csv file.
+    \b
+    With --figure, or without a display, the graph and Shockley fits are
+    written to files instead of being shown.
+    \b
     Args:
-        port (str): port connected to Arduino
+        port (tuple of str): search strings for the ports connected to Arduinos
 
     Raises:
-        SearchError: if provided search string does not yield a single connected device.
+        SearchError: if provided search strings do not yield a single connected device, or none with --multiple.
 
     """
 
+    from pythondaq.diode_experiment import search_connected_resources
+
     V_to_ADC_step = 1023 / 3.3
     starting_value = int(starting_voltage * V_to_ADC_step)
     stopping_value = int(stopping_voltage * V_to_ADC_step)
 
-    # Check whether search string only applies to single device
-    # reason is code won't work with >1 devices
-    connected_ports = list_connected_resources()
+    # Collect the devices that match any of the search strings
     devices_list = []
-    for device in connected_ports:
-        if port in device:
-            devices_list.append(device)
-    if len(devices_list) > 1 or len(devices_list) == 0:
+    for search in port:
+        for device in search_connected_resources(search):
+            if device not in devices_list:
+                devices_list.append(device)
+
+    # Check whether search string only applies to single device,
+    # unless scanning several devices at once was asked for,
+    # a resumed run continues on its own port if none is given
+    if resume is None and not port:
+        raise click.UsageError("Missing argument 'PORT...'.")
+    if resume is not None and multiple:
+        raise click.UsageError("--resume continues a single run, not --multiple")
+    if port and (len(devices_list) == 0 or (len(devices_list) > 1 and not multiple)):
         raise SearchError(
             f"Search str must only return 1 device in diode list, not {len(devices_list)}"
         )
 
-    LED_scan = DiodeExperiment(port)
-    voltages_LED, currents_LED, errors_voltages_LED, errors_currents_LED = (
-        LED_scan.scan(starting_value, stopping_value, repeats)
+    # A raw capture stores a fixed amount of measurements for every ADC value
+    if raw and (adaptive or target_sem_voltage or target_sem_current):
+        raise click.UsageError(
+            "--raw cannot be combined with --adaptive or a target standard error"
+        )
+
+    # The event loop only measures full scans, which are not journaled
+    if asynchronous and (raw or adaptive or resume is not None):
+        raise click.UsageError(
+            "--async cannot be combined with --raw, --adaptive or --resume"
+        )
+
+    # An adaptive scan refines the range between start and stop, so it cannot run backwards
+    if adaptive and starting_value > stopping_value:
+        raise click.UsageError(
+            "--adaptive needs a starting voltage that is not above the stopping voltage"
+        )
+
+    options = {
+        "raw": raw,
+        "adaptive": adaptive,
+        "budget": budget,
+        "coarse_step": coarse_step,
+        "max_repeats": max_repeats,
+        "target_sem_voltage": target_sem_voltage,
+        "target_sem_current": target_sem_current,
+    }
+
+    # Record the queries and stages of the scan, also when it is interrupted
+    profiling = profile or profile_output
+    if profiling:
+        from pythondaq.profiling import start_profiling
+
+        start_profiling()
+    try:
+        if resume is not None:
+            results = {
+                f"run {resume}": resume_scan(
+                    resume,
+                    devices_list[0] if devices_list else None,
+                    output_directory,
+                    keep_data=graph or shockley,
+                )
+            }
+        elif len(devices_list) == 1 and asynchronous:
+            import asyncio
+
+            results = {
+                devices_list[0]: asyncio.run(
+                    ascan_device(
+                        devices_list[0],
+                        starting_value,
+                        stopping_value,
+                        repeats,
+                        options,
+                        output,
+                        output_directory,
+                        keep_data=graph or shockley,
+                    )
+                )
+            }
+        elif len(devices_list) == 1:
+            results = {
+                devices_list[0]: scan_device(
+                    devices_list[0],
+                    starting_value,
+                    stopping_value,
+                    repeats,
+                    options,
+                    output,
+                    output_directory,
+                    keep_data=graph or shockley,
+                )
+            }
+        else:
+            results = scan_parallel(
+                devices_list,
+                starting_value,
+                stopping_value,
+                repeats,
+                options,
+                output,
+                output_directory,
+                keep_data=graph or shockley,
+                asynchronous=asynchronous,
+            )
+    finally:
+        if profiling:
+            report_profile(profile, profile_output)
+
+    from pythondaq.rendering import (
+        FigureRenderer,
+        draw_scan,
+        new_figure,
+        select_backend,
     )
 
-    print(voltages_LED, currents_LED)
+    # Without a display the figures are written to files on a background thread
+    renderer = None
+    if (graph or shockley) and (figure or select_backend()):
+        renderer = FigureRenderer()
+        figure = figure or "scan.png"
+        root, extension = os.path.splitext(figure)
 
-    if graph:
-        plot_data(voltages_LED, currents_LED, errors_voltages_LED, errors_currents_LED)
+    if graph and renderer is not None:
+        graph_figure, axes = new_figure()
+        for device, result in results.items():
+            draw_scan(axes, *result, label=device)
+        if len(results) > 1:
+            axes.legend(loc="best")
+        renderer.submit(graph_figure, figure)
+    elif graph:
+        import matplotlib.pyplot as plt
 
-    if output:
-        save_data(
-            currents_LED,
-            voltages_LED,
-            errors_currents_LED,
-            errors_voltages_LED,
-            output,
-            output_directory,
+        for device, result in results.items():
+            plot_data(*result, label=device, show=False)
+        if len(results) > 1:
+            plt.legend(loc="best")
+        plt.show()
+
+    for device, result in results.items():
+        if shockley:
+            path = None
+            if renderer is not None:
+                path = f"{root}_shockley_{port_suffix(device)}{extension}"
+            plot_shockley(result, device, ideality, temperature, renderer, path)
+
+    if renderer is not None:
+        for path in renderer.close():
+            print(f"Figure saved to {path}")
+
+
+@diode.command("runs")
+@click.option(
+    "-p",
+    "--port",
+    type=str,
+    required=False,
+    help="Only show runs on ports containing this string.",
+)
+@click.option(
+    "--since",
+    type=click.DateTime(),
+    required=False,
+    help="Only show runs started at or after this date (and time).",
+)
+@click.option(
+    "--until",
+    type=click.DateTime(),
+    required=False,
+    help="Only show runs started before this date (and time).",
+)
+@click.option(
+    "--status",
+    type=click.Choice(["running", "complete", "interrupted"]),
+    required=False,
+    help="Only show runs with this status.",
+)
+@click.option(
+    "-od",
+    "--output-directory",
+    type=str,
+    required=False,
+    help="Directory whose runs are shown, the current directory if not given.",
+)
+def view_runs(port, since, until, status, output_directory):
+    """Show the runs saved in an output directory, newest first.
+
+    Args:
+        port (str): string to look for in the ports of the runs
+        since (datetime.datetime): earliest start time of the runs
+        until (datetime.datetime): start time the runs must be before
+        status (str): status of the runs
+        output_directory (str): directory whose run catalog is read
+    """
+    catalog = output_catalog(output_directory)
+    for run in catalog.runs(port, since, until, status):
+        print(
+            f"{run['id']:>6}  {run['started']}  {run['status']:<11}  "
+            f"{run['points'] if run['points'] is not None else '-':>5}  "
+            f"{run['port'] or '-'}  {run['path']}"
         )
 
-    if shockley:
 
-        # Shockley formula: I = Is * (exp(Vd/n*Vt) - 1)
-        # 'n' parameter has been left out
-        # reason is fit having trouble with 3rd parameter
-        def shockley(V_d, I_s, V_t):
-            return I_s * (np.exp((V_d) / (V_t)) - 1)
+@diode.command("convert")
+@click.argument("raw_file", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "-o",
+    "--output",
+    type=str,
+    required=True,
+    help="Store the converted data into .csv file with given filename.",
+)
+@click.option(
+    "-od",
+    "--output-directory",
+    type=str,
+    required=False,
+    help="Give directory you want to save data in, the current directory if not given.",
+)
+@click.option(
+    "--resistance",
+    default=220.0,
+    help="Resistance in Ohm of the resistor in series with the LED.",
+)
+@click.option(
+    "--adc-step",
+    type=float,
+    required=False,
+    help="Volts per ADC count, 3.3 / 1023 if not given.",
+)
+@click.option(
+    "--identification",
+    type=str,
+    required=False,
+    help="Convert with the stored calibration of the Arduino with this identification string, instead of --adc-step.",
+)
+def view_convert(
+    raw_file, output, output_directory, resistance, adc_step, identification
+):
+    """Convert the raw ADC values of a scan made with --raw to voltages and currents and save them.
+
+    Args:
+        raw_file (str): .npy file written by 'diode scan --raw'
+        output (str): name for the .csv file
+        output_directory (str): directory to save .csv file in
+        resistance (float): resistance in Ohm of the resistor in series with the LED
+        adc_step (float): Volts per ADC count
+        identification (str): identification string of the Arduino whose calibration is used
+    """
+    from pythondaq.calibration import calibration_store
+    from pythondaq.raw_capture import ADC_STEP, RawCapture
 
-        smodel = Model(shockley)
-        params = smodel.make_params(I_s=0, V_t=0.01)
-        result = smodel.fit(currents_LED, params, V_d=voltages_LED)
+    calibration = None
+    if identification:
+        calibration = calibration_store.get(identification)
 
-        print(result.fit_report())
-        V_t_fitted = result.params["V_t"].value
-        fitted_currents = result.best_fit
+    capture = RawCapture.load(raw_file)
+    result = capture.to_result(resistance, adc_step or ADC_STEP, calibration)
+    save_data(
+        result.currents[: len(result)],
+        result.voltages[: len(result)],
+        result.errors_currents[: len(result)],
+        result.errors_voltages[: len(result)],
+        output,
+        output_directory,
+        result.counts[: len(result)],
+    )
 
-        k = (V_t_fitted * 1.602e-19) / 300
-        print(f"Boltzmann constant = {k}")
 
-        plt.plot(voltages_LED, currents_LED, ".", label="Scan")
-        plt.plot(voltages_LED, fitted_currents, ".", label="Fit")
-        plt.legend(loc="best")
-        plt.title("Shockley fit of LED scan")
-        plt.xlabel("Voltage (V)")
-        plt.ylabel("Current (A)")
-        plt.show()
+@diode.command("calibrate")
+@click.argument("port")
+@click.option(
+    "-s",
+    "--start",
+    default=0,
+    help="First ADC output value of the sweep.",
+)
+@click.option(
+    "-e",
+    "--stop",
+    default=1023,
+    help="Last ADC output value of the sweep.",
+)
+@click.option(
+    "-r",
+    "--repeats",
+    default=5,
+    help="Amount of measurements per ADC output value.",
+)
+@click.option(
+    "-c",
+    "--channel",
+    "channels",
+    type=click.Choice(["1", "2"]),
+    multiple=True,
+    help="Input channel to calibrate, both if not given. Channel 2 only measures the output when the LED is replaced by a wire.",
+)
+@click.option(
+    "--reference",
+    type=click.Path(exists=True, dir_okay=False),
+    required=False,
+    help="CSV file with the output voltage measured with a multimeter per ADC output value (columns value, voltage), also calibrates the output.",
+)
+@click.option(
+    "--table",
+    is_flag=True,
+    default=False,
+    help="Store a lookup table for every ADC count instead of a gain and offset.",
+)
+@click.option(
+    "--resistance",
+    type=float,
+    required=False,
+    help="Measured resistance in Ohm of the resistor in series with the LED.",
+)
+@click.option(
+    "--reset",
+    is_flag=True,
+    default=False,
+    help="Forget the stored calibration of the device instead of calibrating it.",
+)
+def view_calibrate(
+    port, start, stop, repeats, channels, reference, table, resistance, reset
+):
+    """Calibrate the channels of an Arduino with a sweep of the output and store the calibration.
+
+    \b
+    During the sweep the input channels measure the output of channel 0 directly.
+    Channel 1 always does, for channel 2 the LED has to be replaced by a wire.
+    The calibration is stored under the identification string of the Arduino and
+    applied to every following scan of it.
+
+    Args:
+        port (str): search string for the port connected to the Arduino
+        start (int): first ADC output value of the sweep
+        stop (int): last ADC output value of the sweep
+        repeats (int): amount of measurements per ADC output value
+        channels (tuple of str): input channels to calibrate
+        reference (str): CSV file with measured output voltages
+        table (bool): store lookup tables instead of gain and offset
+        resistance (float): measured resistance of the series resistor
+        reset (bool): forget the stored calibration instead
+
+    Raises:
+        SearchError: if the search string does not yield a single connected device
+    """
+    import numpy as np
+
+    from pythondaq.calibration import calibration_store, fit_calibration
+    from pythondaq.diode_experiment import DiodeExperiment, search_connected_resources
+
+    devices_list = search_connected_resources(port)
+    if len(devices_list) != 1:
+        raise SearchError(
+            f"Search str must only return 1 device in diode list, not {len(devices_list)}"
+        )
+
+    LED_scan = DiodeExperiment(devices_list[0])
+    identification = LED_scan.get_identification()
+    if reset:
+        calibration_store.remove(identification)
+        print(f"Calibration of {identification} removed")
+        return
+
+    previous = calibration_store.get(identification)
+    capture = LED_scan.scan_raw(start, stop, repeats)
+    counts = {
+        1: capture.channel_1.mean(axis=1),
+        2: capture.channel_2.mean(axis=1),
+    }
+    channels = [int(channel) for channel in channels] or [1, 2]
+
+    # Interpolate the multimeter readings to the values of the sweep
+    reference_voltages = None
+    if reference:
+        readings = np.loadtxt(reference, delimiter=",", skiprows=1, ndmin=2)
+        order = np.argsort(readings[:, 0])
+        reference_voltages = np.interp(
+            capture.values, readings[order, 0], readings[order, 1]
+        )
+
+    try:
+        calibration = fit_calibration(
+            identification,
+            capture.values,
+            {channel: counts[channel] for channel in channels},
+            reference_voltages,
+            table,
+            resistance if resistance is not None else previous.resistance,
+            base=previous,
+        )
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    calibration_store.put(calibration)
+    print(f"Calibration of {identification}: {calibration.describe()}")
+
+
+@diode.command("monitor")
+@click.argument("port")
+@click.option(
+    "-s",
+    "-start",
+    "--starting_voltage",
+    default=0.0,
+    help="Starting voltage of every sweep.",
+)
+@click.option(
+    "-e",
+    "-end",
+    "-stop",
+    "--stopping_voltage",
+    default=3.3,
+    help="Stopping voltage of every sweep.",
+)
+@click.option(
+    "-p",
+    "--point",
+    type=float,
+    required=False,
+    help="Measure a fixed operating point at this voltage instead of sweeping, the output stays on between measurements.",
+)
+@click.option(
+    "--step",
+    default=1,
+    help="Distance between the ADC voltage values of a sweep.",
+)
+@click.option(
+    "-r",
+    "--repeats",
+    default=3,
+    help="Amount of measurements to run per ADC voltage value.",
+)
+@click.option(
+    "-i",
+    "--interval",
+    default=10.0,
+    help="Seconds between the starts of two sweeps.",
+)
+@click.option(
+    "-n",
+    "--sweeps",
+    type=int,
+    required=False,
+    help="Stop after this amount of sweeps, run until Ctrl-C if not given.",
+)
+@click.option(
+    "--duration",
+    type=float,
+    required=False,
+    help="Stop after this many seconds, run until Ctrl-C if not given.",
+)
+@click.option(
+    "-b",
+    "--buffer",
+    default=256,
+    help="Amount of recent sweeps kept in memory.",
+)
+@click.option(
+    "--chunk-size",
+    default=64,
+    help="Amount of sweeps per chunk file spilled to the output directory.",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(file_okay=False),
+    required=False,
+    help="Directory to spill the sweeps to in compressed chunks, created if needed. Only the recent sweeps are kept if not given.",
+)
+@click.option(
+    "--figure",
+    type=click.Path(dir_okay=False),
+    required=False,
+    help="Keep this .png or .svg file up to date with the drift of the current at the highest voltage, written in the background.",
+)
+def view_monitor(
+    port,
+    starting_voltage,
+    stopping_voltage,
+    point,
+    step,
+    repeats,
+    interval,
+    sweeps,
+    duration,
+    buffer,
+    chunk_size,
+    output,
+    figure,
+):
+    """Repeat a sweep, or measure a fixed operating point, at a fixed cadence to track drift of the LED.
+
+    \b
+    The most recent sweeps are kept in a ring buffer of fixed size, older sweeps
+    are written to the output directory in compressed chunks, so memory stays the
+    same however long the monitor runs. Read the chunks back with
+    pythondaq.monitor.load_monitor.
+
+    Args:
+        port (str): search string for the port connected to the Arduino
+        starting_voltage (float): starting voltage of every sweep
+        stopping_voltage (float): stopping voltage of every sweep
+        point (float): voltage of a fixed operating point, instead of sweeping
+        step (int): distance between the ADC voltage values of a sweep
+        repeats (int): amount of measurements per ADC voltage value
+        interval (float): seconds between the starts of two sweeps
+        sweeps (int): amount of sweeps to stop after
+        duration (float): seconds to stop after
+        buffer (int): amount of recent sweeps kept in memory
+        chunk_size (int): amount of sweeps per chunk file
+        output (str): directory to spill the sweeps to
+        figure (str): file to draw the drift in the recent sweeps to
+
+    Raises:
+        SearchError: if the search string does not yield a single connected device
+    """
+    import datetime
+
+    from pythondaq.diode_experiment import DiodeExperiment, search_connected_resources
+    from pythondaq.monitor import MonitorBuffer
+    from pythondaq.rendering import FigureRenderer, draw_drift, new_figure
+
+    devices_list = search_connected_resources(port)
+    if len(devices_list) != 1:
+        raise SearchError(
+            f"Search str must only return 1 device in diode list, not {len(devices_list)}"
+        )
+
+    V_to_ADC_step = 1023 / 3.3
+    if point is not None:
+        starting_voltage = stopping_voltage = point
+    LED_scan = DiodeExperiment(devices_list[0])
+    starting_value = LED_scan.calibration.output_value(
+        int(starting_voltage * V_to_ADC_step)
+    )
+    stopping_value = LED_scan.calibration.output_value(
+        int(stopping_voltage * V_to_ADC_step)
+    )
+
+    if output:
+        os.makedirs(output, exist_ok=True)
+    metadata = LED_scan.scan_metadata(
+        starting_value, stopping_value, repeats, step=step, interval=interval
+    )
+    ring = MonitorBuffer(
+        range(starting_value, stopping_value + 1, step),
+        buffer,
+        chunk_size,
+        output,
+        metadata,
+    )
+
+    # The figure is only redrawn when the previous one has been written,
+    # so a slow disk never holds up the measurements
+    renderer = FigureRenderer() if figure else None
+
+    # The point at the highest voltage drifts the most visibly
+    try:
+        for timestamp, result in LED_scan.monitor(
+            starting_value,
+            stopping_value,
+            repeats,
+            interval,
+            ring,
+            step,
+            sweeps,
+            duration,
+        ):
+            started = datetime.datetime.fromtimestamp(timestamp)
+            print(
+                f"{started.isoformat(timespec='seconds')}  sweep {ring.sweeps}: "
+                f"U = {result.voltages[-1]} V, I = {result.currents[-1]} A"
+            )
+            if renderer is not None and not renderer.busy():
+                times, points, _ = ring.recent()
+                drift_figure, axes = new_figure()
+                draw_drift(
+                    axes,
+                    times - times[0],
+                    points[:, 1, -1],
+                    points[:, 3, -1],
+                    ring.values[-1] * 3.3 / 1023,
+                )
+                renderer.submit(drift_figure, figure)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+        if renderer is not None:
+            renderer.close()
+
+    if output:
+        print(f"{ring.sweeps} sweeps saved in {ring.chunks} chunks to {output}")
+
+
+@diode.command("render")
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option(
+    "-od",
+    "--output-directory",
+    type=click.Path(file_okay=False),
+    required=False,
+    help="Directory to write the figures to, created if needed. The directory of the scans if not given.",
+)
+@click.option(
+    "-f",
+    "--format",
+    "file_format",
+    type=click.Choice(["png", "svg"]),
+    default="png",
+    help="File format of the figures.",
+)
+@click.option(
+    "--shockley",
+    is_flag=True,
+    default=False,
+    help="Draw the Shockley formula fitted to every scan instead of its I-U diagram.",
+)
+@click.option(
+    "--temperature",
+    default=300.0,
+    help="Temperature of the LEDs in Kelvin, used by the Shockley fit.",
+)
+@click.option(
+    "-j",
+    "--workers",
+    type=int,
+    required=False,
+    help="Amount of processes that render at the same time, the amount of cores if not given.",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    default=False,
+    help="Also render the scans whose figure is newer than their .csv file.",
+)
+def view_render(
+    directory, output_directory, file_format, shockley, temperature, workers, force
+):
+    """Write a figure for every .csv file in a directory of saved scans, in parallel.
+
+    The figure of a scan gets the name of its .csv file, a Shockley fit gets a
+    _shockley suffix, so both can be kept side by side.
+
+    Args:
+        directory (str): directory with the saved scans
+        output_directory (str): directory to write the figures to
+        file_format (str): png or svg
+        shockley (bool): draw the Shockley fits instead of the I-U diagrams
+        temperature (float): temperature of the LEDs in Kelvin
+        workers (int): amount of processes
+        force (bool): also render figures that are up to date
+    """
+    from pythondaq.rendering import render_directory
+
+    if output_directory:
+        os.makedirs(output_directory, exist_ok=True)
+
+    rendered, failed = 0, 0
+    for filepath, outcome in render_directory(
+        directory,
+        output_directory,
+        file_format,
+        shockley,
+        temperature,
+        workers,
+        force,
+    ):
+        if isinstance(outcome, Exception):
+            failed += 1
+            print(f"Could not render {filepath}: {outcome}")
+        else:
+            rendered += 1
+            print(f"Figure saved to {outcome}")
+    print(f"{rendered} figures rendered, {failed} failed")
+
+
+@diode.command("analyze")
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False),
+    required=False,
+    help="Write the summary table to this .csv file, analysis_summary.csv in the directory if not given.",
+)
+@click.option(
+    "--ideality",
+    is_flag=True,
+    default=False,
+    help="Fit the ideality factor n of the Shockley formula, with V_t fixed by the temperature.",
+)
+@click.option(
+    "--temperature",
+    default=300.0,
+    help="Temperature of the LEDs in Kelvin, used for V_t and the Boltzmann constant.",
+)
+@click.option(
+    "-j",
+    "--workers",
+    type=int,
+    required=False,
+    help="Amount of processes that fit at the same time, the amount of cores if not given.",
+)
+def view_analyze(directory, output, ideality, temperature, workers):
+    """Fit the Shockley formula to every saved scan in a directory and write a summary table.
+
+    \b
+    The table holds I_s, V_t (or n), the derived Boltzmann constant and the
+    reduced chi-square of every scan. Fits are cached by the content of the
+    files, so running the analysis again only fits new or changed scans.
+
+    Args:
+        directory (str): directory with the saved scans
+        output (str): .csv file to write the summary table to
+        ideality (bool): fit the ideality factor n with V_t fixed at kT/q
+        temperature (float): temperature of the LEDs in Kelvin
+        workers (int): amount of processes
+    """
+    from pythondaq.analysis import analyze_directory, write_summary
+    from pythondaq.data_writer import SUMMARY_FILENAME
+
+    output = output or os.path.join(directory, SUMMARY_FILENAME)
+    summary, fitted = analyze_directory(
+        directory, ideality, temperature, workers, summary_path=output
+    )
+    write_summary(summary, output)
+
+    failed = [row for row in summary if row["error"] is not None]
+    for row in failed:
+        print(f"Could not fit {row['file']}: {row['error']}")
+    print(
+        f"{len(summary)} scans analyzed, {fitted} fitted and "
+        f"{len(summary) - fitted} from the cache, {len(failed)} failed"
+    )
+    print(f"Summary saved to {output}")
+
+
+# Create group of benchmark commands
+@diode.group("bench")
+def bench():
+    """Benchmark the performance of pythondaq."""
+    pass
+
+
+@bench.command("scan")
+@click.option(
+    "-p",
+    "--port",
+    default=SIMULATED_PORT,
+    help="Port of the device to benchmark, the simulated Arduino by default.",
+)
+@click.option(
+    "--ranges",
+    default="0:1023",
+    help="Comma separated start:stop ADC values to scan, e.g. 0:1023,300:700.",
+)
+@click.option(
+    "-r",
+    "--repeats",
+    default="1,3",
+    help="Comma separated repeat counts to scan every range with.",
+)
+@click.option(
+    "--save/--no-save",
+    default=True,
+    help="Toggle timing saving the data to a .csv file.",
+)
+@click.option(
+    "--plot/--no-plot",
+    default=True,
+    help="Toggle timing plotting the data.",
+)
+@click.option(
+    "--pipelined/--no-pipelined",
+    default=True,
+    help="Toggle sending commands to the device in batches.",
+)
+@click.option(
+    "--bulk/--no-bulk",
+    default=None,
+    help="Force bulk measurements on or off, by default they are used when the firmware supports them.",
+)
+@click.option(
+    "--baseline",
+    type=str,
+    required=False,
+    help="Compare the results to this baseline .json file.",
+)
+@click.option(
+    "--save-baseline",
+    type=str,
+    required=False,
+    help="Store the results as baseline in this .json file.",
+)
+@click.option(
+    "--threshold",
+    default=0.2,
+    help="Allowed relative drop in points per second compared to the baseline.",
+)
+def bench_scan(
+    port,
+    ranges,
+    repeats,
+    save,
+    plot,
+    pipelined,
+    bulk,
+    baseline,
+    save_baseline,
+    threshold,
+):
+    """Time scans over several ranges and repeat counts and report where the time goes.
+    \n
+    \b
+    Reports points/second, queries/second and the time spent on VISA round trips,
+    parsing, statistics, saving and plotting.
+
+    \b
+    Raises:
+        click.ClickException: if a case is slower than the baseline allows.
+    """
+    from pythondaq import benchmark
+
+    repeat_counts = [int(repeat) for repeat in repeats.split(",")]
+    results = benchmark.run_benchmark(
+        port,
+        benchmark.parse_ranges(ranges),
+        repeat_counts,
+        save,
+        plot,
+        pipelined,
+        bulk,
+    )
+    benchmark.print_report(results)
+
+    if save_baseline:
+        benchmark.save_baseline(results, save_baseline)
+        print(f"Baseline saved to {save_baseline}")
+
+    if baseline:
+        regressions = benchmark.compare_baseline(results, baseline, threshold)
+        if regressions:
+            raise click.ClickException(
+                "Scan throughput regressed:\n" + "\n".join(regressions)
+            )
+        print("No regressions compared to baseline")
+
+
+@bench.command("startup")
+@click.option(
+    "-c",
+    "--commands",
+    default="help,list,info,runs,scan",
+    help="Comma separated commands to time, out of help, list, info, runs and scan.",
+)
+@click.option(
+    "-n",
+    "--runs",
+    default=5,
+    help="Amount of timed runs per command.",
+)
+@click.option(
+    "--baseline",
+    type=str,
+    required=False,
+    help="Compare the results to this baseline .json file.",
+)
+@click.option(
+    "--save-baseline",
+    type=str,
+    required=False,
+    help="Store the results as baseline in this .json file.",
+)
+@click.option(
+    "--threshold",
+    default=0.2,
+    help="Allowed relative increase in startup time compared to the baseline.",
+)
+def bench_startup(commands, runs, baseline, save_baseline, threshold):
+    """Time how long diode commands take from start to exit and which heavy packages they import.
+    \n
+    \b
+    Every command is run in a new process against the simulated Arduino.
+
+    \b
+    Raises:
+        click.ClickException: if a command is slower than the baseline allows.
+    """
+    from pythondaq import benchmark
+
+    names = commands.split(",")
+    for name in names:
+        if name not in benchmark.STARTUP_COMMANDS:
+            raise click.BadParameter(f"Unknown command: {name}", param_hint="commands")
+
+    results = benchmark.run_startup_benchmark(names, runs)
+    benchmark.print_startup_report(results)
+
+    if save_baseline:
+        benchmark.save_baseline(
+            results, save_baseline, key=lambda result: result["command"]
+        )
+        print(f"Baseline saved to {save_baseline}")
+
+    if baseline:
+        regressions = benchmark.compare_startup_baseline(results, baseline, threshold)
+        if regressions:
+            raise click.ClickException(
+                "Startup time regressed:\n" + "\n".join(regressions)
+            )
+        print("No regressions compared to baseline")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,210 @@
+import csv
+import glob
+import os
+import time
+
+# Columns of the .csv files with scan data
+COLUMNS = ["I (A)", "U (V)", "SEM_I (A)", "SEM_U (V)", "N"]
+
+# Columns of the files saved by view.py, which keep the names they always had
+VIEW_COLUMNS = ["I", "U", "SEM_I", "SEM_U"]
+
+# Name of the summary table 'diode analyze' writes into a directory of scans
+SUMMARY_FILENAME = "analysis_summary.csv"
+
+
+class ScanWriter:
+    """Appends the points of a scan to a .csv file while the scan is running.
+
+    The points are written to a .partial file next to the final file and
+    flushed to disk every flush_interval seconds, so a crash or Ctrl-C loses
+    at most the last few points. Only when the scan finishes is the .partial
+    file renamed to the final file in one step, a .partial file that is left
+    behind holds the data of an interrupted scan. The file starts with the
+    scan metadata on lines beginning with #.
+
+    Attributes:
+    filepath (str): path of the final .csv file
+    partial_path (str): path of the file that is written during the scan
+    flush_interval (float): maximum seconds between flushes to disk
+    counts (bool): whether the amount of measurements per point is stored in an N column
+    rows (int): amount of points written
+
+    Methods:
+    write_point(voltage, current, error_voltage, error_current, count)
+    sort(values)
+    flush()
+    finalize()
+    abort()
+    """
+
+    def __init__(
+        self, filepath, metadata=None, flush_interval=1.0, counts=True, columns=None
+    ):
+        """Create the .partial file and write the metadata and column names.
+
+        Args:
+            filepath (str): path of the final .csv file
+            metadata (dict): information about the scan, written at the top of the file
+            flush_interval (float): maximum seconds between flushes to disk
+            counts (bool): store the amount of measurements per point in an N column
+            columns (list of str): names of the columns, COLUMNS if not given
+        """
+        self.filepath = filepath
+        self.partial_path = f"{filepath}.partial"
+        self.flush_interval = flush_interval
+        self.counts = counts
+        self.rows = 0
+
+        self._file = open(self.partial_path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        for key, value in (metadata or {}).items():
+            self._file.write(f"# {key}: {value}\n")
+        if columns is None:
+            columns = COLUMNS if counts else COLUMNS[:-1]
+        self._writer.writerow(columns)
+        self.flush()
+        self._points_start = self._file.tell()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Keep the .partial file when the scan was interrupted
+        if exc_type is None:
+            self.finalize()
+        else:
+            self.abort()
+
+    def write_point(self, voltage, current, error_voltage, error_current, count=None):
+        """Append a point, flushing to disk when the last flush is flush_interval ago.
+
+        Args:
+            voltage (float): mean voltage over the LED
+            current (float): mean current through the LED
+            error_voltage (float): standard error of the voltage
+            error_current (float): standard error of the current
+            count (int): amount of measurements of the point, ignored without N column
+        """
+        row = [current, voltage, error_current, error_voltage]
+        if self.counts:
+            row.append(count)
+        self._writer.writerow(row)
+        self.rows += 1
+        if time.monotonic() - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def sort(self, values):
+        """Rewrite the points written so far in order of ADC output value, for a scan that measures out of order.
+
+        The order is the same as that of ScanResult.sort, points with the same
+        value keep the order in which they were written.
+
+        Args:
+            values (sequence of int): ADC output value of every written point, in the order they were written
+
+        Raises:
+            ValueError: if the amount of values differs from the amount of written points
+        """
+        if len(values) != self.rows:
+            raise ValueError(
+                f"Got {len(values)} ADC output values for {self.rows} written points"
+            )
+        self.flush()
+        with open(self.partial_path, newline="") as csvfile:
+            rows = [
+                row for row in csv.reader(csvfile) if row and not row[0].startswith("#")
+            ]
+        order = sorted(range(self.rows), key=lambda row: values[row])
+        points = [rows[1 + row] for row in order]
+        self._file.seek(self._points_start)
+        self._file.truncate()
+        self._writer.writerows(points)
+        self.flush()
+
+    def flush(self):
+        """Write the buffered points to disk."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._flushed = time.monotonic()
+
+    def finalize(self):
+        """Flush and close the file and rename it to the final file in one step."""
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+        os.replace(self.partial_path, self.filepath)
+
+    def abort(self):
+        """Flush and close the file but keep it as .partial file, for an interrupted scan."""
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+
+def read_metadata(filepath):
+    """Read the metadata at the top of a .csv or .partial file written by ScanWriter.
+
+    Args:
+        filepath (str): path of the file
+
+    Returns:
+        dict: metadata of the scan, values as strings
+    """
+    metadata = {}
+    with open(filepath, newline="") as csvfile:
+        for line in csvfile:
+            if not line.startswith("# "):
+                break
+            key, _, value = line[2:].rstrip("\r\n").partition(": ")
+            metadata[key] = value
+    return metadata
+
+
+def read_points(filepath):
+    """Read the points of a .csv or .partial file written by ScanWriter, or saved by view.py.
+
+    Args:
+        filepath (str): path of the file
+
+    Raises:
+        ValueError: if the file does not have the columns of a scan
+
+    Returns:
+        tuple: voltages, currents, errors on the voltages and errors on the currents as numpy.ndarray, and the amounts of measurements (None without N column)
+    """
+    import numpy as np
+
+    with open(filepath, newline="") as csvfile:
+        rows = [
+            row for row in csv.reader(csvfile) if row and not row[0].startswith("#")
+        ]
+    if not rows or rows[0] not in (COLUMNS, COLUMNS[:-1], VIEW_COLUMNS):
+        raise ValueError(f"{os.path.basename(filepath)} is not a scan file")
+
+    # The first row holds the column names
+    points = np.array(rows[1:], dtype=float).reshape(-1, len(rows[0]))
+    currents, voltages, errors_currents, errors_voltages = points[:, :4].T
+    counts = points[:, 4].astype(int) if len(rows[0]) == len(COLUMNS) else None
+    return voltages, currents, errors_voltages, errors_currents, counts
+
+
+def list_scans(directory, exclude=()):
+    """List the saved scans in a directory.
+
+    Args:
+        directory (str): directory with .csv files
+        exclude (iterable of str): paths of further .csv files that are not scans, like a summary table with another name
+
+    Returns:
+        list of str: paths of the .csv files in name order, without the analysis summary
+    """
+    excluded = {os.path.abspath(filepath) for filepath in exclude}
+    return [
+        filepath
+        for filepath in sorted(glob.glob(os.path.join(directory, "*.csv")))
+        if os.path.basename(filepath) != SUMMARY_FILENAME
+        and os.path.abspath(filepath) not in excluded
+    ]
@@ -1,16 +1,103 @@
-import numpy as np
-from rich.progress import track
+import contextlib
+import datetime
+import heapq
+import time
 
-from pythondaq.arduino_device import ArduinoVisaDevice, list_resources
+from pythondaq.arduino_device import device_pool
+from pythondaq.discovery import resource_cache
+from pythondaq.profiling import stage
 
 
-def list_connected_resources():
-    """Calls on list_resources in arduino_device in order to return list of connected resources.
+class ScanCancelled(Exception):
+    """Exception for when a scan is stopped because its cancel event was set."""
+
+    pass
+
+
+def list_connected_resources(refresh=False):
+    """Return list of connected resources from the discovery cache.
+
+    Args:
+        refresh (bool): enumerate the resources even if the cached list is still valid
 
     Returns:
         list of str: list with connected resources
     """
-    return list_resources()
+    return resource_cache.list(refresh)
+
+
+def search_connected_resources(search, refresh=False):
+    """Return the connected resources that contain the search string.
+
+    Args:
+        search (str): string to look for in list of connected devices
+        refresh (bool): enumerate the resources even if the cached list is still valid
+
+    Returns:
+        list of str: list with matching resources
+    """
+    return resource_cache.search(search, refresh)
+
+
+def adaptive_scan_size(start, stop, budget, coarse_step):
+    """Return the amount of rows a ScanResult needs for an adaptive scan.
+
+    Args:
+        start (int): starting ADC voltage value
+        stop (int): stopping ADC voltage value
+        budget (int): total amount of ADC voltage values to measure
+        coarse_step (int): distance between ADC voltage values in the coarse pass
+
+    Returns:
+        int: the budget, or more if the coarse pass alone needs more rows
+    """
+    return max(budget, (stop - start) // coarse_step + 2)
+
+
+def scan_devices(ports, scan):
+    """Scan several devices at the same time, each on its own worker thread.
+
+    When the waiting is interrupted, for example by Ctrl-C, the event given to
+    every scan is set and scans that have not started yet are cancelled. The
+    running scans stop after their current step, then the interruption is raised.
+
+    Args:
+        ports (list of str): ports of the devices to scan
+        scan (callable): function called with a port and a threading.Event, that scans that device and stops once the event is set
+
+    Returns:
+        dict: return value of scan for every port
+    """
+    import threading
+    from concurrent.futures import ThreadPoolExecutor, wait
+
+    cancel = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=len(ports))
+    try:
+        futures = {port: executor.submit(scan, port, cancel) for port in ports}
+        wait(futures.values())
+    except BaseException:
+        cancel.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    executor.shutdown()
+    return {port: future.result() for port, future in futures.items()}
+
+
+async def ascan_devices(ports, scan):
+    """Scan several devices at the same time from a single event loop.
+
+    Args:
+        ports (list of str): ports of the devices to scan
+        scan (callable): coroutine function called with a port that scans that device
+
+    Returns:
+        dict: return value of scan for every port
+    """
+    import asyncio
+
+    results = await asyncio.gather(*(scan(port) for port in ports))
+    return dict(zip(ports, results))
 
 
 class DiodeExperiment:
@@ -18,19 +105,119 @@ class DiodeExperiment:
 
     Attributes:
     port (str): port connected to arduino
+    arduino (ArduinoVisaDevice): device from the device pool, opened on first use
+    calibration (Calibration): calibration of the arduino, looked up by its identification string on first use
+    resistance (float): resistance in Ohm of the resistor in series with the LED, from the calibration unless set
+    progress (callable): function called with the amount of completed and total steps, None to show a progress bar
+    cancel (threading.Event): event that stops a scan before its next step with ScanCancelled, None to never stop
 
     Methods:
+    iter_scan(start, stop, repeats)
     scan(start, stop, repeats)
+    aiter_scan(start, stop, repeats)
+    ascan(start, stop, repeats)
+    scan_raw(start, stop, repeats, path)
+    iter_adaptive_scan(start, stop, repeats, budget, coarse_step)
+    adaptive_scan(start, stop, repeats, budget, coarse_step)
+    monitor(start, stop, repeats, interval, buffer)
     """
 
     # Initialize the arduino used by other methods
-    def __init__(self, port):
-        """Open connection to arduino through class ArduinoVisaDevice.
+    def __init__(self, port, progress=None, calibration=None, cancel=None):
+        """Prepare an experiment on the arduino connected to port.
+
+        The connection is taken from the device pool, which opens it if needed,
+        when the arduino is first used. Asynchronous scans open their own connection.
 
         Args:
             port (str): port connected to arduino
+            progress (callable): optional function called with the amount of completed and total steps, instead of showing a progress bar
+            calibration (Calibration): calibration to use instead of the stored one
+            cancel (threading.Event): optional event that stops a scan before its next step with ScanCancelled
+        """
+        self.port = port
+        self.progress = progress
+        self.cancel = cancel
+        self._arduino = None
+        self._calibration = calibration
+        self._resistance = None
+
+    @property
+    def arduino(self):
+        """ArduinoVisaDevice for port from the device pool, unless another device was set."""
+        if self._arduino is None:
+            return device_pool.get(self.port)
+        return self._arduino
+
+    @arduino.setter
+    def arduino(self, device):
+        self._arduino = device
+
+    def _lease(self):
+        """Keep the arduino checked out of the device pool, so it is not closed as idle during a long scan.
+
+        Returns:
+            context manager: leases the device from the pool, or does nothing if another device was set
         """
-        self.arduino = ArduinoVisaDevice(port)
+        if self._arduino is not None:
+            return contextlib.nullcontext()
+        return device_pool.lease(self.port)
+
+    @property
+    def calibration(self):
+        """Calibration of the arduino, taken from the calibration store on first use."""
+        from pythondaq.calibration import calibration_store
+
+        if self._calibration is None:
+            self._calibration = calibration_store.get(self.get_identification())
+        return self._calibration
+
+    @calibration.setter
+    def calibration(self, calibration):
+        self._calibration = calibration
+
+    @property
+    def resistance(self):
+        """Resistance in Ohm of the resistor in series with the LED."""
+        if self._resistance is None:
+            return self.calibration.resistance
+        return self._resistance
+
+    @resistance.setter
+    def resistance(self, resistance):
+        self._resistance = resistance
+
+    def scan_metadata(self, start, stop, repeats, identification=None, **options):
+        """Describe a scan for the header of its data file.
+
+        Args:
+            start (int): starting ADC voltage value
+            stop (int): stopping ADC voltage value
+            repeats (int): amount of measurements per ADC voltage value
+            identification (str): identification string of the arduino, asked through the device pool if not given
+            **options: further settings of the scan, stored when they are not None
+
+        Returns:
+            dict: port, identification, resistance, calibration, start, stop, repeats, options and start time
+        """
+        metadata = {
+            "port": self.port,
+            "identification": (
+                identification
+                if identification is not None
+                else self.get_identification()
+            ),
+            "resistance": self.resistance,
+            "calibration": self.calibration.describe(),
+            "start": start,
+            "stop": stop,
+            "repeats": repeats,
+        }
+        metadata.update(
+            (key, value) for key, value in options.items() if value is not None
+        )
+        metadata["started"] = datetime.datetime.now().isoformat(timespec="seconds")
+        return metadata
 
     def get_identification(self):
         """Calls on ArduinoVisaDevice.get_identification in order to return identification string of connected resource.
@@ -40,74 +227,863 @@ class DiodeExperiment:
         """
         return self.arduino.get_identification()
 
-    def scan(self, start, stop, repeats):
+    def _measure_step(
+        self, voltage, repeats, max_repeats, target_sem_voltage, target_sem_current
+    ):
+        """Set the output and keep measuring until the standard errors reach their targets.
+
+        Measurements are taken in batches of repeats. The statistics are updated
+        per batch without keeping lists, until both standard errors of the means
+        are at or below their target or max_repeats measurements have been taken.
+
+        Args:
+            voltage (int): ADC output value
+            repeats (int): amount of measurements per batch, and at least per step
+            max_repeats (int): maximum amount of measurements per step
+            target_sem_voltage (float): target standard error of the LED voltage, None to ignore
+            target_sem_current (float): target standard error of the LED current, None to ignore
+
+        Returns:
+            tuple of list: voltages measured on channel 1 and on channel 2
+        """
+        from pythondaq.scan_result import RunningStatistics
+
+        statistics = (RunningStatistics(), RunningStatistics())
+        voltages_channel_1, voltages_channel_2 = self.arduino.set_output_and_measure(
+            voltage, repeats
+        )
+        new_channel_1, new_channel_2 = voltages_channel_1, voltages_channel_2
+
+        while True:
+            remaining = self._remaining_repeats(
+                statistics,
+                new_channel_1,
+                new_channel_2,
+                repeats,
+                max_repeats,
+                target_sem_voltage,
+                target_sem_current,
+            )
+            if not remaining:
+                return voltages_channel_1, voltages_channel_2
+
+            new_channel_1, new_channel_2 = self.arduino.measure_input_voltages(
+                remaining
+            )
+            voltages_channel_1 = voltages_channel_1 + new_channel_1
+            voltages_channel_2 = voltages_channel_2 + new_channel_2
+
+    def _remaining_repeats(
+        self,
+        statistics,
+        voltages_channel_1,
+        voltages_channel_2,
+        repeats,
+        max_repeats,
+        target_sem_voltage,
+        target_sem_current,
+    ):
+        """Add a batch of measurements to the statistics of a step and return how many to take next.
+
+        Args:
+            statistics (tuple of RunningStatistics): statistics of the LED voltage and current
+            voltages_channel_1 (list of float): new voltages measured on channel 1
+            voltages_channel_2 (list of float): new voltages measured on channel 2
+            repeats (int): amount of measurements per batch
+            max_repeats (int): maximum amount of measurements per step
+            target_sem_voltage (float): target standard error of the LED voltage, None to ignore
+            target_sem_current (float): target standard error of the LED current, None to ignore
+
+        Returns:
+            int: amount of measurements in the next batch, 0 when the step is done
+        """
+        voltage_statistics, current_statistics = statistics
+        voltage_resistor = self.calibration.correct(2, voltages_channel_2)
+        voltage_statistics.add(
+            self.calibration.correct(1, voltages_channel_1) - voltage_resistor
+        )
+        current_statistics.add(voltage_resistor / self.resistance)
+
+        converged = (
+            target_sem_voltage is None or voltage_statistics.sem() <= target_sem_voltage
+        ) and (
+            target_sem_current is None or current_statistics.sem() <= target_sem_current
+        )
+        if converged:
+            return 0
+        return max(min(repeats, max_repeats - voltage_statistics.count), 0)
+
+    def _measure(
+        self,
+        values,
+        repeats,
+        total=None,
+        max_repeats=None,
+        target_sem_voltage=None,
+        target_sem_current=None,
+    ):
+        """Measure the LED for every ADC output value and yield the measurements of each step.
+
+        The output is turned off when the scan ends, also when the consumer stops early.
+
+        Args:
+            values (iterable of int): ADC output values to scan
+            repeats (int): amount of measurements per ADC voltage value
+            total (int): amount of steps for the progress bar, if values has no length
+            max_repeats (int): maximum amount of measurements per step when a target is given
+            target_sem_voltage (float): keep measuring a step until the standard error of the LED voltage is this small
+            target_sem_current (float): keep measuring a step until the standard error of the LED current is this small
+
+        Yields:
+            tuple: index of the step, ADC output value and the voltages measured on channel 1 and 2
+        """
+        converge = target_sem_voltage is not None or target_sem_current is not None
+
+        # Perform the measurements
+        print("Starting scan")
+        with self._lease():
+            try:
+                for index, voltage in enumerate(self._steps(values, total)):
+
+                    # Set OUTPUT voltage and perform repeated measurements for the same
+                    # voltage in a single batch of commands
+                    with stage("measure"):
+                        if converge:
+                            voltages_channel_1, voltages_channel_2 = self._measure_step(
+                                voltage,
+                                repeats,
+                                max_repeats,
+                                target_sem_voltage,
+                                target_sem_current,
+                            )
+                        else:
+                            voltages_channel_1, voltages_channel_2 = (
+                                self.arduino.set_output_and_measure(voltage, repeats)
+                            )
+                    yield index, voltage, voltages_channel_1, voltages_channel_2
+            finally:
+                # Turn off lamp after scan
+                self.arduino.set_output_value(value=0)
+
+    def _steps(self, values, total=None):
+        """Wrap the ADC output values in a progress bar, or report progress to the progress function.
+
+        Args:
+            values (iterable of int): ADC output values to scan
+            total (int): amount of steps, if values has no length
+
+        Returns:
+            iterable of int: the ADC output values
+        """
+        if self.cancel is not None:
+            if total is None:
+                total = len(values)
+            values = self._until_cancelled(values)
+        if self.progress is None:
+            from rich.progress import track
+
+            return track(values, total=total, description="[cyan]Scanning...")
+        return self._report_progress(values, total)
+
+    def _until_cancelled(self, values):
+        """Yield values until the cancel event is set.
+
+        Args:
+            values (iterable of int): ADC output values to scan
+
+        Raises:
+            ScanCancelled: if the cancel event is set before the next step
+
+        Yields:
+            int: the next ADC output value
+        """
+        for value in values:
+            if self.cancel.is_set():
+                raise ScanCancelled(f"Scan on {self.port} was cancelled")
+            yield value
+
+    def _report_progress(self, values, total=None):
+        """Yield values and tell the progress function after each step how many have been completed.
+
+        Args:
+            values (iterable of int): ADC output values to scan
+            total (int): amount of steps, if values has no length
+
+        Yields:
+            int: the next ADC output value
+        """
+        if total is None:
+            total = len(values)
+        for completed, value in enumerate(values):
+            self.progress(completed, total)
+            yield value
+        self.progress(total, total)
+
+    def _point(self, result, row, writer=None):
+        """Return the statistics of a measured step, after appending them to writer if given.
+
+        Args:
+            result (ScanResult): result holding the step
+            row (int): row of the step
+            writer (ScanWriter): optional writer that stores the point on disk
+
+        Returns:
+            tuple: voltage, current, error on voltage and error on current of the LED, and the amount of measurements used
+        """
+        point = (
+            float(result.voltages[row]),
+            float(result.currents[row]),
+            float(result.errors_voltages[row]),
+            float(result.errors_currents[row]),
+            int(result.counts[row]),
+        )
+        if writer is not None:
+            with stage("save"):
+                writer.write_point(*point)
+        return point
+
+    def iter_scan(
+        self,
+        start,
+        stop,
+        repeats,
+        result=None,
+        max_repeats=None,
+        target_sem_voltage=None,
+        target_sem_current=None,
+        writer=None,
+        journal=None,
+    ):
+        """Increase OUTPUT voltage on channel 0 from start to stop and yield the result of every step as soon as it is measured.
+
+        The output is turned off when the scan ends, also when the consumer stops early.
+        When a target standard error is given, every step is measured in batches of
+        repeats until the target is reached or max_repeats measurements were taken.
+
+        Args:
+            start (int): starting ADC voltage value
+            stop (int): stopping ADC voltage value
+            repeats (int): amount of measurements per ADC voltage value
+            result (ScanResult): optional result for start to stop in which every step is kept
+            max_repeats (int): maximum amount of measurements per step when a target is given
+            target_sem_voltage (float): target standard error of the LED voltage (V)
+            target_sem_current (float): target standard error of the LED current (A)
+            writer (ScanWriter): optional writer to which every point is appended as soon as it is measured
+            journal (ScanJournal): optional journal in which the measurements of every step are kept, to resume the scan
+
+        Yields:
+            tuple: voltage, current, error on voltage and error on current of the LED, and the amount of measurements used
+        """
+        from pythondaq.scan_result import ScanResult
+
+        width = self.result_width(
+            repeats, max_repeats, target_sem_voltage, target_sem_current
+        )
+
+        # Without a result for the whole scan a single row is reused,
+        # so memory does not grow with the length of the scan
+        step = (
+            result
+            if result is not None
+            else ScanResult([start], width, self.resistance, self.calibration)
+        )
+
+        for index, voltage, voltages_channel_1, voltages_channel_2 in self._measure(
+            range(start, stop + 1),
+            repeats,
+            max_repeats=width,
+            target_sem_voltage=target_sem_voltage,
+            target_sem_current=target_sem_current,
+        ):
+            row = index if result is not None else 0
+            with stage("statistics"):
+                step.record(row, voltages_channel_1, voltages_channel_2)
+                step.compute_statistics(row, row + 1)
+            if journal is not None:
+                with stage("save"):
+                    journal.record(voltage, voltages_channel_1, voltages_channel_2)
+            yield self._point(step, row, writer)
+
+    def scan(
+        self,
+        start,
+        stop,
+        repeats,
+        max_repeats=None,
+        target_sem_voltage=None,
+        target_sem_current=None,
+        writer=None,
+        journal=None,
+    ):
         """Increase OUTPUT voltage on channel 0 from start to stop, measure INPUT voltage on channels 1 & 2, calculate voltages, currents, and errors for the LED.
 
+        When a target standard error is given, every step is measured in batches of
+        repeats until the target is reached or max_repeats measurements were taken.
+
         Args:
             start (int): starting ADC voltage value
             stop int): stopping ADC voltage value
             repeats (int): amount of measurements per ADC voltage value
+            max_repeats (int): maximum amount of measurements per step when a target is given
+            target_sem_voltage (float): target standard error of the LED voltage (V)
+            target_sem_current (float): target standard error of the LED current (A)
+            writer (ScanWriter): optional writer to which every point is appended as soon as it is measured
+            journal (ScanJournal): optional journal in which the measurements of every step are kept, to resume the scan
 
         Returns:
-            list: measurement data, including measured voltage, current, and errors on voltage and current
+            ScanResult: measurement data, unpacks into measured voltage, current, and errors on voltage and current
         """
+        from pythondaq.scan_result import ScanResult
 
-        # Create lists to store measurements
-        voltages_scan_LED = []
-        currents_scan_LED = []
-        sem_voltage_LED_list = []
-        sem_current_LED_list = []
+        width = self.result_width(
+            repeats, max_repeats, target_sem_voltage, target_sem_current
+        )
+        result = ScanResult(
+            range(start, stop + 1), width, self.resistance, self.calibration
+        )
+        for index, voltage, voltages_channel_1, voltages_channel_2 in self._measure(
+            result.values,
+            repeats,
+            max_repeats=width,
+            target_sem_voltage=target_sem_voltage,
+            target_sem_current=target_sem_current,
+        ):
+            with stage("statistics"):
+                result.record(index, voltages_channel_1, voltages_channel_2)
+                if writer is not None:
+                    result.compute_statistics(index, index + 1)
+            if journal is not None:
+                with stage("save"):
+                    journal.record(voltage, voltages_channel_1, voltages_channel_2)
+            if writer is not None:
+                self._point(result, index, writer)
 
-        # Perform the measurements
-        print("Starting scan")
-        for voltage in track(range(start, stop + 1), description="[cyan]Scanning..."):
+        # Calculate the statistics of all steps at once
+        with stage("statistics"):
+            result.compute_statistics()
+        return result
+
+    def scan_raw(self, start, stop, repeats, path=None):
+        """Increase OUTPUT voltage on channel 0 from start to stop and keep the raw ADC values of channels 1 & 2.
+
+        The ADC values are stored as uint16 and only converted to voltages by
+        RawCapture.to_result, so a capture can be converted again later, for
+        example with a new calibration. With a path the values are written to a
+        memory-mapped .npy file while scanning.
+
+        Args:
+            start (int): starting ADC voltage value
+            stop (int): stopping ADC voltage value
+            repeats (int): amount of measurements per ADC voltage value
+            path (str): optional .npy file to store the capture in
+
+        Returns:
+            RawCapture: raw ADC values of every step
+        """
+        from pythondaq.raw_capture import RawCapture
+
+        capture = RawCapture(stop - start + 1, repeats, path)
+        with self._lease():
+            try:
+                for index, value in enumerate(self._steps(range(start, stop + 1))):
+                    values_channel_1, values_channel_2 = (
+                        self.arduino.set_output_and_measure_raw(value, repeats)
+                    )
+                    capture.record(index, value, values_channel_1, values_channel_2)
+            finally:
+                # Turn off lamp after scan and keep what was measured
+                self.arduino.set_output_value(value=0)
+                capture.flush()
+        return capture
 
-            # Set OUTPUT voltage
-            self.arduino.set_output_value(value=voltage)
+    async def _ameasure_step(
+        self,
+        arduino,
+        voltage,
+        repeats,
+        max_repeats,
+        target_sem_voltage,
+        target_sem_current,
+    ):
+        """Asynchronous version of _measure_step on an AsyncArduinoDevice.
 
-            voltage_LED_list = []
-            current_LED_list = []
+        Args:
+            arduino (AsyncArduinoDevice): device to measure with
+            voltage (int): ADC output value
+            repeats (int): amount of measurements per batch, and at least per step
+            max_repeats (int): maximum amount of measurements per step
+            target_sem_voltage (float): target standard error of the LED voltage, None to ignore
+            target_sem_current (float): target standard error of the LED current, None to ignore
+
+        Returns:
+            tuple of list: voltages measured on channel 1 and on channel 2
+        """
+        from pythondaq.scan_result import RunningStatistics
+
+        statistics = (RunningStatistics(), RunningStatistics())
+        voltages_channel_1, voltages_channel_2 = await arduino.set_output_and_measure(
+            voltage, repeats
+        )
+        new_channel_1, new_channel_2 = voltages_channel_1, voltages_channel_2
+
+        while remaining := self._remaining_repeats(
+            statistics,
+            new_channel_1,
+            new_channel_2,
+            repeats,
+            max_repeats,
+            target_sem_voltage,
+            target_sem_current,
+        ):
+            new_channel_1, new_channel_2 = await arduino.measure_input_voltages(
+                remaining
+            )
+            voltages_channel_1 = voltages_channel_1 + new_channel_1
+            voltages_channel_2 = voltages_channel_2 + new_channel_2
+        return voltages_channel_1, voltages_channel_2
 
-            # Perform repeated measurements for the same voltage
-            for repeat in range(0, repeats):
-                voltage_resistor = float(self.arduino.get_input_voltage(channel=2))
-                current = voltage_resistor / 220
+    async def aopen(self):
+        """Open the arduino as an AsyncArduinoDevice and look up its calibration over that connection.
 
-                voltage_LED = (
-                    float(self.arduino.get_input_voltage(channel=1)) - voltage_resistor
+        A connection to the same port held by the device pool is closed first,
+        because a serial port can only be opened once.
+
+        Returns:
+            AsyncArduinoDevice: the opened arduino, to be closed by the caller
+        """
+        from pythondaq.async_device import AsyncArduinoDevice
+        from pythondaq.calibration import calibration_store
+
+        device_pool.release(self.port)
+        self._arduino = None
+        arduino = await AsyncArduinoDevice.open(self.port)
+        try:
+            if self._calibration is None:
+                self.calibration = calibration_store.get(
+                    await arduino.get_identification()
                 )
+        except BaseException:
+            await arduino.close()
+            raise
+        return arduino
+
+    async def aiter_scan(
+        self,
+        start,
+        stop,
+        repeats,
+        result=None,
+        max_repeats=None,
+        target_sem_voltage=None,
+        target_sem_current=None,
+        writer=None,
+        arduino=None,
+    ):
+        """Asynchronous version of iter_scan, which leaves the event loop free while waiting for the arduino.
+
+        Unless an open arduino is given, the arduino is opened with aopen for the
+        duration of the scan. Other tasks, like writing files, plotting or scanning
+        other devices, run while the answers of the arduino are on their way.
+
+        Args:
+            start (int): starting ADC voltage value
+            stop (int): stopping ADC voltage value
+            repeats (int): amount of measurements per ADC voltage value
+            result (ScanResult): optional result for start to stop in which every step is kept
+            max_repeats (int): maximum amount of measurements per step when a target is given
+            target_sem_voltage (float): target standard error of the LED voltage (V)
+            target_sem_current (float): target standard error of the LED current (A)
+            writer (ScanWriter): optional writer to which every point is appended as soon as it is measured
+            arduino (AsyncArduinoDevice): open arduino from aopen, which stays open after the scan
+
+        Yields:
+            tuple: voltage, current, error on voltage and error on current of the LED, and the amount of measurements used
+        """
+        from pythondaq.scan_result import ScanResult
+
+        width = self.result_width(
+            repeats, max_repeats, target_sem_voltage, target_sem_current
+        )
+        converge = target_sem_voltage is not None or target_sem_current is not None
+
+        owned = arduino is None
+        if owned:
+            arduino = await self.aopen()
+
+        print("Starting scan")
+        try:
+            step = result if result is not None else ScanResult([start], width)
+            step.resistance = self.resistance
+            step.calibration = self.calibration
+
+            for index, voltage in enumerate(self._steps(range(start, stop + 1))):
+                if converge:
+                    voltages_channel_1, voltages_channel_2 = await self._ameasure_step(
+                        arduino,
+                        voltage,
+                        repeats,
+                        width,
+                        target_sem_voltage,
+                        target_sem_current,
+                    )
+                else:
+                    voltages_channel_1, voltages_channel_2 = (
+                        await arduino.set_output_and_measure(voltage, repeats)
+                    )
+
+                row = index if result is not None else 0
+                with stage("statistics"):
+                    step.record(row, voltages_channel_1, voltages_channel_2)
+                    step.compute_statistics(row, row + 1)
+                yield self._point(step, row, writer)
+        finally:
+            # Turn off lamp after scan
+            try:
+                await arduino.set_output_value(value=0)
+            finally:
+                if owned:
+                    await arduino.close()
+
+    async def ascan(
+        self,
+        start,
+        stop,
+        repeats,
+        max_repeats=None,
+        target_sem_voltage=None,
+        target_sem_current=None,
+        writer=None,
+        arduino=None,
+    ):
+        """Asynchronous version of scan, which leaves the event loop free while waiting for the arduino.
 
-                voltage_LED_list.append(voltage_LED)
-                current_LED_list.append(current)
+        Args:
+            start (int): starting ADC voltage value
+            stop (int): stopping ADC voltage value
+            repeats (int): amount of measurements per ADC voltage value
+            max_repeats (int): maximum amount of measurements per step when a target is given
+            target_sem_voltage (float): target standard error of the LED voltage (V)
+            target_sem_current (float): target standard error of the LED current (A)
+            writer (ScanWriter): optional writer to which every point is appended as soon as it is measured
+            arduino (AsyncArduinoDevice): open arduino from aopen, which stays open after the scan
+
+        Returns:
+            ScanResult: measurement data, unpacks into measured voltage, current, and errors on voltage and current
+        """
+        from pythondaq.scan_result import ScanResult
+
+        width = self.result_width(
+            repeats, max_repeats, target_sem_voltage, target_sem_current
+        )
+        # The resistance and calibration are filled in once the arduino is open
+        result = ScanResult(range(start, stop + 1), width)
+        async for _ in self.aiter_scan(
+            start,
+            stop,
+            repeats,
+            result,
+            max_repeats,
+            target_sem_voltage,
+            target_sem_current,
+            writer,
+            arduino,
+        ):
+            pass
+        return result
+
+    def result_width(
+        self,
+        repeats,
+        max_repeats=None,
+        target_sem_voltage=None,
+        target_sem_current=None,
+    ):
+        """Return the maximum amount of measurements per step, the width of a ScanResult.
+
+        Args:
+            repeats (int): amount of measurements per ADC voltage value
+            max_repeats (int): maximum amount of measurements per step when a target is given
+            target_sem_voltage (float): target standard error of the LED voltage (V)
+            target_sem_current (float): target standard error of the LED current (A)
+
+        Returns:
+            int: repeats, or max_repeats (at least repeats) if a target is given
+        """
+        if target_sem_voltage is None and target_sem_current is None:
+            return repeats
+        if max_repeats is None:
+            max_repeats = 10 * repeats
+        return max(max_repeats, repeats)
+
+    def iter_adaptive_scan(
+        self,
+        start,
+        stop,
+        repeats,
+        budget,
+        coarse_step=32,
+        result=None,
+        max_repeats=None,
+        target_sem_voltage=None,
+        target_sem_current=None,
+        writer=None,
+    ):
+        """Scan from start to stop with a coarse pass first, then refine where the I-U curve changes quickly.
+
+        After the coarse pass the interval between two measured ADC values whose
+        points lie furthest apart on the (normalized) I-U curve is halved, until
+        budget points have been measured. Most of the points therefore end up
+        around the knee of the diode instead of on the flat part of the curve.
+
+        Args:
+            start (int): starting ADC voltage value
+            stop (int): stopping ADC voltage value
+            repeats (int): amount of measurements per ADC voltage value
+            budget (int): total amount of ADC voltage values to measure
+            coarse_step (int): distance between ADC voltage values in the coarse pass
+            result (ScanResult): optional result with at least budget rows, filled in order of measurement
+            max_repeats (int): maximum amount of measurements per step when a target is given
+            target_sem_voltage (float): target standard error of the LED voltage (V)
+            target_sem_current (float): target standard error of the LED current (A)
+            writer (ScanWriter): optional writer to which every point is appended as soon as it is measured
+
+        Raises:
+            ValueError: if start is above stop
+
+        Yields:
+            tuple: voltage, current, error on voltage and error on current of the LED, and the amount of measurements used
+        """
+        import numpy as np
+
+        from pythondaq.scan_result import ScanResult
+
+        if start > stop:
+            raise ValueError(
+                f"An adaptive scan needs a start ({start}) that is not above its stop ({stop})"
+            )
+        coarse_values = list(range(start, stop + 1, coarse_step))
+        if coarse_values[-1] != stop:
+            coarse_values.append(stop)
+        budget = min(max(budget, len(coarse_values)), stop - start + 1)
+        width = self.result_width(
+            repeats, max_repeats, target_sem_voltage, target_sem_current
+        )
+        if result is None:
+            result = ScanResult(
+                np.zeros(budget, dtype=int), width, self.resistance, self.calibration
+            )
 
-            # Convert to numpy arrays for efficiency
-            voltage_LED_array = np.array(voltage_LED_list)
-            current_LED_array = np.array(current_LED_list)
+        def distance(left, right):
+            """Distance between two measured steps on the normalized I-U curve.
 
-            # Calculate mean of repeated measurement
-            mean_voltage_LED = np.mean(voltage_LED_array)
-            mean_current_LED = np.mean(current_LED_array)
+            Voltage counts for a fifth, so the flat part of the curve below
+            the knee is only refined once the rest of the curve is dense.
+            """
+            return np.hypot(
+                0.2 * (result.voltages[right] - result.voltages[left]) / voltage_range,
+                (result.currents[right] - result.currents[left]) / current_range,
+            )
 
-            voltages_scan_LED.append(float(mean_voltage_LED))
-            currents_scan_LED.append(float(mean_current_LED))
+        def values():
+            """Yield the coarse values, then the middle of the interval that changes most."""
+            nonlocal voltage_range, current_range
+            yield from coarse_values
 
-            # Calculate standarddeviation of repeated measurement
-            sigma_voltage_LED = np.std(voltage_LED_array)
-            sigma_current_LED = np.std(current_LED_array)
+            # Normalize voltage and current by their range in the coarse pass
+            coarse = slice(0, len(coarse_values))
+            voltage_range = np.ptp(result.voltages[coarse]) or 1.0
+            current_range = np.ptp(result.currents[coarse]) or 1.0
 
-            # Calculate standard error of means of repeated measurement
-            sem_voltage_LED = sigma_voltage_LED / np.sqrt(repeats)
-            sem_current_LED = sigma_current_LED / np.sqrt(repeats)
+            # Intervals between neighbouring measured values, largest change first
+            intervals = []
+            for left in range(len(coarse_values) - 1):
+                if coarse_values[left + 1] - coarse_values[left] > 1:
+                    heapq.heappush(
+                        intervals,
+                        (-distance(left, left + 1), left, left + 1),
+                    )
 
-            sem_voltage_LED_list.append(float(sem_voltage_LED))
-            sem_current_LED_list.append(float(sem_current_LED))
+            while result.completed < budget and intervals:
+                _, left, right = heapq.heappop(intervals)
+                yield (result.values[left] + result.values[right]) // 2
 
-        # Turn off lamp after scan
-        self.arduino.set_output_value(value=0)
+                # The middle has just been measured in the last completed row
+                middle = result.completed - 1
+                for low, high in ((left, middle), (middle, right)):
+                    if result.values[high] - result.values[low] > 1:
+                        heapq.heappush(intervals, (-distance(low, high), low, high))
 
-        return (
-            voltages_scan_LED,
-            currents_scan_LED,
-            sem_voltage_LED_list,
-            sem_current_LED_list,
+        voltage_range = current_range = 1.0
+        for index, voltage, voltages_channel_1, voltages_channel_2 in self._measure(
+            values(),
+            repeats,
+            total=budget,
+            max_repeats=width,
+            target_sem_voltage=target_sem_voltage,
+            target_sem_current=target_sem_current,
+        ):
+            result.values[index] = voltage
+            with stage("statistics"):
+                result.record(index, voltages_channel_1, voltages_channel_2)
+                result.compute_statistics(index, index + 1)
+            yield self._point(result, index, writer)
+
+    def adaptive_scan(
+        self,
+        start,
+        stop,
+        repeats,
+        budget,
+        coarse_step=32,
+        max_repeats=None,
+        target_sem_voltage=None,
+        target_sem_current=None,
+        writer=None,
+    ):
+        """Scan from start to stop with at most budget points, concentrated where the I-U curve changes quickly.
+
+        Args:
+            start (int): starting ADC voltage value
+            stop (int): stopping ADC voltage value
+            repeats (int): amount of measurements per ADC voltage value
+            budget (int): total amount of ADC voltage values to measure
+            coarse_step (int): distance between ADC voltage values in the coarse pass
+            max_repeats (int): maximum amount of measurements per step when a target is given
+            target_sem_voltage (float): target standard error of the LED voltage (V)
+            target_sem_current (float): target standard error of the LED current (A)
+            writer (ScanWriter): optional writer to which every point is appended as soon as it is measured, sorted by ADC output value at the end
+
+        Raises:
+            ValueError: if start is above stop
+
+        Returns:
+            ScanResult: measurement data sorted by ADC voltage value
+        """
+        import numpy as np
+
+        from pythondaq.scan_result import ScanResult
+
+        rows = adaptive_scan_size(start, stop, budget, coarse_step)
+        width = self.result_width(
+            repeats, max_repeats, target_sem_voltage, target_sem_current
         )
+        result = ScanResult(
+            np.zeros(rows, dtype=int), width, self.resistance, self.calibration
+        )
+        for _ in self.iter_adaptive_scan(
+            start,
+            stop,
+            repeats,
+            budget,
+            coarse_step,
+            result,
+            max_repeats,
+            target_sem_voltage,
+            target_sem_current,
+            writer,
+        ):
+            pass
+        if writer is not None:
+            writer.sort(result.values[: result.completed])
+        result.sort()
+        return result
+
+    def monitor(
+        self,
+        start,
+        stop,
+        repeats,
+        interval,
+        buffer=None,
+        step=1,
+        sweeps=None,
+        duration=None,
+        max_repeats=None,
+        target_sem_voltage=None,
+        target_sem_current=None,
+    ):
+        """Repeat a sweep from start to stop, or measure a fixed operating point if they are equal, at a fixed cadence.
+
+        Every sweep reuses the same ScanResult, which is added to buffer and yielded,
+        so memory stays the same however long the monitor runs. A sweep starts every
+        interval seconds, one that takes longer delays the next. The output of a
+        fixed operating point stays on between measurements, so the LED is not
+        cycled, after a sweep of several values it is turned off until the next.
+        The output is turned off when monitoring ends, also when the consumer stops early.
+
+        Args:
+            start (int): starting ADC voltage value
+            stop (int): stopping ADC voltage value
+            repeats (int): amount of measurements per ADC voltage value
+            interval (float): seconds between the starts of two sweeps
+            buffer (MonitorBuffer): optional ring buffer that every sweep is added to
+            step (int): distance between the ADC voltage values of a sweep
+            sweeps (int): stop after this amount of sweeps, never if not given
+            duration (float): stop after the last sweep that starts within this many seconds after the start, never if not given
+            max_repeats (int): maximum amount of measurements per step when a target is given
+            target_sem_voltage (float): target standard error of the LED voltage (V)
+            target_sem_current (float): target standard error of the LED current (A)
+
+        Yields:
+            tuple: time the sweep started in seconds since the epoch, and the ScanResult of the sweep
+        """
+        from pythondaq.scan_result import ScanResult
+
+        width = self.result_width(
+            repeats, max_repeats, target_sem_voltage, target_sem_current
+        )
+        converge = target_sem_voltage is not None or target_sem_current is not None
+        result = ScanResult(
+            range(start, stop + 1, step), width, self.resistance, self.calibration
+        )
+
+        started = time.monotonic()
+        next_sweep = started
+        count = 0
+        with self._lease():
+            try:
+                while sweeps is None or count < sweeps:
+                    timestamp = time.time()
+                    for index, voltage in enumerate(result.values):
+                        with stage("measure"):
+                            if converge:
+                                voltages_channel_1, voltages_channel_2 = (
+                                    self._measure_step(
+                                        voltage,
+                                        repeats,
+                                        width,
+                                        target_sem_voltage,
+                                        target_sem_current,
+                                    )
+                                )
+                            else:
+                                voltages_channel_1, voltages_channel_2 = (
+                                    self.arduino.set_output_and_measure(
+                                        voltage, repeats
+                                    )
+                                )
+                        with stage("statistics"):
+                            result.record(index, voltages_channel_1, voltages_channel_2)
+                    if len(result.values) > 1:
+                        self.arduino.set_output_value(value=0)
+
+                    with stage("statistics"):
+                        result.compute_statistics()
+                    if buffer is not None:
+                        with stage("save"):
+                            buffer.add(timestamp, result)
+                    count += 1
+                    yield timestamp, result
+
+                    # Keep the cadence, unless the sweep took longer than the interval
+                    now = time.monotonic()
+                    next_sweep = max(next_sweep + interval, now)
+
+                    # Stop before waiting when no sweep follows, so the output is not left on
+                    if sweeps is not None and count >= sweeps:
+                        break
+                    if duration is not None and next_sweep - started >= duration:
+                        break
+                    time.sleep(next_sweep - now)
+            finally:
+                self.arduino.set_output_value(value=0)
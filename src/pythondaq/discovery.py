@@ -0,0 +1,141 @@
+import json
+import os
+import time
+
+from pythondaq.arduino_device import get_resource_manager
+from pythondaq.simulated_device import simulated_ports
+
+
+def default_cache_path():
+    """Return the file in which discovered resources are stored between runs.
+
+    Returns:
+        str: path inside $XDG_CACHE_HOME (or ~/.cache) /pythondaq
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "pythondaq", "resources.json")
+
+
+class ResourceCache:
+    """Remembers the result of a resource enumeration for ttl seconds.
+
+    Enumerating all serial and USB resources is slow, so the connected resources
+    are only enumerated again once the cached list is older than ttl. When a path
+    is given the list is also stored on disk, so separate runs of the command line
+    interface can share it.
+
+    Attributes:
+    ttl (float): seconds a resource list stays valid, 0 disables caching
+    path (str): file to store the resource list in, None to only cache in memory
+
+    Methods:
+    list(refresh)
+    search(search, refresh)
+    invalidate()
+    """
+
+    def __init__(self, ttl=10, path=None):
+        """Create an empty cache.
+
+        Args:
+            ttl (float): seconds a resource list stays valid, 0 disables caching
+            path (str): file to store the resource list in, None to only cache in memory
+        """
+        self.ttl = ttl
+        self.path = path
+        self._resources = None
+        self._timestamp = 0.0
+
+    def list(self, refresh=False):
+        """Return the connected resources, enumerating them only if the cache is stale.
+
+        Args:
+            refresh (bool): enumerate the resources even if the cache is valid
+
+        Returns:
+            tuple of str: connected resources
+        """
+        if refresh or not self._valid():
+            self._resources = tuple(get_resource_manager().list_resources())
+            self._timestamp = time.time()
+            self._store()
+
+        return (*self._resources, *simulated_ports())
+
+    def search(self, search, refresh=False):
+        """Return the connected resources that contain the search string.
+
+        If nothing matches a cached list, the resources are enumerated again in
+        case the device was connected after the list was cached.
+
+        Args:
+            search (str): string to look for in the resource names
+            refresh (bool): enumerate the resources even if the cache is valid
+
+        Returns:
+            list of str: matching resources
+        """
+        fresh = refresh or not self._valid()
+        matches = [device for device in self.list(refresh) if search in device]
+        if not matches and not fresh:
+            matches = [device for device in self.list(True) if search in device]
+        return matches
+
+    def invalidate(self):
+        """Forget the cached resources, both in memory and on disk."""
+        self._resources = None
+        self._timestamp = 0.0
+        if self.path and os.path.isfile(self.path):
+            os.remove(self.path)
+
+    def _valid(self):
+        """Check whether a cached resource list younger than ttl is available.
+
+        Returns:
+            bool: True if the cached list can be used
+        """
+        if self._resources is None:
+            self._load()
+        return self._resources is not None and time.time() - self._timestamp < self.ttl
+
+    def _load(self):
+        """Read the resource list stored on disk, if there is one."""
+        if not self.path or not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path) as cache_file:
+                cached = json.load(cache_file)
+            self._resources = tuple(cached["resources"])
+            self._timestamp = float(cached["timestamp"])
+        except (OSError, ValueError, KeyError, TypeError):
+            self._resources = None
+
+    def _store(self):
+        """Write the resource list to disk, replacing the old file in one step."""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as cache_file:
+            json.dump(
+                {"timestamp": self._timestamp, "resources": self._resources},
+                cache_file,
+            )
+        os.replace(temporary_path, self.path)
+
+
+# Cache shared by the command line interface, GUI and view
+resource_cache = ResourceCache()
+
+
+def configure_discovery(ttl=10, persist=False):
+    """Change how long discovered resources are cached and whether they are stored on disk.
+
+    Args:
+        ttl (float): seconds a resource list stays valid, 0 disables caching
+        persist (bool): store the resource list in default_cache_path()
+    """
+    resource_cache.ttl = ttl
+    resource_cache.path = default_cache_path() if persist else None
@@ -0,0 +1,263 @@
+import numpy as np
+from lmfit import Parameters, fit_report, minimize
+
+# Boltzmann constant (J/K) and elementary charge (C)
+BOLTZMANN_CONSTANT = 1.380649e-23
+ELEMENTARY_CHARGE = 1.602176634e-19
+
+# Largest exponent used, exp(700) is still a finite float64
+MAX_EXPONENT = 700.0
+
+
+class FitError(Exception):
+    """Exception for when a scan does not contain enough data to fit."""
+
+    pass
+
+
+def thermal_voltage(temperature=300):
+    """Return the thermal voltage kT/q.
+
+    Args:
+        temperature (float): temperature of the diode in Kelvin
+
+    Returns:
+        float: thermal voltage in Volts
+    """
+    return BOLTZMANN_CONSTANT * temperature / ELEMENTARY_CHARGE
+
+
+def shockley_current(voltages, log_saturation_current, slope):
+    """Evaluate the Shockley diode formula I = I_s * (exp(V / (n * V_t)) - 1) without overflowing.
+
+    The formula is written as exp(ln I_s + slope * V) - I_s, with slope = 1 / (n * V_t),
+    and the exponent is clipped to MAX_EXPONENT.
+
+    Args:
+        voltages (numpy.ndarray): voltages over the diode
+        log_saturation_current (float): natural logarithm of the saturation current I_s
+        slope (float): 1 / (n * V_t) in 1/Volt
+
+    Returns:
+        numpy.ndarray: currents through the diode
+    """
+    exponent = np.minimum(log_saturation_current + slope * voltages, MAX_EXPONENT)
+    return np.exp(exponent) - np.exp(log_saturation_current)
+
+
+def initial_guess(voltages, currents, fraction=0.01):
+    """Estimate ln I_s and the slope from a straight line through ln I versus V.
+
+    Above the knee the -1 in the Shockley formula is negligible, so ln I is linear
+    in V. Only currents above fraction of the largest current are used, the smaller
+    ones are dominated by noise.
+
+    Args:
+        voltages (numpy.ndarray): voltages over the diode
+        currents (numpy.ndarray): currents through the diode
+        fraction (float): smallest current used, relative to the largest current
+
+    Raises:
+        FitError: if fewer than two currents are positive
+
+    Returns:
+        tuple of float: estimates of ln I_s and of the slope 1 / (n * V_t)
+    """
+    positive = currents > 0
+    if np.count_nonzero(positive) < 2:
+        raise FitError("At least two positive currents are needed to fit")
+    used = currents > fraction * currents.max()
+    if np.count_nonzero(used) < 2 or np.ptp(voltages[used]) == 0:
+        used = positive
+    slope, log_saturation_current = np.polyfit(
+        voltages[used], np.log(currents[used]), 1
+    )
+    return log_saturation_current, max(slope, 1.0)
+
+
+class ShockleyFit:
+    """Result of fitting the Shockley diode formula to a scan.
+
+    Attributes:
+    saturation_current (float): saturation current I_s in Amps
+    ideality (float): ideality factor n, 1 if it was not fitted
+    thermal_voltage (float): thermal voltage V_t in Volts, n * V_t if n was not fitted
+    errors (dict): standard errors of saturation_current, and of ideality or thermal_voltage
+    success (bool): whether the fit converged
+    evaluations (int): amount of function evaluations the fit took
+    reduced_chi_square (float): reduced chi-square of the fit
+    minimizer_result (lmfit.minimizer.MinimizerResult): full result of lmfit
+
+    Methods:
+    currents(voltages)
+    boltzmann_constant(temperature)
+    report()
+    """
+
+    def __init__(self, minimizer_result, fit_ideality, temperature):
+        """Translate the fitted ln I_s and slope to the physical parameters.
+
+        Args:
+            minimizer_result (lmfit.minimizer.MinimizerResult): result of the fit
+            fit_ideality (bool): whether n was fitted with V_t fixed at the temperature
+            temperature (float): temperature of the diode in Kelvin
+        """
+        self.minimizer_result = minimizer_result
+        self.success = minimizer_result.success
+        self.evaluations = minimizer_result.nfev
+        self.reduced_chi_square = minimizer_result.redchi
+
+        log_saturation_current = minimizer_result.params["log_saturation_current"]
+        slope = minimizer_result.params["slope"]
+        self.saturation_current = float(np.exp(log_saturation_current.value))
+        self.errors = {}
+        if log_saturation_current.stderr is not None:
+            self.errors["saturation_current"] = (
+                self.saturation_current * log_saturation_current.stderr
+            )
+
+        # The slope is 1 / (n * V_t), so n and V_t have the same relative error
+        relative_error = (
+            slope.stderr / slope.value if slope.stderr is not None else None
+        )
+        if fit_ideality:
+            self.thermal_voltage = thermal_voltage(temperature)
+            self.ideality = 1 / (slope.value * self.thermal_voltage)
+            if relative_error is not None:
+                self.errors["ideality"] = self.ideality * relative_error
+        else:
+            self.thermal_voltage = 1 / slope.value
+            self.ideality = 1.0
+            if relative_error is not None:
+                self.errors["thermal_voltage"] = self.thermal_voltage * relative_error
+
+    def currents(self, voltages):
+        """Evaluate the fitted formula.
+
+        Args:
+            voltages (array_like of float): voltages over the diode
+
+        Returns:
+            numpy.ndarray: fitted currents
+        """
+        return shockley_current(
+            np.asarray(voltages, dtype=float),
+            np.log(self.saturation_current),
+            1 / (self.ideality * self.thermal_voltage),
+        )
+
+    def boltzmann_constant(self, temperature=300):
+        """Derive the Boltzmann constant from the fitted thermal voltage, assuming n = 1.
+
+        Args:
+            temperature (float): temperature of the diode in Kelvin
+
+        Returns:
+            float: Boltzmann constant in J/K
+        """
+        return self.thermal_voltage * self.ideality * ELEMENTARY_CHARGE / temperature
+
+    def report(self):
+        """Return the lmfit report of the fit.
+
+        Returns:
+            str: fit statistics and fitted ln I_s and slope with their errors
+        """
+        return fit_report(self.minimizer_result)
+
+
+def fit_shockley(
+    voltages,
+    currents,
+    errors_currents=None,
+    fit_ideality=False,
+    temperature=300,
+):
+    """Fit the Shockley diode formula I = I_s * (exp(V / (n * V_t)) - 1) to measured data.
+
+    ln I_s and the slope 1 / (n * V_t) are fitted, which keeps I_s positive and makes
+    the problem close to linear. The fit starts from a straight line through ln I
+    versus V and uses the analytic Jacobian, so it typically converges in a few
+    evaluations. Without fit_ideality the product n * V_t is reported as V_t, like
+    a fit with n = 1.
+
+    Args:
+        voltages (array_like of float): voltages over the diode
+        currents (array_like of float): currents through the diode
+        errors_currents (array_like of float): standard errors of the currents, to weigh the points
+        fit_ideality (bool): fit the ideality factor n with V_t fixed at kT/q
+        temperature (float): temperature of the diode in Kelvin
+
+    Raises:
+        FitError: if there are not enough valid points to fit
+
+    Returns:
+        ShockleyFit: fitted parameters
+    """
+    voltages = np.asarray(voltages, dtype=float)
+    currents = np.asarray(currents, dtype=float)
+    valid = np.isfinite(voltages) & np.isfinite(currents)
+
+    # Weigh by the standard errors, with a floor so points whose repeated
+    # measurements happened to be equal do not dominate
+    weights = np.ones_like(currents)
+    if errors_currents is not None:
+        errors_currents = np.asarray(errors_currents, dtype=float)
+        valid &= np.isfinite(errors_currents)
+        positive_errors = errors_currents[valid & (errors_currents > 0)]
+        if positive_errors.size:
+            floor = 0.1 * np.median(positive_errors)
+            weights = 1 / np.maximum(errors_currents, floor)
+
+    voltages, currents, weights = voltages[valid], currents[valid], weights[valid]
+    if voltages.size < 3:
+        raise FitError(f"At least 3 points are needed to fit, not {voltages.size}")
+
+    log_saturation_current, slope = initial_guess(voltages, currents)
+    params = Parameters()
+    params.add("log_saturation_current", value=log_saturation_current)
+    params.add("slope", value=slope, min=0)
+
+    def residual(params):
+        return weights * (
+            shockley_current(
+                voltages,
+                params["log_saturation_current"].value,
+                params["slope"].value,
+            )
+            - currents
+        )
+
+    def jacobian(params):
+        # dI/d(ln I_s) = I_s * expm1(slope * V), dI/d(slope) = V * I_s * exp(slope * V)
+        log_saturation_current = params["log_saturation_current"].value
+        slope = params["slope"].value
+        exponential = np.exp(
+            np.minimum(log_saturation_current + slope * voltages, MAX_EXPONENT)
+        )
+        return np.array(
+            [
+                weights * (exponential - np.exp(log_saturation_current)),
+                weights * voltages * exponential,
+            ]
+        )
+
+    minimizer_result = minimize(
+        residual, params, method="leastsq", Dfun=jacobian, col_deriv=1
+    )
+    return ShockleyFit(minimizer_result, fit_ideality, temperature)
+
+
+def fit_scan(result, fit_ideality=False, temperature=300):
+    """Fit the Shockley diode formula to the completed steps of a scan.
+
+    Args:
+        result (ScanResult): measured scan
+        fit_ideality (bool): fit the ideality factor n with V_t fixed at kT/q
+        temperature (float): temperature of the diode in Kelvin
+
+    Returns:
+        ShockleyFit: fitted parameters
+    """
+    voltages, currents, _, errors_currents = result
+    return fit_shockley(voltages, currents, errors_currents, fit_ideality, temperature)
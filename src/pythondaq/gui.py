@@ -1,18 +1,181 @@
-import csv
+import os
 import sys
+import threading
 
 import numpy as np
+
 import pyqtgraph as pg
 from PySide6 import QtWidgets
-from PySide6.QtCore import Slot
-
-from pythondaq.diode_experiment import DiodeExperiment, list_connected_resources
+from PySide6.QtCore import QObject, QThread, QTimer, Signal, Slot
+
+from pythondaq.arduino_device import device_pool
+from pythondaq.catalog import RunCatalog
+from pythondaq.data_writer import ScanWriter
+from pythondaq.diode_experiment import (
+    DiodeExperiment,
+    adaptive_scan_size,
+    list_connected_resources,
+)
+from pythondaq.fitting import FitError, fit_scan
+from pythondaq.scan_result import ScanResult
+from pythondaq.simulated_device import enable_simulation
 
 # PyQtGraph global options
 pg.setConfigOption("background", "w")
 pg.setConfigOption("foreground", "k")
 
 
+# Maximum amount of error bars drawn in the visible part of the plot
+MAX_ERROR_BARS = 500
+
+
+def visible_indices(x, low, high, max_points):
+    """Select at most max_points evenly spread indices of the points with low <= x <= high.
+
+    Args:
+        x (numpy.ndarray): x-coordinates of the points
+        low (float): left edge of the visible range
+        high (float): right edge of the visible range
+        max_points (int): maximum amount of indices to return
+
+    Returns:
+        numpy.ndarray: indices of the selected points
+    """
+    indices = np.flatnonzero((x >= low) & (x <= high))
+    stride = -(-len(indices) // max_points)
+    return indices[::stride] if stride > 1 else indices
+
+
+class ScanWorker(QObject):
+    """Runs a LED scan on a worker thread and reports every measured step with signals.
+
+    The steps are stored in the given ScanResult. Only rows before the amount
+    sent with the measured signal are complete, so the GUI can plot them while
+    the next step is being measured.
+
+    Attributes:
+    measured (Signal): amount of completed steps, sent after every step
+    progressed (Signal): amount of completed and total steps
+    failed (Signal): message of the error that ended the scan
+    finished (Signal): sent when the scan has ended, also after cancel or an error
+
+    Methods:
+    run()
+    pause()
+    resume()
+    cancel()
+    """
+
+    measured = Signal(int)
+    progressed = Signal(int, int)
+    failed = Signal(str)
+    finished = Signal()
+
+    def __init__(self, port, start, stop, repeats, result, budget=None, filepath=None):
+        """Prepare a scan, which starts when run is called.
+
+        Args:
+            port (str): port connected to arduino
+            start (int): starting ADC voltage value
+            stop (int): stopping ADC voltage value
+            repeats (int): amount of measurements per ADC voltage value
+            result (ScanResult): result in which the steps are stored
+            budget (int): total amount of ADC voltage values of an adaptive scan, None for a full scan
+            filepath (str): .csv file to which every step is appended while scanning, None to not save
+        """
+        super().__init__()
+        self.port = port
+        self.start = start
+        self.stop = stop
+        self.repeats = repeats
+        self.result = result
+        self.budget = budget
+        self.filepath = filepath
+
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    @Slot()
+    def run(self):
+        """Measure the steps until the scan is done or cancelled."""
+        writer = None
+        try:
+            LED_scan = DiodeExperiment(
+                self.port,
+                progress=lambda done, total: self.progressed.emit(done, total),
+            )
+
+            # Correct the steps with the calibration of the arduino
+            self.result.resistance = LED_scan.resistance
+            self.result.calibration = LED_scan.calibration
+
+            if self.filepath:
+                metadata = LED_scan.scan_metadata(
+                    self.start, self.stop, self.repeats, budget=self.budget
+                )
+                catalog = RunCatalog(os.path.dirname(self.filepath))
+                run_id, _ = catalog.add_run(
+                    os.path.splitext(os.path.basename(self.filepath))[0],
+                    self.port,
+                    metadata["identification"],
+                    metadata,
+                    self.filepath,
+                )
+                writer = ScanWriter(self.filepath, {"run": run_id, **metadata})
+
+            if self.budget is not None:
+                points = LED_scan.iter_adaptive_scan(
+                    self.start,
+                    self.stop,
+                    self.repeats,
+                    self.budget,
+                    result=self.result,
+                    writer=writer,
+                )
+            else:
+                points = LED_scan.iter_scan(
+                    self.start, self.stop, self.repeats, self.result, writer=writer
+                )
+
+            for _ in points:
+                self.measured.emit(self.result.completed)
+
+                # Wait between steps while paused, the generator turns
+                # the output off when the loop is left
+                self._running.wait()
+                if self._cancelled.is_set():
+                    break
+            points.close()
+            if writer is not None:
+                # An adaptive scan measures out of order, the file is stored in order of ADC output value
+                if self.budget is not None:
+                    writer.sort(self.result.values[: self.result.completed])
+                writer.finalize()
+                catalog.finish_run(run_id, points=writer.rows)
+        except Exception as error:
+            # Keep what was measured so far in the .partial file
+            if writer is not None:
+                writer.abort()
+                catalog.finish_run(run_id, "interrupted", writer.rows)
+            self.failed.emit(str(error))
+        finally:
+            self.finished.emit()
+
+    def pause(self):
+        """Stop measuring after the current step until resume or cancel is called."""
+        self._running.clear()
+
+    def resume(self):
+        """Continue a paused scan."""
+        self._running.set()
+
+    def cancel(self):
+        """Stop the scan after the current step."""
+        self._cancelled.set()
+        self._running.set()
+
+
 class UserInterface(QtWidgets.QMainWindow):
     """Graphical user interface for LED scan."""
 
@@ -27,6 +190,31 @@ class UserInterface(QtWidgets.QMainWindow):
         mainVbox = QtWidgets.QVBoxLayout(central_widget)
         self.plot_widget = pg.PlotWidget()
         mainVbox.addWidget(self.plot_widget)
+        self.plot_widget.setLabel("left", "current [A]")
+        self.plot_widget.setLabel("bottom", "voltage [V]")
+
+        # Plot items of the current scan are created once and updated in place,
+        # the points are downsampled to the resolution of the view and only the
+        # error bars inside the visible range are drawn
+        self.scatter = self.plot_widget.plot([], [], symbol="o", pen=None)
+        self.scatter.setDownsampling(auto=True, method="subsample")
+        self.scatter.setClipToView(True)
+        self.error_bars = pg.ErrorBarItem()
+        self.plot_widget.addItem(self.error_bars)
+        self.plot_widget.getViewBox().sigXRangeChanged.connect(self.update_error_bars)
+
+        # Line of the Shockley fit, drawn over the current scan
+        self.fit_curve = self.plot_widget.plot([], [], pen=pg.mkPen("r", width=2))
+
+        # Previous scans are kept as lines without symbols or error bars
+        self.layers = []
+
+        # Redraw at most every 50 ms while a scan is running
+        self.plot_timer = QTimer(self)
+        self.plot_timer.setSingleShot(True)
+        self.plot_timer.setInterval(50)
+        self.plot_timer.timeout.connect(self.redraw)
+        self.completed = 0
         mainHbox = QtWidgets.QHBoxLayout()
         mainVbox.addLayout(mainHbox)
 
@@ -43,6 +231,14 @@ class UserInterface(QtWidgets.QMainWindow):
         connecteddeviceVbox.addWidget(self.connected_device_combobox)
         deviceHbox.addLayout(connecteddeviceVbox)
 
+        # Create button to look for connected devices again
+        refreshVbox = QtWidgets.QVBoxLayout()
+        refresh_button_alignment_label = QtWidgets.QLabel(" ")
+        refreshVbox.addWidget(refresh_button_alignment_label)
+        refresh_button = QtWidgets.QPushButton("Refresh ports")
+        refreshVbox.addWidget(refresh_button)
+        deviceHbox.addLayout(refreshVbox)
+
         # Create device identification button
         identifyVbox = QtWidgets.QVBoxLayout()
         identify_button_alignment_label = QtWidgets.QLabel(" ")
@@ -95,16 +291,78 @@ class UserInterface(QtWidgets.QMainWindow):
         repeatVbox.addWidget(self.repeat_value_spinbox)
         mainHbox.addLayout(repeatVbox)
 
-        # Create start scan button and save data button
-        scan_start_button = QtWidgets.QPushButton("Start scan")
+        # Create and label adaptive scan checkbox and point budget spinbox
+        adaptiveVbox = QtWidgets.QVBoxLayout()
+        self.adaptive_checkbox = QtWidgets.QCheckBox("Adaptive scan")
+        adaptiveVbox.addWidget(self.adaptive_checkbox)
+        self.budget_spinbox = QtWidgets.QSpinBox()
+        self.budget_spinbox.setMinimum(2)
+        self.budget_spinbox.setMaximum(1024)
+        self.budget_spinbox.setValue(120)
+        self.budget_spinbox.setPrefix("Points: ")
+        adaptiveVbox.addWidget(self.budget_spinbox)
+        mainHbox.addLayout(adaptiveVbox)
+
+        # Create checkbox to keep previous scans and button to remove them
+        layersVbox = QtWidgets.QVBoxLayout()
+        self.keep_scans_checkbox = QtWidgets.QCheckBox("Keep previous scans")
+        layersVbox.addWidget(self.keep_scans_checkbox)
+        clear_layers_button = QtWidgets.QPushButton("Clear previous scans")
+        layersVbox.addWidget(clear_layers_button)
+        mainHbox.addLayout(layersVbox)
+
+        # Create start, pause and cancel scan buttons, progress bar and save data button
+        scanHbox = QtWidgets.QHBoxLayout()
+        self.scan_start_button = QtWidgets.QPushButton("Start scan")
+        scanHbox.addWidget(self.scan_start_button)
+        self.pause_button = QtWidgets.QPushButton("Pause")
+        self.pause_button.setCheckable(True)
+        self.pause_button.setEnabled(False)
+        scanHbox.addWidget(self.pause_button)
+        self.cancel_button = QtWidgets.QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
+        scanHbox.addWidget(self.cancel_button)
+        mainVbox.addLayout(scanHbox)
+        self.progress_bar = QtWidgets.QProgressBar()
+        mainVbox.addWidget(self.progress_bar)
+        self.save_while_scanning_checkbox = QtWidgets.QCheckBox("Save while scanning")
+        mainVbox.addWidget(self.save_while_scanning_checkbox)
         save_button = QtWidgets.QPushButton("Save")
-        mainVbox.addWidget(scan_start_button)
         mainVbox.addWidget(save_button)
 
+        # Create Shockley fit button, ideality checkbox and label for the fitted parameters
+        fitHbox = QtWidgets.QHBoxLayout()
+        self.fit_button = QtWidgets.QPushButton("Fit Shockley")
+        fitHbox.addWidget(self.fit_button)
+        self.ideality_checkbox = QtWidgets.QCheckBox("Fit ideality factor n")
+        fitHbox.addWidget(self.ideality_checkbox)
+        self.fit_label = QtWidgets.QLabel("")
+        fitHbox.addWidget(self.fit_label, stretch=1)
+        mainVbox.addLayout(fitHbox)
+
         # Connect buttons to methods
         save_button.clicked.connect(self.save_data)
-        scan_start_button.clicked.connect(self.scan)
+        self.fit_button.clicked.connect(self.fit)
+        self.scan_start_button.clicked.connect(self.scan)
+        self.pause_button.toggled.connect(self.pause)
+        self.cancel_button.clicked.connect(self.cancel)
+        self.identify_button = identify_button
         identify_button.clicked.connect(self.identify)
+        refresh_button.clicked.connect(self.refresh_ports)
+        clear_layers_button.clicked.connect(self.clear_layers)
+
+        # Regularly close devices from the device pool that are no longer used
+        self.evict_timer = QTimer(self)
+        self.evict_timer.timeout.connect(device_pool.evict_idle)
+        self.evict_timer.start(60_000)
+
+    @Slot()
+    def refresh_ports(self):
+        """Look for connected devices again and show them in the port combobox."""
+        current_port = self.connected_device_combobox.currentText()
+        self.connected_device_combobox.clear()
+        self.connected_device_combobox.addItems(list_connected_resources(refresh=True))
+        self.connected_device_combobox.setCurrentText(current_port)
 
     @Slot()
     def identify(self):
@@ -127,44 +385,211 @@ class UserInterface(QtWidgets.QMainWindow):
         start = int(start * V_to_ADC_step)
         stop = int(stop * V_to_ADC_step)
 
-        LED_scan = DiodeExperiment(port)
-        (
-            self.voltages_LED,
-            self.currents_LED,
-            self.errors_voltages_LED,
-            self.errors_currents_LED,
-        ) = LED_scan.scan(start, stop, repeats)
-
-        # Convert to numpy arrays for errorbars
-        self.voltage_array = np.array(self.voltages_LED)
-        self.current_array = np.array(self.currents_LED)
-        self.voltage_error_array = np.array(self.errors_voltages_LED)
-        self.current_error_array = np.array(self.errors_currents_LED)
-
-        # Clear plot so two scans dont overlap
-        self.plot_widget.clear()
-        self.plot()
-
-    def plot(
-        self,
-    ):
-        """Plot data and error of LED scan."""
-        self.plot_widget.plot(
-            self.voltage_array,
-            self.current_array,
-            symbol="o",
-            pen=None,
+        # An adaptive scan refines the range between start and stop, so it cannot run backwards
+        if self.adaptive_checkbox.isChecked() and start > stop:
+            self.show_error(
+                "An adaptive scan needs a start value that is not above the stop value"
+            )
+            return
+
+        # Keep the previous scan as a layer, or clear the plot so two scans dont overlap
+        if self.keep_scans_checkbox.isChecked():
+            self.add_layer()
+        else:
+            self.clear_layers()
+
+        if self.adaptive_checkbox.isChecked():
+            budget = self.budget_spinbox.value()
+            rows = adaptive_scan_size(start, stop, budget, coarse_step=32)
+            self.result = ScanResult(np.zeros(rows, dtype=int), repeats)
+        else:
+            budget = None
+            self.result = ScanResult(range(start, stop + 1), repeats)
+        self.completed = 0
+        self.redraw()
+        self.fit_curve.setData([], [])
+        self.fit_label.setText("")
+
+        # Ask for the file the steps are appended to while scanning
+        filepath = None
+        if self.save_while_scanning_checkbox.isChecked():
+            filepath, _ = QtWidgets.QFileDialog.getSaveFileName(
+                filter="CSV files (*.csv)"
+            )
+
+        # Measure on a worker thread and plot every step as soon as it is measured
+        self.scan_thread = QThread(self)
+        self.scan_worker = ScanWorker(
+            port, start, stop, repeats, self.result, budget, filepath
+        )
+        self.scan_worker.moveToThread(self.scan_thread)
+        self.scan_thread.started.connect(self.scan_worker.run)
+        self.scan_worker.measured.connect(self.plot)
+        self.scan_worker.progressed.connect(self.show_progress)
+        self.scan_worker.failed.connect(self.show_error)
+        self.scan_worker.finished.connect(self.scan_finished)
+        self.scan_worker.finished.connect(self.scan_thread.quit)
+
+        self.set_scanning(True)
+        self.scan_thread.start()
+
+    def closeEvent(self, event):
+        """Cancel a running scan and wait for it, so the output is turned off before the window closes."""
+        if (
+            getattr(self, "scan_thread", None) is not None
+            and self.scan_thread.isRunning()
+        ):
+            self.scan_worker.cancel()
+            self.scan_thread.wait()
+        super().closeEvent(event)
+
+    @Slot(bool)
+    def pause(self, paused):
+        """Pause or resume the running scan.
+
+        Args:
+            paused (bool): True to pause, False to resume
+        """
+        if paused:
+            self.scan_worker.pause()
+            self.pause_button.setText("Resume")
+        else:
+            self.scan_worker.resume()
+            self.pause_button.setText("Pause")
+
+    @Slot()
+    def cancel(self):
+        """Stop the running scan after the current step, the measured steps are kept."""
+        self.scan_worker.cancel()
+
+    @Slot(int, int)
+    def show_progress(self, completed, total):
+        """Show the amount of measured steps in the progress bar.
+
+        Args:
+            completed (int): amount of measured steps
+            total (int): amount of steps in the scan
+        """
+        self.progress_bar.setMaximum(total)
+        self.progress_bar.setValue(completed)
+
+    @Slot(str)
+    def show_error(self, message):
+        """Tell the user why the scan stopped.
+
+        Args:
+            message (str): error message
+        """
+        QtWidgets.QMessageBox.warning(self, "Scan failed", message)
+
+    @Slot()
+    def scan_finished(self):
+        """Plot the final data and enable the controls again."""
+        # Adaptive scans are measured out of order
+        self.result.sort()
+        self.plot_timer.stop()
+        self.completed = self.result.completed
+        self.redraw()
+        self.set_scanning(False)
+
+    def set_scanning(self, scanning):
+        """Enable the buttons that can be used while a scan is running, disable the others.
+
+        Args:
+            scanning (bool): True while a scan is running
+        """
+        self.scan_start_button.setEnabled(not scanning)
+        self.fit_button.setEnabled(not scanning)
+        self.identify_button.setEnabled(not scanning)
+        self.pause_button.setEnabled(scanning)
+        self.cancel_button.setEnabled(scanning)
+        if not scanning:
+            self.pause_button.setChecked(False)
+
+    @Slot(int)
+    def plot(self, completed):
+        """Schedule an update of the plotted data and error of LED scan.
+
+        Args:
+            completed (int): amount of steps of the scan result that are complete
+        """
+        self.completed = completed
+        if not self.plot_timer.isActive():
+            self.plot_timer.start()
+
+    @Slot()
+    def redraw(self):
+        """Update the plotted data and error of LED scan in place."""
+        # Views on the completed steps of the scan result, nothing is copied
+        self.voltage_array = self.result.voltages[: self.completed]
+        self.current_array = self.result.currents[: self.completed]
+        self.voltage_error_array = self.result.errors_voltages[: self.completed]
+        self.current_error_array = self.result.errors_currents[: self.completed]
+
+        self.scatter.setData(self.voltage_array, self.current_array)
+        self.update_error_bars()
+
+    @Slot()
+    def update_error_bars(self):
+        """Draw the error bars of at most MAX_ERROR_BARS points in the visible range."""
+        if not self.completed:
+            self.error_bars.setData(x=np.empty(0), y=np.empty(0))
+            return
+        low, high = self.plot_widget.getViewBox().viewRange()[0]
+        shown = visible_indices(self.voltage_array, low, high, MAX_ERROR_BARS)
+        self.error_bars.setData(
+            x=self.voltage_array[shown],
+            y=self.current_array[shown],
+            width=self.voltage_error_array[shown],
+            height=self.current_error_array[shown],
         )
 
-        error_bars = pg.ErrorBarItem(
-            x=self.voltage_array,
-            y=self.current_array,
-            width=1 * self.voltage_error_array,
-            height=1 * self.current_error_array,
+    def add_layer(self):
+        """Turn the current scan into a static line in the background of the plot."""
+        if not self.completed:
+            return
+        layer = pg.PlotDataItem(
+            self.voltage_array.copy(),
+            self.current_array.copy(),
+            pen=pg.mkPen(pg.intColor(len(self.layers), hues=12, alpha=150)),
         )
-        self.plot_widget.addItem(error_bars)
-        self.plot_widget.setLabel("left", "current [A]")
-        self.plot_widget.setLabel("bottom", "voltage [V]")
+        layer.setDownsampling(auto=True, method="peak")
+        layer.setClipToView(True)
+        layer.setZValue(-1)
+        self.plot_widget.addItem(layer)
+        self.layers.append(layer)
+
+    @Slot()
+    def clear_layers(self):
+        """Remove all previous scans from the plot."""
+        for layer in self.layers:
+            self.plot_widget.removeItem(layer)
+        self.layers = []
+
+    @Slot()
+    def fit(self):
+        """Fit the Shockley diode formula to the current scan and draw the fitted curve."""
+        if not self.completed:
+            return
+        fit_ideality = self.ideality_checkbox.isChecked()
+        try:
+            fit = fit_scan(self.result, fit_ideality)
+        except FitError as error:
+            self.fit_label.setText(str(error))
+            return
+
+        voltages = np.linspace(
+            np.nanmin(self.voltage_array), np.nanmax(self.voltage_array), 200
+        )
+        self.fit_curve.setData(voltages, fit.currents(voltages))
+        if fit_ideality:
+            self.fit_label.setText(
+                f"I_s = {fit.saturation_current:.3g} A, n = {fit.ideality:.3f}"
+            )
+        else:
+            self.fit_label.setText(
+                f"I_s = {fit.saturation_current:.3g} A, V_t = {fit.thermal_voltage:.4f} V"
+            )
 
     @Slot()
     def save_data(self):
@@ -172,25 +597,26 @@ class UserInterface(QtWidgets.QMainWindow):
         # Open menu in which user can choose filename/directory
         filename, _ = QtWidgets.QFileDialog.getSaveFileName(filter="CSV files (*.csv)")
 
-        # Write data to csv file
-        with open(f"{filename}", "w", newline="") as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["I (A)", "U (V)", "SEM_I (A)", "SEM_U (V)"])
-            for (
-                current,
-                voltage,
-                error_current,
-                error_voltage,
-            ) in zip(
-                self.current_array,
+        if not filename:
+            return
+
+        # Write data to csv file, which only appears once complete
+        with ScanWriter(filename) as writer:
+            for point in zip(
                 self.voltage_array,
-                self.current_error_array,
+                self.current_array,
                 self.voltage_error_array,
+                self.current_error_array,
+                self.result.counts,
             ):
-                writer.writerow([current, voltage, error_current, error_voltage])
+                writer.write_point(*point)
 
 
 def main():
+    # Offer the simulated Arduino when started with --simulate
+    if "--simulate" in sys.argv:
+        enable_simulation()
+
     app = QtWidgets.QApplication(sys.argv)
     ui = UserInterface()
     ui.show()
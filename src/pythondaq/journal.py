@@ -0,0 +1,201 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from pythondaq.scan_result import ScanResult
+
+# Version of the journal format, stored in the header line
+JOURNAL_VERSION = 1
+
+
+def journal_path(filepath):
+    """Return the path of the journal that belongs to a .csv file.
+
+    Args:
+        filepath (str): path of the final .csv file
+
+    Returns:
+        str: path of the journal next to it
+    """
+    return f"{filepath}.journal"
+
+
+class ScanJournal:
+    """Append-only file with the measurements of every completed step of a scan, to resume it after a crash.
+
+    The file starts with a JSON header line, followed by one row of float64 per
+    step: the ADC output value, the amount of measurements and the voltages of
+    channel 1 and of channel 2, padded with NaN to width. Every row is handed to
+    the operating system as soon as the step is done and forced to disk every
+    checkpoint_interval seconds. A row that was only partly written when the
+    scan died is dropped when the journal is resumed, so the journal always
+    ends at a completed step. Because the raw measurements are kept, the
+    statistics of the resumed scan are calculated exactly as if it had never
+    been interrupted.
+
+    Attributes:
+    path (str): path of the journal file
+    width (int): amount of measurements a row has room for per channel
+    checkpoint_interval (float): maximum seconds between writes to disk
+    steps (int): amount of completed steps in the journal
+
+    Methods:
+    resume(path, checkpoint_interval)
+    record(value, voltages_channel_1, voltages_channel_2)
+    checkpoint()
+    result(resistance, calibration)
+    close()
+    remove()
+    """
+
+    def __init__(
+        self, path, width, checkpoint_interval=1.0, journal_file=None, steps=0
+    ):
+        """Create a new journal, use ScanJournal.resume to continue an existing one.
+
+        Args:
+            path (str): path of the journal file
+            width (int): amount of measurements a row has room for per channel
+            checkpoint_interval (float): maximum seconds between writes to disk
+            journal_file (file): open journal to append to, see ScanJournal.resume
+            steps (int): amount of completed steps in journal_file
+        """
+        self.path = path
+        self.width = width
+        self.checkpoint_interval = checkpoint_interval
+        self.steps = steps
+        if journal_file is None:
+            journal_file = open(path, "wb")
+            header = {"version": JOURNAL_VERSION, "width": width}
+            journal_file.write(json.dumps(header).encode() + b"\n")
+        self._file = journal_file
+        self.checkpoint()
+
+    @classmethod
+    def resume(cls, path, checkpoint_interval=1.0):
+        """Open an existing journal to append to it, dropping a partly written last row.
+
+        Args:
+            path (str): path of the journal file
+            checkpoint_interval (float): maximum seconds between writes to disk
+
+        Raises:
+            ValueError: if the file is not a journal
+
+        Returns:
+            ScanJournal: journal positioned after its last completed step
+        """
+        header_size, width = cls._read_header(path)
+        row_size = cls._row_size(width)
+        steps = (os.path.getsize(path) - header_size) // row_size
+
+        journal_file = open(path, "r+b")
+        journal_file.truncate(header_size + steps * row_size)
+        journal_file.seek(0, os.SEEK_END)
+        return cls(path, width, checkpoint_interval, journal_file, steps)
+
+    @staticmethod
+    def _read_header(path):
+        """Read the header line of a journal.
+
+        Args:
+            path (str): path of the journal file
+
+        Raises:
+            ValueError: if the file is not a journal
+
+        Returns:
+            tuple: size of the header in bytes and the width of the rows
+        """
+        with open(path, "rb") as journal_file:
+            line = journal_file.readline()
+        try:
+            header = json.loads(line)
+        except ValueError:
+            raise ValueError(f"{path} is not a scan journal")
+        if header.get("version") != JOURNAL_VERSION:
+            raise ValueError(f"{path} has an unknown journal version")
+        return len(line), header["width"]
+
+    @staticmethod
+    def _row_size(width):
+        """Return the size of a row in bytes.
+
+        Args:
+            width (int): amount of measurements a row has room for per channel
+
+        Returns:
+            int: bytes per row
+        """
+        return (2 + 2 * width) * np.dtype(np.float64).itemsize
+
+    def record(self, value, voltages_channel_1, voltages_channel_2):
+        """Append a completed step.
+
+        Args:
+            value (int): ADC output value of the step
+            voltages_channel_1 (list of float): voltages measured on channel 1, at most width
+            voltages_channel_2 (list of float): voltages measured on channel 2, at most width
+        """
+        count = len(voltages_channel_1)
+        row = np.full(2 + 2 * self.width, np.nan)
+        row[0] = value
+        row[1] = count
+        row[2 : 2 + count] = voltages_channel_1
+        row[2 + self.width : 2 + self.width + count] = voltages_channel_2
+        self._file.write(row.tobytes())
+        self._file.flush()
+        self.steps += 1
+        if time.monotonic() - self._checkpointed >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Force the recorded steps to disk."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._checkpointed = time.monotonic()
+
+    def result(self, resistance=220, calibration=None):
+        """Read the completed steps back into a ScanResult with their statistics.
+
+        Args:
+            resistance (float): resistance in Ohm of the resistor in series with the LED
+            calibration (Calibration): optional corrections of the input channels
+
+        Returns:
+            ScanResult: all completed steps in the journal
+        """
+        if not self._file.closed:
+            self._file.flush()
+        header_size, _ = self._read_header(self.path)
+        with open(self.path, "rb") as journal_file:
+            journal_file.seek(header_size)
+            data = journal_file.read(self.steps * self._row_size(self.width))
+        rows = np.frombuffer(data, dtype=np.float64).reshape(
+            self.steps, 2 + 2 * self.width
+        )
+
+        result = ScanResult(rows[:, 0].astype(int), self.width, resistance, calibration)
+        result.channel_1 = rows[:, 2 : 2 + self.width].copy()
+        result.channel_2 = rows[:, 2 + self.width :].copy()
+        result.counts = rows[:, 1].astype(int)
+        result.completed = self.steps
+
+        # Step by step, like iter_scan, so the points equal those of an uninterrupted scan
+        for row in range(self.steps):
+            result.compute_statistics(row, row + 1)
+        return result
+
+    def close(self):
+        """Force the recorded steps to disk and close the journal, keeping it for a resume."""
+        if self._file.closed:
+            return
+        self.checkpoint()
+        self._file.close()
+
+    def remove(self):
+        """Close and delete the journal, once the scan has been saved completely."""
+        self._file.close()
+        os.remove(self.path)
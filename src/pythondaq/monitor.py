@@ -0,0 +1,182 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+# Name of the file with the settings of a monitor run inside its directory
+MONITOR_FILENAME = "monitor.json"
+
+
+def chunk_path(directory, index):
+    """Return the path of a chunk of spilled sweeps.
+
+    Args:
+        directory (str): directory of the monitor run
+        index (int): number of the chunk, counting from 0
+
+    Returns:
+        str: path of the .npz file
+    """
+    return os.path.join(directory, f"chunk_{index:06d}.npz")
+
+
+class MonitorBuffer:
+    """Ring buffer with the most recent sweeps of a monitor run, older sweeps are spilled to disk in chunks.
+
+    The buffer holds capacity sweeps of the same ADC values in preallocated
+    arrays, so its memory stays the same however long the run lasts. Once it
+    is full, the oldest chunk_size sweeps are written to a compressed .npz
+    file in directory before they are overwritten, the statistics as float32.
+    Without a directory the oldest sweeps are dropped instead. Closing the
+    buffer spills the sweeps that are still only in memory, so the chunks
+    together hold every sweep of the run.
+
+    Attributes:
+    values (numpy.ndarray): ADC output values of every sweep
+    capacity (int): amount of sweeps kept in memory, a multiple of chunk_size
+    chunk_size (int): amount of sweeps per chunk on disk
+    directory (str): directory the chunks are written to, None to drop old sweeps
+    sweeps (int): amount of sweeps added
+    spilled (int): amount of oldest sweeps no longer only in memory
+    chunks (int): amount of chunks written
+
+    Methods:
+    add(timestamp, result)
+    recent(count)
+    close()
+    """
+
+    def __init__(
+        self, values, capacity=256, chunk_size=64, directory=None, metadata=None
+    ):
+        """Allocate the ring buffer and write the settings of the run to directory.
+
+        Args:
+            values (iterable of int): ADC output values of every sweep
+            capacity (int): amount of sweeps kept in memory, rounded up to a multiple of chunk_size
+            chunk_size (int): amount of sweeps per chunk on disk
+            directory (str): existing directory to write the chunks to, None to drop old sweeps
+            metadata (dict): information about the run, stored in monitor.json in directory
+        """
+        self.values = np.asarray(values, dtype=int)
+        self.chunk_size = chunk_size
+        self.capacity = -(-capacity // chunk_size) * chunk_size
+        self.directory = directory
+        self.sweeps = 0
+        self.spilled = 0
+        self.chunks = 0
+
+        # Timestamps, then voltage, current and their errors per sweep and ADC value
+        self.times = np.full(self.capacity, np.nan)
+        self.points = np.full((self.capacity, 4, len(self.values)), np.nan)
+        self.counts = np.zeros((self.capacity, len(self.values)), dtype=np.int32)
+
+        if directory is not None:
+            with open(os.path.join(directory, MONITOR_FILENAME), "w") as monitor_file:
+                json.dump(
+                    {**(metadata or {}), "values": self.values.tolist()},
+                    monitor_file,
+                    default=str,
+                )
+
+    def add(self, timestamp, result):
+        """Store a sweep, spilling the oldest chunk first when the buffer is full.
+
+        Args:
+            timestamp (float): time the sweep started, in seconds since the epoch
+            result (ScanResult): statistics of the sweep, the arrays are copied
+        """
+        if self.sweeps - self.spilled == self.capacity:
+            self._spill(self.chunk_size)
+        slot = self.sweeps % self.capacity
+        self.times[slot] = timestamp
+        self.points[slot] = (
+            result.voltages,
+            result.currents,
+            result.errors_voltages,
+            result.errors_currents,
+        )
+        self.counts[slot] = result.counts
+        self.sweeps += 1
+
+    def recent(self, count=None):
+        """Return the most recent sweeps in memory, oldest first.
+
+        Args:
+            count (int): amount of sweeps, all sweeps in memory if not given
+
+        Returns:
+            tuple of numpy.ndarray: timestamps, statistics (sweeps x 4 x values) and counts
+        """
+        available = min(self.sweeps, self.capacity)
+        if count is not None:
+            available = min(available, count)
+        slots = np.arange(self.sweeps - available, self.sweeps) % self.capacity
+        return self.times[slots], self.points[slots], self.counts[slots]
+
+    def _spill(self, count):
+        """Write the oldest sweeps that are only in memory to a chunk, or drop them without directory.
+
+        Args:
+            count (int): amount of sweeps to spill
+        """
+        count = min(count, self.sweeps - self.spilled)
+        if count == 0:
+            return
+        if self.directory is not None:
+            slots = np.arange(self.spilled, self.spilled + count) % self.capacity
+            path = chunk_path(self.directory, self.chunks)
+
+            # Write to a temporary file first, so a chunk on disk is always complete
+            temporary_path = f"{path}.tmp"
+            with open(temporary_path, "wb") as chunk_file:
+                np.savez_compressed(
+                    chunk_file,
+                    first=self.spilled,
+                    times=self.times[slots],
+                    points=self.points[slots].astype(np.float32),
+                    counts=self.counts[slots],
+                )
+            os.replace(temporary_path, path)
+            self.chunks += 1
+        self.spilled += count
+
+    def close(self):
+        """Spill every sweep that is still only in memory, they stay available in memory as well."""
+        while self.spilled < self.sweeps:
+            self._spill(self.chunk_size)
+
+
+def load_monitor(directory):
+    """Read all spilled sweeps of a monitor run.
+
+    Args:
+        directory (str): directory of the monitor run
+
+    Returns:
+        tuple: settings of the run (dict), timestamps, statistics (sweeps x 4 x values) and counts
+    """
+    with open(os.path.join(directory, MONITOR_FILENAME)) as monitor_file:
+        metadata = json.load(monitor_file)
+
+    times, points, counts = [], [], []
+    for path in sorted(glob.glob(os.path.join(directory, "chunk_*.npz"))):
+        with np.load(path) as chunk:
+            times.append(chunk["times"])
+            points.append(chunk["points"])
+            counts.append(chunk["counts"])
+    steps = len(metadata["values"])
+    if not times:
+        return (
+            metadata,
+            np.empty(0),
+            np.empty((0, 4, steps), dtype=np.float32),
+            np.empty((0, steps), dtype=np.int32),
+        )
+    return (
+        metadata,
+        np.concatenate(times),
+        np.concatenate(points),
+        np.concatenate(counts),
+    )
@@ -0,0 +1,327 @@
+import bisect
+import contextlib
+import json
+import threading
+import time
+
+# Upper bounds in seconds of the histogram buckets, 1 us doubling up to about 8 s,
+# plus one bucket for everything slower
+BUCKET_BOUNDS = [1e-6 * 2**exponent for exponent in range(24)]
+
+# Status code of a VISA timeout, pyvisa.constants.StatusCode.error_timeout
+VI_ERROR_TMO = -1073807339
+
+# Profile that queries and stages are recorded in, None when profiling is off
+_profile = None
+
+# Returned by stage when profiling is off, so timing a stage costs one function call
+_NO_STAGE = contextlib.nullcontext()
+
+
+def command_kind(command):
+    """Group a firmware command under the kind it is timed as.
+
+    Args:
+        command (str): command sent to the arduino
+
+    Returns:
+        str: kind like OUT, OUT?, MEAS:CH1, MEAS:BULK or *IDN
+    """
+    name = command.split(" ", 1)[0]
+    if name == "OUT:CH0":
+        return "OUT"
+    if name == "OUT:CH0?":
+        return "OUT?"
+    return name.rstrip("?")
+
+
+class LatencyHistogram:
+    """Counts durations in logarithmic buckets, so recording costs the same however many are recorded.
+
+    Attributes:
+    counts (list of int): amount of durations per bucket of BUCKET_BOUNDS, the last bucket holds longer ones
+    count (int): amount of recorded durations
+    total (float): sum of the durations in seconds
+    minimum (float): shortest duration in seconds
+    maximum (float): longest duration in seconds
+
+    Methods:
+    add(seconds)
+    mean()
+    percentile(fraction)
+    to_dict()
+    """
+
+    def __init__(self):
+        """Start with empty buckets."""
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = float("inf")
+        self.maximum = 0.0
+
+    def add(self, seconds):
+        """Record a duration.
+
+        Args:
+            seconds (float): duration to record
+        """
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.minimum = min(self.minimum, seconds)
+        self.maximum = max(self.maximum, seconds)
+
+    def mean(self):
+        """Return the mean duration.
+
+        Returns:
+            float: mean in seconds, 0 without durations
+        """
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction):
+        """Estimate a percentile as the upper bound of the bucket it falls in.
+
+        Args:
+            fraction (float): fraction between 0 and 1, like 0.99
+
+        Returns:
+            float: estimated percentile in seconds, at most the longest duration
+        """
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKET_BOUNDS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.maximum)
+        return self.maximum
+
+    def to_dict(self):
+        """Describe the histogram with JSON types.
+
+        Returns:
+            dict: count, total, min, max, mean, p50, p90, p99 and the non-empty buckets by upper bound
+        """
+        bounds = [*BUCKET_BOUNDS, None]
+        return {
+            "count": self.count,
+            "total": self.total,
+            "min": self.minimum if self.count else None,
+            "max": self.maximum,
+            "mean": self.mean(),
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "buckets": [
+                {"le": bound, "count": count}
+                for bound, count in zip(bounds, self.counts)
+                if count
+            ],
+        }
+
+
+class Profile:
+    """Latencies of the queries per command kind, durations of the Python stages and error counts.
+
+    In pipelined mode the answers of a batch are read one after the other, every
+    command is timed from the previous answer (or from writing the batch) to its
+    own answer. The first command of a batch therefore carries the round trip.
+
+    Attributes:
+    queries (dict): LatencyHistogram per command kind
+    stages (dict): LatencyHistogram per stage of the experiment
+    counters (dict): amount of timeouts, errors and reconnects
+    started (float): time.perf_counter() when the profile was created
+
+    Methods:
+    record_query(kind, seconds)
+    record_stage(name, seconds)
+    record_error(error)
+    count(name)
+    stage(name)
+    to_dict()
+    dump(path)
+    """
+
+    def __init__(self):
+        """Start without any recorded query or stage."""
+        self.queries = {}
+        self.stages = {}
+        self.counters = {"timeouts": 0, "errors": 0, "reconnects": 0}
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record_query(self, kind, seconds):
+        """Record the latency of a query.
+
+        Args:
+            kind (str): kind of the command, see command_kind
+            seconds (float): time until the answer was read
+        """
+        with self._lock:
+            histogram = self.queries.get(kind)
+            if histogram is None:
+                histogram = self.queries[kind] = LatencyHistogram()
+            histogram.add(seconds)
+
+    def record_stage(self, name, seconds):
+        """Record the duration of a stage of the experiment.
+
+        Args:
+            name (str): name of the stage, like statistics
+            seconds (float): duration of the stage
+        """
+        with self._lock:
+            histogram = self.stages.get(name)
+            if histogram is None:
+                histogram = self.stages[name] = LatencyHistogram()
+            histogram.add(seconds)
+
+    def record_error(self, error):
+        """Count a failed query as timeout or as other error.
+
+        Args:
+            error (Exception): error raised by the query
+        """
+        timeout = isinstance(error, TimeoutError) or (
+            getattr(error, "error_code", None) == VI_ERROR_TMO
+        )
+        self.count("timeouts" if timeout else "errors")
+
+    def count(self, name):
+        """Increase a counter by one.
+
+        Args:
+            name (str): name of the counter, like reconnects
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time the code in a with block as a stage.
+
+        Args:
+            name (str): name of the stage
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - start)
+
+    def to_dict(self):
+        """Describe the profile with JSON types.
+
+        Returns:
+            dict: wall time, queries and stages per name and the counters
+        """
+        with self._lock:
+            return {
+                "wall_time": time.perf_counter() - self.started,
+                "queries": {
+                    kind: histogram.to_dict()
+                    for kind, histogram in sorted(self.queries.items())
+                },
+                "stages": {
+                    name: histogram.to_dict()
+                    for name, histogram in sorted(self.stages.items())
+                },
+                "counters": dict(self.counters),
+            }
+
+    def dump(self, path):
+        """Write the profile to a .json file.
+
+        Args:
+            path (str): path of the .json file
+        """
+        with open(path, "w") as profile_file:
+            json.dump(self.to_dict(), profile_file, indent=2)
+
+
+def start_profiling():
+    """Start recording queries and stages in a new profile.
+
+    Returns:
+        Profile: the profile that is recorded in
+    """
+    global _profile
+    _profile = Profile()
+    return _profile
+
+
+def stop_profiling():
+    """Stop recording.
+
+    Returns:
+        Profile: the profile that was recorded in, None if profiling was off
+    """
+    global _profile
+    profile, _profile = _profile, None
+    return profile
+
+
+def active_profile():
+    """Return the profile that is being recorded in.
+
+    Returns:
+        Profile: the active profile, None when profiling is off
+    """
+    return _profile
+
+
+def stage(name):
+    """Time the code in a with block as a stage, when profiling is on.
+
+    Args:
+        name (str): name of the stage
+
+    Returns:
+        context manager: times the block, or does nothing when profiling is off
+    """
+    if _profile is None:
+        return _NO_STAGE
+    return _profile.stage(name)
+
+
+def print_profile_report(profile):
+    """Print tables with the latency of every command kind and the duration of every stage.
+
+    Args:
+        profile (Profile): recorded profile
+    """
+    from rich.console import Console
+    from rich.table import Table
+
+    data = profile.to_dict()
+    console = Console()
+    for title, first_column, histograms in (
+        ("Query latency", "command", data["queries"]),
+        ("Stage duration", "stage", data["stages"]),
+    ):
+        table = Table(title=title)
+        table.add_column(first_column)
+        table.add_column("count", justify="right")
+        for column in ["mean", "p50", "p90", "p99", "max"]:
+            table.add_column(f"{column} (ms)", justify="right")
+        table.add_column("total (s)", justify="right")
+        table.add_column("share", justify="right")
+        for name, histogram in histograms.items():
+            table.add_row(
+                name,
+                str(histogram["count"]),
+                *(
+                    f"{histogram[key] * 1000:.3f}"
+                    for key in ["mean", "p50", "p90", "p99", "max"]
+                ),
+                f"{histogram['total']:.3f}",
+                f"{histogram['total'] / data['wall_time']:.0%}",
+            )
+        console.print(table)
+
+    counters = ", ".join(f"{name}: {count}" for name, count in data["counters"].items())
+    console.print(f"Wall time {data['wall_time']:.3f} s, {counters}")
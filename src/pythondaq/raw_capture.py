@@ -0,0 +1,138 @@
+import numpy as np
+
+from pythondaq.scan_result import ScanResult
+
+# Volts per ADC count of the Arduino
+ADC_STEP = 3.3 / 1023
+
+
+class RawCapture:
+    """Raw ADC values of a scan, stored as uint16 instead of voltages.
+
+    Every step is one row of a (steps x (2 + 2 * repeats)) uint16 array: the ADC
+    output value, the amount of measurements, the ADC values of channel 1 and
+    the ADC values of channel 2. A row takes a quarter of the memory of the
+    same measurements as float64 voltages. When a path is given the array is
+    a memory-mapped .npy file, so very long runs do not have to fit in memory
+    and the file can be opened again with RawCapture.load to be converted with
+    a different calibration.
+
+    Attributes:
+    repeats (int): maximum amount of measurements per step
+    data (numpy.ndarray): the uint16 array, or memory map, with one row per step
+    path (str): path of the memory-mapped .npy file, None if kept in memory
+    completed (int): amount of steps that have been measured
+
+    Methods:
+    load(path)
+    record(index, value, values_channel_1, values_channel_2)
+    flush()
+    to_result(resistance, step, calibration)
+    """
+
+    def __init__(self, steps, repeats, path=None, data=None):
+        """Allocate the array for a capture, in memory or as a memory-mapped .npy file.
+
+        Args:
+            steps (int): amount of steps in the scan
+            repeats (int): maximum amount of measurements per step
+            path (str): .npy file to store the capture in, None to keep it in memory
+            data (numpy.ndarray): existing array to use instead, see RawCapture.load
+        """
+        self.repeats = repeats
+        self.path = path
+        if data is not None:
+            self.data = data
+        elif path is not None:
+            self.data = np.lib.format.open_memmap(
+                path, mode="w+", dtype=np.uint16, shape=(steps, 2 + 2 * repeats)
+            )
+        else:
+            self.data = np.zeros((steps, 2 + 2 * repeats), dtype=np.uint16)
+        self.completed = int(np.count_nonzero(self.counts))
+
+    @classmethod
+    def load(cls, path):
+        """Open a capture stored in a .npy file, without reading it into memory.
+
+        Args:
+            path (str): path of the .npy file
+
+        Returns:
+            RawCapture: the stored capture, read-only
+        """
+        data = np.load(path, mmap_mode="r")
+        return cls(len(data), (data.shape[1] - 2) // 2, path, data)
+
+    @property
+    def values(self):
+        """ADC output values of the steps."""
+        return self.data[:, 0]
+
+    @property
+    def counts(self):
+        """Amount of measurements per step."""
+        return self.data[:, 1]
+
+    @property
+    def channel_1(self):
+        """ADC values measured on channel 1, one row per step."""
+        return self.data[:, 2 : 2 + self.repeats]
+
+    @property
+    def channel_2(self):
+        """ADC values measured on channel 2, one row per step."""
+        return self.data[:, 2 + self.repeats :]
+
+    def record(self, index, value, values_channel_1, values_channel_2):
+        """Store the ADC values of a single step.
+
+        Args:
+            index (int): index of the step
+            value (int): ADC output value of the step
+            values_channel_1 (numpy.ndarray): ADC values measured on channel 1, at most repeats
+            values_channel_2 (numpy.ndarray): ADC values measured on channel 2, at most repeats
+        """
+        count = len(values_channel_1)
+        row = self.data[index]
+        row[0] = value
+        row[1] = count
+        row[2 : 2 + count] = values_channel_1
+        row[2 + self.repeats : 2 + self.repeats + count] = values_channel_2
+        self.completed = max(self.completed, index + 1)
+
+    def flush(self):
+        """Write the memory-mapped array to disk, nothing happens for an in-memory capture."""
+        if isinstance(self.data, np.memmap):
+            self.data.flush()
+
+    def to_result(self, resistance=220, step=ADC_STEP, calibration=None):
+        """Convert the completed steps to voltages and calculate their statistics in one vectorized pass.
+
+        Args:
+            resistance (float): resistance in Ohm of the resistor in series with the LED
+            step (float or tuple of float): Volts per ADC count, or one per channel (channel 1, channel 2)
+            calibration (Calibration): calibration that converts the counts instead of step
+
+        Returns:
+            ScanResult: voltages and statistics of the completed steps
+        """
+        rows = slice(0, self.completed)
+        result = ScanResult(self.values[rows], self.repeats, resistance)
+        if calibration is not None:
+            result.channel_1 = calibration.voltages(1, self.channel_1[rows])
+            result.channel_2 = calibration.voltages(2, self.channel_2[rows])
+        else:
+            step_channel_1, step_channel_2 = np.broadcast_to(step, 2)
+            result.channel_1 = self.channel_1[rows] * step_channel_1
+            result.channel_2 = self.channel_2[rows] * step_channel_2
+        result.counts = self.counts[rows].astype(int)
+
+        # Entries after the amount of measurements of a step were never measured
+        unused = np.arange(self.repeats) >= result.counts[:, np.newaxis]
+        result.channel_1[unused] = np.nan
+        result.channel_2[unused] = np.nan
+
+        result.completed = self.completed
+        result.compute_statistics()
+        return result
@@ -0,0 +1,288 @@
+import os
+import sys
+
+
+def headless():
+    """Check whether figures cannot be shown on a screen.
+
+    Returns:
+        bool: True if matplotlib is set to the Agg backend, or Linux has no X or Wayland display
+    """
+    if os.environ.get("MPLBACKEND", "").lower() == "agg":
+        return True
+    return sys.platform.startswith("linux") and not (
+        os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY")
+    )
+
+
+def select_backend():
+    """Switch matplotlib to the Agg backend when there is no display, before pyplot is used.
+
+    Returns:
+        bool: True if running headless
+    """
+    if not headless():
+        return False
+    import matplotlib
+
+    matplotlib.use("Agg")
+    return True
+
+
+def draw_scan(
+    axes,
+    voltages_LED,
+    currents_LED,
+    errors_voltages_LED,
+    errors_currents_LED,
+    label=None,
+):
+    """Draw the I-U diagram of a scan with error bars.
+
+    Args:
+        axes (matplotlib.axes.Axes): axes to draw on
+        voltages_LED (list of float): measured voltages (in Volts)
+        currents_LED (list of float): measured currents (in Amps)
+        errors_voltages_LED (list of float): voltage measurement errors
+        errors_currents_LED (list of float): current measurement errors
+        label (str): label of the data in the legend
+    """
+    axes.errorbar(
+        voltages_LED,
+        currents_LED,
+        xerr=errors_voltages_LED,
+        yerr=errors_currents_LED,
+        ecolor="red",
+        fmt="o",
+        markersize=4,
+        label=label,
+    )
+    axes.set_title("I-U diagram of LED")
+    axes.set_xlabel("Voltage U (V)")
+    axes.set_ylabel("Current I (Amp)")
+
+
+def draw_shockley(axes, voltages_LED, currents_LED, fit_currents, device):
+    """Draw a scan together with the Shockley formula fitted to it.
+
+    Args:
+        axes (matplotlib.axes.Axes): axes to draw on
+        voltages_LED (list of float): measured voltages (in Volts)
+        currents_LED (list of float): measured currents (in Amps)
+        fit_currents (list of float): currents of the fit at the measured voltages
+        device (str): port of the scanned device, or name of the scan, used in the title
+    """
+    axes.plot(voltages_LED, currents_LED, ".", label="Scan")
+    axes.plot(voltages_LED, fit_currents, ".", label="Fit")
+    axes.legend(loc="best")
+    axes.set_title(f"Shockley fit of LED scan on {device}")
+    axes.set_xlabel("Voltage (V)")
+    axes.set_ylabel("Current (A)")
+
+
+def draw_drift(axes, times, currents, errors_currents, voltage):
+    """Draw the current of a monitored operating point against time.
+
+    Args:
+        axes (matplotlib.axes.Axes): axes to draw on
+        times (list of float): times of the sweeps in seconds since the start
+        currents (list of float): currents measured in the sweeps (in Amps)
+        errors_currents (list of float): errors on the currents
+        voltage (float): voltage of the output at the operating point
+    """
+    axes.errorbar(times, currents, yerr=errors_currents, fmt=".", ecolor="red")
+    axes.set_title(f"Drift of the LED current at {voltage:.3f} V output")
+    axes.set_xlabel("Time t (s)")
+    axes.set_ylabel("Current I (Amp)")
+
+
+def new_figure():
+    """Create a figure that is not managed by pyplot, so it works without display and on any thread.
+
+    Returns:
+        tuple: the matplotlib.figure.Figure and its axes
+    """
+    from matplotlib.figure import Figure
+
+    figure = Figure(layout="constrained")
+    return figure, figure.add_subplot()
+
+
+class FigureRenderer:
+    """Writes figures to PNG or SVG files on a background thread, so measuring can continue meanwhile.
+
+    A figure must not be changed after it has been submitted. Errors of the
+    background writes are raised by submit or close.
+
+    Attributes:
+    paths (list of str): files that have been written
+
+    Methods:
+    submit(figure, path)
+    busy()
+    close()
+    """
+
+    def __init__(self):
+        """Start the background thread."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.paths = []
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._futures = []
+
+    def submit(self, figure, path):
+        """Queue a figure to be written.
+
+        Args:
+            figure (matplotlib.figure.Figure): figure to write
+            path (str): .png or .svg file to write to
+        """
+        self._collect()
+        self._futures.append(self._executor.submit(figure.savefig, path))
+        self.paths.append(path)
+
+    def busy(self):
+        """Check whether figures are still being written.
+
+        Returns:
+            bool: True if a submitted figure has not been written yet
+        """
+        self._collect()
+        return bool(self._futures)
+
+    def close(self):
+        """Wait until every figure has been written and stop the background thread.
+
+        Returns:
+            list of str: files that have been written
+        """
+        self._executor.shutdown(wait=True)
+        self._collect()
+        return self.paths
+
+    def _collect(self):
+        """Forget written figures, raising the error of a failed write."""
+        pending = []
+        for future in self._futures:
+            if future.done():
+                future.result()
+            else:
+                pending.append(future)
+        self._futures = pending
+
+
+def figure_path(filepath, output_directory=None, file_format="png", shockley=False):
+    """Return the path of the figure of a saved scan.
+
+    Args:
+        filepath (str): path of the .csv file
+        output_directory (str): directory for the figure, the directory of the .csv file if not given
+        file_format (str): png or svg
+        shockley (bool): path of the figure with the Shockley fit, which gets a _shockley suffix
+
+    Returns:
+        str: path of the figure
+    """
+    root = os.path.splitext(os.path.basename(filepath))[0]
+    if shockley:
+        root = f"{root}_shockley"
+    directory = output_directory or os.path.dirname(filepath)
+    return os.path.join(directory, f"{root}.{file_format}")
+
+
+def render_file(filepath, path, shockley=False, temperature=300):
+    """Draw the I-U diagram of a saved scan, or its Shockley fit, and write it to a file.
+
+    Args:
+        filepath (str): path of the .csv file
+        path (str): .png or .svg file to write to
+        shockley (bool): draw the Shockley formula fitted to the scan instead
+        temperature (float): temperature of the LED in Kelvin, used by the fit
+
+    Returns:
+        str: path of the written figure
+    """
+    from pythondaq.data_writer import read_points
+
+    voltages_LED, currents_LED, errors_voltages_LED, errors_currents_LED, _ = (
+        read_points(filepath)
+    )
+    figure, axes = new_figure()
+    name = os.path.splitext(os.path.basename(filepath))[0]
+    if shockley:
+        from pythondaq.fitting import fit_shockley
+
+        fit = fit_shockley(
+            voltages_LED, currents_LED, errors_currents_LED, temperature=temperature
+        )
+        draw_shockley(
+            axes, voltages_LED, currents_LED, fit.currents(voltages_LED), name
+        )
+    else:
+        draw_scan(
+            axes,
+            voltages_LED,
+            currents_LED,
+            errors_voltages_LED,
+            errors_currents_LED,
+            label=name,
+        )
+    figure.savefig(path)
+    return path
+
+
+def render_directory(
+    directory,
+    output_directory=None,
+    file_format="png",
+    shockley=False,
+    temperature=300,
+    workers=None,
+    force=False,
+):
+    """Write a figure for every saved scan in a directory, in parallel over the processor cores.
+
+    Figures that are newer than their .csv file are skipped unless force is given.
+
+    Args:
+        directory (str): directory with .csv files
+        output_directory (str): existing directory for the figures, directory if not given
+        file_format (str): png or svg
+        shockley (bool): draw the Shockley fit of every scan instead of its I-U diagram
+        temperature (float): temperature of the LEDs in Kelvin, used by the fit
+        workers (int): amount of processes, the amount of cores if not given
+        force (bool): also render figures that are up to date
+
+    Yields:
+        tuple: path of the .csv file, and the path of its figure or the error that stopped it
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    from pythondaq.data_writer import list_scans
+
+    jobs = {}
+    for filepath in list_scans(directory):
+        path = figure_path(filepath, output_directory, file_format, shockley)
+        if (
+            not force
+            and os.path.exists(path)
+            and os.path.getmtime(path) >= os.path.getmtime(filepath)
+        ):
+            continue
+        jobs[filepath] = path
+    if not jobs:
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                render_file, filepath, path, shockley, temperature
+            ): filepath
+            for filepath, path in jobs.items()
+        }
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as error:
+                yield futures[future], error
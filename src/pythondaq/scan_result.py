@@ -0,0 +1,183 @@
+import numpy as np
+
+
+class RunningStatistics:
+    """Mean and standard error of the mean of a stream of samples, without keeping the samples.
+
+    Batches of samples are merged with the parallel variant of Welford's algorithm.
+
+    Attributes:
+    count (int): amount of samples seen
+    mean (float): mean of the samples
+
+    Methods:
+    add(samples)
+    sem()
+    """
+
+    def __init__(self):
+        """Start without samples."""
+        self.count = 0
+        self.mean = 0.0
+        self._sum_squares = 0.0
+
+    def add(self, samples):
+        """Add a batch of samples.
+
+        Args:
+            samples (array_like of float): new samples
+        """
+        samples = np.asarray(samples, dtype=float)
+        if samples.size == 0:
+            return
+        batch_mean = samples.mean()
+        batch_sum_squares = np.sum((samples - batch_mean) ** 2)
+
+        total = self.count + samples.size
+        delta = batch_mean - self.mean
+        self.mean += delta * samples.size / total
+        self._sum_squares += (
+            batch_sum_squares + delta**2 * self.count * samples.size / total
+        )
+        self.count = total
+
+    def sem(self):
+        """Return the standard error of the mean, like numpy.std divided by sqrt(count).
+
+        Returns:
+            float: standard error of the mean, infinite without samples
+        """
+        if self.count == 0:
+            return np.inf
+        return np.sqrt(self._sum_squares / self.count) / np.sqrt(self.count)
+
+
+class ScanResult:
+    """Measurements of a LED scan stored in preallocated arrays.
+
+    The voltages measured on channel 1 and 2 are kept as (steps x repeats)
+    matrices, the statistics of all steps are calculated from them in one
+    vectorized pass. Steps may use fewer than repeats measurements, the unused
+    entries are NaN and counts holds the amount actually used. Unpacking a ScanResult gives the voltages, currents, errors
+    on the voltages and errors on the currents of the completed steps, like the
+    lists scan used to return.
+
+    Attributes:
+    values (numpy.ndarray): ADC output values of the steps
+    repeats (int): maximum amount of measurements per step
+    resistance (float): resistance in Ohm of the resistor in series with the LED
+    calibration (Calibration): corrections applied when the statistics are calculated, None for an ideal Arduino
+    channel_1 (numpy.ndarray): voltages measured on channel 1, one row per step
+    channel_2 (numpy.ndarray): voltages measured on channel 2, one row per step
+    counts (numpy.ndarray): amount of measurements used per step
+    voltages (numpy.ndarray): mean voltage over the LED per step
+    currents (numpy.ndarray): mean current through the LED per step
+    errors_voltages (numpy.ndarray): standard error of the mean voltage per step
+    errors_currents (numpy.ndarray): standard error of the mean current per step
+    completed (int): amount of steps that have been measured
+
+    Methods:
+    record(index, voltages_channel_1, voltages_channel_2)
+    compute_statistics(start, stop)
+    sort()
+    """
+
+    def __init__(self, values, repeats, resistance=220, calibration=None):
+        """Preallocate the arrays for a scan over the given ADC output values.
+
+        Args:
+            values (iterable of int): ADC output values of the steps
+            repeats (int): maximum amount of measurements per step
+            resistance (float): resistance in Ohm of the resistor in series with the LED
+            calibration (Calibration): optional corrections of the input channels
+        """
+        self.values = np.asarray(values)
+        self.repeats = repeats
+        self.resistance = resistance
+        self.calibration = calibration
+
+        steps = len(self.values)
+        self.channel_1 = np.empty((steps, repeats))
+        self.channel_2 = np.empty((steps, repeats))
+        self.counts = np.zeros(steps, dtype=int)
+        self.voltages = np.full(steps, np.nan)
+        self.currents = np.full(steps, np.nan)
+        self.errors_voltages = np.full(steps, np.nan)
+        self.errors_currents = np.full(steps, np.nan)
+        self.completed = 0
+
+    def __len__(self):
+        return self.completed
+
+    def __iter__(self):
+        return iter(
+            (
+                self.voltages[: self.completed],
+                self.currents[: self.completed],
+                self.errors_voltages[: self.completed],
+                self.errors_currents[: self.completed],
+            )
+        )
+
+    def record(self, index, voltages_channel_1, voltages_channel_2):
+        """Store the measurements of a single step.
+
+        Args:
+            index (int): index of the step
+            voltages_channel_1 (list of float): voltages measured on channel 1, at most repeats
+            voltages_channel_2 (list of float): voltages measured on channel 2, at most repeats
+        """
+        count = len(voltages_channel_1)
+        self.channel_1[index, :count] = voltages_channel_1
+        self.channel_2[index, :count] = voltages_channel_2
+        if count < self.repeats:
+            self.channel_1[index, count:] = np.nan
+            self.channel_2[index, count:] = np.nan
+        self.counts[index] = count
+        self.completed = max(self.completed, index + 1)
+
+    def compute_statistics(self, start=0, stop=None):
+        """Calculate means and standard errors of the mean for a range of steps at once.
+
+        The calibration is applied to the whole range in the same pass, the stored
+        measurements stay uncorrected so they can be calibrated again.
+
+        Args:
+            start (int): index of the first step
+            stop (int): index after the last step, all completed steps if not given
+        """
+        rows = slice(start, self.completed if stop is None else stop)
+
+        voltage_channel_1 = self.channel_1[rows]
+        voltage_resistor = self.channel_2[rows]
+        if self.calibration is not None and not self.calibration.is_ideal():
+            voltage_channel_1 = self.calibration.correct(1, voltage_channel_1)
+            voltage_resistor = self.calibration.correct(2, voltage_resistor)
+
+        # Voltage over the resistor gives the current, the rest is over the LED
+        current_LED = voltage_resistor / self.resistance
+        voltage_LED = voltage_channel_1 - voltage_resistor
+
+        # Calculate mean and standard error of means of repeated measurements,
+        # skipping the unused (NaN) entries only when some steps have them
+        counts = self.counts[rows]
+        if np.all(counts == self.repeats):
+            mean, std = np.mean, np.std
+        else:
+            mean, std = np.nanmean, np.nanstd
+        self.voltages[rows] = mean(voltage_LED, axis=1)
+        self.currents[rows] = mean(current_LED, axis=1)
+        self.errors_voltages[rows] = std(voltage_LED, axis=1) / np.sqrt(counts)
+        self.errors_currents[rows] = std(current_LED, axis=1) / np.sqrt(counts)
+
+    def sort(self):
+        """Order the completed steps by ADC output value and drop the steps that were never measured."""
+        order = np.argsort(self.values[: self.completed], kind="stable")
+        self.values = self.values[order]
+        self.channel_1 = self.channel_1[order]
+        self.channel_2 = self.channel_2[order]
+        self.counts = self.counts[order]
+        self.voltages = self.voltages[order]
+        self.currents = self.currents[order]
+        self.errors_voltages = self.errors_voltages[order]
+        self.errors_currents = self.errors_currents[order]
@@ -0,0 +1,345 @@
+import math
+import os
+import random
+import time
+from collections import deque
+
+# Resource name under which the simulated Arduino is listed and opened
+SIMULATED_PORT = "SIM::ARDUINO::INSTR"
+
+# Firmware version that is simulated by default, 1.1 adds SYST:CAP? and MEAS:BULK?
+FIRMWARE_VERSION = "1.1.0"
+
+# Settings used when a simulated device is opened, changed by enable_simulation
+_settings = {
+    "enabled": False,
+    "latency": 0.0,
+    "jitter": 0.0,
+    "noise": 1.0,
+    "seed": None,
+    "devices": 1,
+    "firmware": FIRMWARE_VERSION,
+}
+
+
+def enable_simulation(
+    latency=0.0, jitter=0.0, noise=1.0, seed=None, devices=1, firmware=FIRMWARE_VERSION
+):
+    """Make the simulated Arduino available and set the behaviour of new simulated devices.
+
+    Args:
+        latency (float): time in seconds every query takes before it is answered
+        jitter (float): maximum random time in seconds added to the latency
+        noise (float): standard deviation of the ADC noise in ADC counts
+        seed (int): seed for the random generator, for reproducible runs
+        devices (int): amount of simulated Arduinos to list
+        firmware (str): firmware version to simulate, 1.0.0 lacks SYST:CAP? and MEAS:BULK?
+    """
+    _settings.update(
+        enabled=True,
+        latency=latency,
+        jitter=jitter,
+        noise=noise,
+        seed=seed,
+        devices=devices,
+        firmware=firmware,
+    )
+
+
+def simulation_enabled():
+    """Check whether the simulated Arduino should be listed as a connected resource.
+
+    The simulation is enabled through enable_simulation or by setting the
+    PYTHONDAQ_SIMULATE environment variable.
+
+    Returns:
+        bool: True if the simulated Arduino is enabled
+    """
+    return _settings["enabled"] or os.environ.get("PYTHONDAQ_SIMULATE", "") not in (
+        "",
+        "0",
+    )
+
+
+def simulated_ports():
+    """Return the names of the simulated Arduinos that are available.
+
+    The first one is SIMULATED_PORT, further ones are numbered from 2.
+
+    Returns:
+        tuple of str: simulated ports, empty if the simulation is not enabled
+    """
+    if not simulation_enabled():
+        return ()
+    return (SIMULATED_PORT,) + tuple(
+        f"SIM::ARDUINO{number}::INSTR" for number in range(2, _settings["devices"] + 1)
+    )
+
+
+def is_simulated_port(port):
+    """Check whether a port refers to the simulated Arduino.
+
+    Args:
+        port (str): port name
+
+    Returns:
+        bool: True if port is a simulated Arduino
+    """
+    return port.startswith("SIM::")
+
+
+def open_simulated_resource(port):
+    """Open a simulated Arduino with the current simulation settings.
+
+    Args:
+        port (str): name of the simulated port
+
+    Returns:
+        SimulatedArduino: resource that behaves like a pyvisa serial resource
+    """
+    return SimulatedArduino(
+        latency=_settings["latency"],
+        jitter=_settings["jitter"],
+        noise=_settings["noise"],
+        seed=_settings["seed"],
+        resource_name=port,
+        firmware=_settings["firmware"],
+    )
+
+
+class LEDCircuit:
+    """Model of an LED in series with a resistor, driven by the Arduino output channel.
+
+    CH0 drives the LED and resistor, CH1 measures the voltage over LED and resistor
+    and CH2 measures the voltage over the resistor.
+
+    Attributes:
+    resistance (float): resistance in Ohm of the series resistor
+    saturation_current (float): saturation current I_s of the LED in Amps
+    ideality (float): ideality factor n of the LED
+    thermal_voltage (float): thermal voltage V_t in Volts
+
+    Methods:
+    solve(voltage)
+    """
+
+    def __init__(
+        self,
+        resistance=220,
+        saturation_current=1e-18,
+        ideality=2.0,
+        thermal_voltage=0.02585,
+    ):
+        """Set the component values of the circuit.
+
+        Args:
+            resistance (float): resistance in Ohm of the series resistor
+            saturation_current (float): saturation current I_s of the LED in Amps
+            ideality (float): ideality factor n of the LED
+            thermal_voltage (float): thermal voltage V_t in Volts
+        """
+        self.resistance = resistance
+        self.saturation_current = saturation_current
+        self.ideality = ideality
+        self.thermal_voltage = thermal_voltage
+
+    def solve(self, voltage):
+        """Calculate the voltage over the LED and the current for a given supply voltage.
+
+        Args:
+            voltage (float): voltage in Volts over LED and resistor together
+
+        Returns:
+            tuple of float: voltage over the LED (V) and current through the circuit (A)
+        """
+        # The supply voltage is split over LED and resistor, bisect on the LED voltage
+        low, high = 0.0, voltage
+        for _ in range(60):
+            voltage_LED = (low + high) / 2
+            current = self.saturation_current * math.expm1(
+                voltage_LED / (self.ideality * self.thermal_voltage)
+            )
+            if voltage_LED + current * self.resistance > voltage:
+                high = voltage_LED
+            else:
+                low = voltage_LED
+        voltage_LED = (low + high) / 2
+        current = (voltage - voltage_LED) / self.resistance
+        return voltage_LED, current
+
+
+class SimulatedArduino:
+    """Imitates a pyvisa serial resource connected to an Arduino with the VISA firmware.
+
+    Understands the *IDN?, OUT:CH0, OUT:CH0? and MEAS:CHn? commands, and from
+    firmware 1.1 on SYST:CAP? and MEAS:BULK? n, which answers n measurements of
+    channel 2 and channel 1 as one comma separated line. Every answer
+    becomes available after the configured latency (plus jitter), so the time spent
+    on serial round trips can be reproduced without hardware.
+
+    Attributes:
+    latency (float): time in seconds before an answer is available
+    jitter (float): maximum random time in seconds added to the latency
+    noise (float): standard deviation of the ADC noise in ADC counts
+    circuit (LEDCircuit): circuit connected to the Arduino
+    resource_name (str): name of the simulated port
+    firmware (str): simulated firmware version
+
+    Methods:
+    write(message)
+    read()
+    pop_response()
+    query(message)
+    close()
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        jitter=0.0,
+        noise=1.0,
+        seed=None,
+        circuit=None,
+        resource_name=SIMULATED_PORT,
+        firmware=FIRMWARE_VERSION,
+    ):
+        """Set up the simulated Arduino with its output channel turned off.
+
+        Args:
+            latency (float): time in seconds before an answer is available
+            jitter (float): maximum random time in seconds added to the latency
+            noise (float): standard deviation of the ADC noise in ADC counts
+            seed (int): seed for the random generator, for reproducible runs
+            circuit (LEDCircuit): circuit connected to the Arduino, default LED with 220 Ohm
+            resource_name (str): name of the simulated port
+            firmware (str): firmware version to simulate
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.noise = noise
+        self.circuit = circuit if circuit is not None else LEDCircuit()
+        self.resource_name = resource_name
+        self.firmware = firmware
+        self.read_termination = "\r\n"
+        self.write_termination = "\n"
+        self.timeout = 2000
+
+        self._random = random.Random(seed)
+        self._responses = deque()
+        self._output_value = 0
+        self._channels = [0.0, 0.0, 0.0]
+
+    def write(self, message):
+        """Send one or more commands to the simulated Arduino.
+
+        Args:
+            message (str): commands, separated by the write termination
+        """
+        sent = time.perf_counter()
+        for command in message.split(self.write_termination):
+            if command:
+                delay = self.latency + self._random.uniform(0, self.jitter)
+                self._responses.append((sent + delay, self._handle(command)))
+
+    def read(self):
+        """Wait for and return the next answer of the simulated Arduino.
+
+        Raises:
+            pyvisa.errors.VisaIOError: if no command is waiting for an answer
+
+        Returns:
+            str: answer to the oldest unanswered command
+        """
+        remaining, response = self.pop_response()
+        if remaining > 0:
+            time.sleep(remaining)
+        return response
+
+    def pop_response(self):
+        """Take the next answer without waiting for it, for callers that wait themselves.
+
+        Raises:
+            pyvisa.errors.VisaIOError: if no command is waiting for an answer
+
+        Returns:
+            tuple: seconds until the answer is available and the answer
+        """
+        if not self._responses:
+            import pyvisa
+
+            raise pyvisa.errors.VisaIOError(pyvisa.constants.StatusCode.error_timeout)
+        available, response = self._responses.popleft()
+        return available - time.perf_counter(), response
+
+    def query(self, message):
+        """Send a command and wait for its answer.
+
+        Args:
+            message (str): command to send
+
+        Returns:
+            str: answer of the simulated Arduino
+        """
+        self.write(message)
+        return self.read()
+
+    def close(self):
+        """Drop all answers that have not been read."""
+        self._responses.clear()
+
+    def _handle(self, command):
+        """Execute a single firmware command.
+
+        Args:
+            command (str): command without termination
+
+        Returns:
+            str: answer the firmware would send back
+        """
+        command = command.strip()
+        if command == "*IDN?":
+            return f"Arduino VISA firmware v{self.firmware}"
+        bulk = tuple(int(part) for part in self.firmware.split(".")[:2]) >= (1, 1)
+        if bulk and command == "SYST:CAP?":
+            return "MEAS:BULK"
+        if bulk and command.startswith("MEAS:BULK? "):
+            repeats = int(command.split()[1])
+            return ",".join(
+                str(self._measure(channel))
+                for _ in range(repeats)
+                for channel in (2, 1)
+            )
+        if command == "OUT:CH0?":
+            return str(self._output_value)
+        if command.startswith("OUT:CH0 "):
+            value = min(max(int(command.split()[1]), 0), 1023)
+            self._set_output(value)
+            return str(value)
+        if command in ("MEAS:CH0?", "MEAS:CH1?", "MEAS:CH2?"):
+            return str(self._measure(int(command[7])))
+        return f"ERROR: UNKNOWN COMMAND {command}"
+
+    def _set_output(self, value):
+        """Drive the circuit with the given DAC value and update the channel voltages.
+
+        Args:
+            value (int): ADC output value between 0 and 1023
+        """
+        self._output_value = value
+        voltage = value * 3.3 / 1023
+        voltage_LED, current = self.circuit.solve(voltage)
+        self._channels = [voltage, voltage, current * self.circuit.resistance]
+
+    def _measure(self, channel):
+        """Convert the voltage on a channel to ADC counts, including noise.
+
+        Args:
+            channel (int): channel to measure
+
+        Returns:
+            int: ADC value between 0 and 1023
+        """
+        counts = self._channels[channel] * 1023 / 3.3
+        if self.noise:
+            counts += self._random.gauss(0, self.noise)
+        return min(max(round(counts), 0), 1023)
@@ -1,8 +1,7 @@
-import csv
 import os
 
-import matplotlib.pyplot as plt
-
+from pythondaq.catalog import RunCatalog
+from pythondaq.data_writer import VIEW_COLUMNS, ScanWriter
 from pythondaq.diode_experiment import DiodeExperiment
 
 # Define port connected to arduino
@@ -63,16 +62,18 @@ def save_data(currents_LED, voltages_LED, errors_currents_LED, errors_voltages_L
         # Check if the current filename already exists in the specified directory
         filename = "metingen_0.csv"
         counter = 0
-        while filename in entries:
+        while filename in entries or f"{filename}.partial" in entries:
             counter += 1
             filename = f"metingen_{counter}.csv"
 
-        filepath = os.path.join(directory, filename)
+        # Register the run under that filename
+        catalog = RunCatalog(directory)
+        run_id, filepath = catalog.add_run(
+            "metingen", port, filepath=os.path.join(directory, filename)
+        )
 
-        # Create file with the new filename
-        with open(filepath, "w", newline="") as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["I", "U", "SEM_I", "SEM_U"])
+        # Create file with the new filename, which only appears once complete
+        with ScanWriter(filepath, counts=False, columns=VIEW_COLUMNS) as writer:
             for (
                 current,
                 voltage,
@@ -81,7 +82,8 @@ def save_data(currents_LED, voltages_LED, errors_currents_LED, errors_voltages_L
             ) in zip(
                 currents_LED, voltages_LED, errors_currents_LED, errors_voltages_LED
             ):
-                writer.writerow([current, voltage, error_current, error_voltage])
+                writer.write_point(voltage, current, error_voltage, error_current)
+        catalog.finish_run(run_id, points=writer.rows)
 
         print(f"Data saved successfully to {filepath}")
         save_data = False
@@ -154,7 +156,7 @@ def take_inputs():
 
 
 def plot_data(voltages_LED, currents_LED, errors_voltages_LED, errors_currents_LED):
-    """Plots data from scan in diode_experiment.
+    """Plots data from scan in diode_experiment, or writes it to scan.png without a display.
 
     Args:
         voltages_LED (list of float): List of measured voltages (in Volts).
@@ -162,19 +164,22 @@ def plot_data(voltages_LED, currents_LED, errors_voltages_LED, errors_currents_L
         errors_voltages_LED (list of float): List of voltage measurement errors.
         errors_currents_LED (list of float): List of current measurement errors.
     """
+    from pythondaq.rendering import draw_scan, new_figure, select_backend
+
+    if select_backend():
+        figure, axes = new_figure()
+        draw_scan(
+            axes, voltages_LED, currents_LED, errors_voltages_LED, errors_currents_LED
+        )
+        figure.savefig("scan.png")
+        print("Figure saved to scan.png")
+        return
+
+    import matplotlib.pyplot as plt
 
-    plt.errorbar(
-        voltages_LED,
-        currents_LED,
-        xerr=errors_voltages_LED,
-        yerr=errors_currents_LED,
-        ecolor="red",
-        fmt="o",
-        markersize=4,
+    draw_scan(
+        plt.gca(), voltages_LED, currents_LED, errors_voltages_LED, errors_currents_LED
     )
-    plt.title("I-U diagram of LED")
-    plt.xlabel("Voltage U (V)")
-    plt.ylabel("Current I (Amp)")
     plt.show()
 
 
@@ -0,0 +1,25 @@
+import pytest
+
+from pythondaq import calibration, simulated_device
+from pythondaq.arduino_device import device_pool
+from pythondaq.simulated_device import SIMULATED_PORT, enable_simulation
+
+
+@pytest.fixture(autouse=True)
+def simulator(monkeypatch):
+    """Enable a reproducible simulated Arduino, without touching the stored calibrations."""
+    monkeypatch.setattr(simulated_device, "_settings", dict(simulated_device._settings))
+    monkeypatch.setattr(
+        calibration, "calibration_store", calibration.CalibrationStore()
+    )
+    enable_simulation(noise=2.0, seed=42)
+    yield SIMULATED_PORT
+    device_pool.close_all()
+
+
+@pytest.fixture
+def experiment(simulator):
+    """DiodeExperiment on the simulated Arduino that reports progress silently."""
+    from pythondaq.diode_experiment import DiodeExperiment
+
+    return DiodeExperiment(simulator, progress=lambda completed, total: None)
@@ -0,0 +1,119 @@
+import os
+import shutil
+
+import pytest
+
+from pythondaq import analysis
+from pythondaq.analysis import CACHE_FILENAME, analyze_directory, write_summary
+from pythondaq.data_writer import ScanWriter
+
+
+@pytest.fixture
+def scans(tmp_path, experiment):
+    """Directory with two saved scans of the simulated LED."""
+    for name, start in (("first.csv", 500), ("second.csv", 600)):
+        with ScanWriter(str(tmp_path / name)) as writer:
+            experiment.scan(start, 1023, 3, writer=writer)
+    return tmp_path
+
+
+@pytest.fixture
+def fitted(monkeypatch):
+    """Paths of the files that are fitted, instead of taken from the cache."""
+    paths = []
+    analyze_file = analysis.analyze_file
+
+    def counting_analyze_file(filepath, fit_ideality=False, temperature=300):
+        paths.append(os.path.basename(filepath))
+        return analyze_file(filepath, fit_ideality, temperature)
+
+    monkeypatch.setattr(analysis, "analyze_file", counting_analyze_file)
+    return paths
+
+
+def test_unchanged_files_come_from_cache(scans, fitted):
+    """A second analysis takes every fit from the cache."""
+    summary, new = analyze_directory(str(scans), workers=1)
+    assert new == 2
+    assert [row["file"] for row in summary] == ["first.csv", "second.csv"]
+    assert all(row["success"] for row in summary)
+    assert os.path.isfile(scans / CACHE_FILENAME)
+
+    cached, new = analyze_directory(str(scans), workers=1)
+    assert new == 0
+    assert cached == summary
+    assert fitted == ["first.csv", "second.csv"]
+
+
+def test_changed_settings_and_files_are_fitted_again(scans, fitted, experiment):
+    """Other fit settings, and a changed file, are not taken from the cache."""
+    analyze_directory(str(scans), workers=1)
+
+    _, new = analyze_directory(str(scans), fit_ideality=True, workers=1)
+    assert new == 2
+
+    with ScanWriter(str(scans / "second.csv")) as writer:
+        experiment.scan(700, 1023, 3, writer=writer)
+    summary, new = analyze_directory(str(scans), workers=1)
+    assert new == 1
+    assert fitted[-1] == "second.csv"
+    assert summary[1]["points"] == 324
+
+
+def test_copied_file_keeps_its_fit(scans, fitted):
+    """A copy of a fitted file has the same content, so it is not fitted again."""
+    analyze_directory(str(scans), workers=1)
+    shutil.copy(scans / "first.csv", scans / "copy.csv")
+
+    summary, new = analyze_directory(str(scans), workers=1)
+    assert new == 0
+    assert summary[0]["I_s (A)"] == summary[1]["I_s (A)"]
+
+
+def test_failures(scans, fitted, monkeypatch):
+    """A file that cannot be fitted is cached, one that cannot be read is not."""
+    (scans / "broken.csv").write_text("I (A),U (V)\n")
+    summary, new = analyze_directory(str(scans), workers=1)
+    assert new == 3
+    assert summary[0]["file"] == "broken.csv"
+    assert summary[0]["success"] is False
+    _, new = analyze_directory(str(scans), workers=1)
+    assert new == 0
+
+    counting_analyze_file = analysis.analyze_file
+
+    def unreadable(filepath, fit_ideality=False, temperature=300):
+        raise PermissionError(f"Cannot read {filepath}")
+
+    monkeypatch.setattr(analysis, "analyze_file", unreadable)
+    (scans / "third.csv").write_bytes((scans / "first.csv").read_bytes() + b"\n")
+    summary, new = analyze_directory(str(scans), workers=1)
+    assert new == 1
+    assert summary[-1]["success"] is False
+    assert "Cannot read" in summary[-1]["error"]
+
+    # Reading works again, and the file is fitted now
+    monkeypatch.setattr(analysis, "analyze_file", counting_analyze_file)
+    summary, new = analyze_directory(str(scans), workers=1)
+    assert new == 1
+    assert summary[-1]["success"]
+
+
+def test_summary_is_not_analyzed(scans, fitted):
+    """A summary written into the analyzed directory is not taken for a scan."""
+    summary, _ = analyze_directory(str(scans), workers=1)
+    summary_path = str(scans / "summary.csv")
+    write_summary(summary, summary_path)
+
+    summary, new = analyze_directory(str(scans), workers=1, summary_path=summary_path)
+    assert new == 0
+    assert [row["file"] for row in summary] == ["first.csv", "second.csv"]
+
+
+def test_worker_processes(scans):
+    """Fits in worker processes give the same rows as in this process."""
+    in_process, _ = analyze_directory(str(scans), workers=1)
+    os.remove(scans / CACHE_FILENAME)
+    in_workers, new = analyze_directory(str(scans), workers=2)
+    assert new == 2
+    assert in_workers == in_process
@@ -0,0 +1,61 @@
+import os
+
+from pythondaq.catalog import CATALOG_FILENAME, RunCatalog
+
+
+def test_first_run_keeps_name(tmp_path):
+    """The first run with a name is saved as name.csv, later ones as name(id).csv."""
+    catalog = RunCatalog(str(tmp_path))
+    assert os.path.isfile(tmp_path / CATALOG_FILENAME)
+
+    first_id, first_path = catalog.add_run("scan")
+    second_id, second_path = catalog.add_run("scan")
+    other_id, other_path = catalog.add_run("other")
+
+    assert first_path == str(tmp_path / "scan.csv")
+    assert second_path == str(tmp_path / f"scan({second_id}).csv")
+    assert other_path == str(tmp_path / "other.csv")
+    assert len({first_id, second_id, other_id}) == 3
+
+
+def test_existing_files_are_not_overwritten(tmp_path):
+    """Files saved before the catalog, and .partial files, keep their names free."""
+    (tmp_path / "scan.csv").write_text("")
+    (tmp_path / "scan(1).csv.partial").write_text("")
+    catalog = RunCatalog(str(tmp_path))
+
+    run_id, filepath = catalog.add_run("scan")
+    assert run_id == 1
+    assert filepath == str(tmp_path / "scan(1-1).csv")
+
+
+def test_chosen_path_is_kept(tmp_path):
+    """A path chosen by the user is registered as it is."""
+    catalog = RunCatalog(str(tmp_path))
+    filepath = str(tmp_path / "chosen.csv")
+    run_id, path = catalog.add_run("scan", filepath=filepath)
+    assert path == filepath
+    assert catalog.get_run(run_id)["path"] == os.path.abspath(filepath)
+
+
+def test_run_status(tmp_path):
+    """Runs are listed newest first and filtered on port and status."""
+    catalog = RunCatalog(str(tmp_path))
+    first_id, _ = catalog.add_run(
+        "scan", "SIM::ARDUINO::INSTR", "simulated", {"start": 0, "stop": 10}
+    )
+    second_id, _ = catalog.add_run("scan", "ASRL3::INSTR")
+    catalog.finish_run(first_id, "interrupted", 4)
+
+    run = catalog.get_run(first_id)
+    assert run["status"] == "interrupted"
+    assert run["points"] == 4
+    assert run["parameters"] == {"start": 0, "stop": 10}
+    assert [run["id"] for run in catalog.runs()] == [second_id, first_id]
+    assert [run["id"] for run in catalog.runs(port="SIM")] == [first_id]
+    assert [run["id"] for run in catalog.runs(status="running")] == [second_id]
+
+    catalog.resume_run(first_id)
+    assert catalog.get_run(first_id)["status"] == "running"
+    assert catalog.get_run(first_id)["finished"] is None
+    assert catalog.get_run(999) is None
@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+import pytest
+
+from pythondaq.data_writer import (
+    COLUMNS,
+    SUMMARY_FILENAME,
+    VIEW_COLUMNS,
+    ScanWriter,
+    list_scans,
+    read_metadata,
+    read_points,
+)
+
+
+def test_finalize_renames_partial_file(tmp_path, experiment):
+    """Points go to the .partial file during the scan, which becomes the final file at the end."""
+    filepath = str(tmp_path / "scan.csv")
+    writer = ScanWriter(filepath, {"port": experiment.port})
+    assert os.path.isfile(writer.partial_path)
+    assert not os.path.exists(filepath)
+
+    result = experiment.scan(600, 620, 3, writer=writer)
+    assert writer.rows == 21
+    assert not os.path.exists(filepath)
+
+    writer.finalize()
+    assert os.path.isfile(filepath)
+    assert not os.path.exists(writer.partial_path)
+    assert read_metadata(filepath) == {"port": experiment.port}
+
+    voltages, currents, errors_voltages, errors_currents, counts = read_points(filepath)
+    np.testing.assert_allclose(voltages, result.voltages)
+    np.testing.assert_allclose(currents, result.currents)
+    np.testing.assert_allclose(errors_voltages, result.errors_voltages)
+    np.testing.assert_allclose(errors_currents, result.errors_currents)
+    assert counts.tolist() == [3] * 21
+
+
+def test_abort_keeps_partial_file(tmp_path, experiment):
+    """An interrupted scan leaves its points in the .partial file and no final file."""
+    filepath = str(tmp_path / "scan.csv")
+    with pytest.raises(KeyboardInterrupt):
+        with ScanWriter(filepath) as writer:
+            for index, point in enumerate(
+                experiment.iter_scan(600, 700, 2, writer=writer)
+            ):
+                if index == 9:
+                    raise KeyboardInterrupt
+
+    assert not os.path.exists(filepath)
+    voltages, *_ = read_points(writer.partial_path)
+    assert len(voltages) == 10
+
+    # Closing again does nothing, the .partial file stays
+    writer.abort()
+    writer.finalize()
+    assert not os.path.exists(filepath)
+
+
+def test_sort_by_output_value(tmp_path):
+    """sort orders the written points by ADC output value, keeping equal values in written order."""
+    filepath = str(tmp_path / "scan.csv")
+    writer = ScanWriter(filepath, {"adaptive": True})
+    for point in range(4):
+        writer.write_point(point, 10 * point, 0.1, 0.01, 1)
+    writer.sort([30, 10, 20, 10])
+    writer.finalize()
+
+    assert read_metadata(filepath) == {"adaptive": "True"}
+    voltages, currents, *_ = read_points(filepath)
+    assert voltages.tolist() == [1, 3, 2, 0]
+    assert currents.tolist() == [10, 30, 20, 0]
+
+    writer = ScanWriter(str(tmp_path / "other.csv"))
+    writer.write_point(0, 0, 0, 0, 1)
+    with pytest.raises(ValueError):
+        writer.sort([1, 2])
+    writer.abort()
+
+
+def test_read_points_columns(tmp_path):
+    """Files without N column, and the files of view.py, are read too."""
+    filepath = str(tmp_path / "view.csv")
+    writer = ScanWriter(filepath, counts=False, columns=VIEW_COLUMNS)
+    writer.write_point(1.5, 0.01, 0.1, 0.001)
+    writer.finalize()
+    voltages, currents, errors_voltages, errors_currents, counts = read_points(filepath)
+    assert (voltages[0], currents[0], errors_voltages[0], errors_currents[0]) == (
+        1.5,
+        0.01,
+        0.1,
+        0.001,
+    )
+    assert counts is None
+
+    filepath = str(tmp_path / "other.csv")
+    with open(filepath, "w") as csvfile:
+        csvfile.write("a,b\n1,2\n")
+    with pytest.raises(ValueError):
+        read_points(filepath)
+
+
+def test_list_scans(tmp_path):
+    """The summary tables are not listed as scans."""
+    for name in ("b.csv", "a.csv", SUMMARY_FILENAME, "summary.csv", "c.csv.partial"):
+        (tmp_path / name).write_text(",".join(COLUMNS) + "\n")
+
+    scans = list_scans(str(tmp_path), [str(tmp_path / "summary.csv")])
+    assert [os.path.basename(filepath) for filepath in scans] == ["a.csv", "b.csv"]
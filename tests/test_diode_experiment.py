@@ -0,0 +1,108 @@
+import time
+
+import numpy as np
+import pytest
+
+from pythondaq.data_writer import ScanWriter, read_points
+from pythondaq.diode_experiment import adaptive_scan_size
+from pythondaq.monitor import MonitorBuffer
+
+
+def test_adaptive_scan_within_budget(experiment):
+    """An adaptive scan measures budget distinct values, sorted, including both ends."""
+    result = experiment.adaptive_scan(0, 1023, 2, budget=60, coarse_step=64)
+
+    assert len(result) == 60
+    values = result.values[: result.completed]
+    assert values[0] == 0 and values[-1] == 1023
+    assert np.all(np.diff(values) > 0)
+    assert result.counts[: result.completed].tolist() == [2] * 60
+
+    # The refined points are where the current rises, above the knee of the LED
+    refined = np.setdiff1d(values, np.arange(0, 1024, 64))
+    assert np.median(refined) > 512
+
+
+def test_adaptive_scan_budget_above_range(experiment):
+    """A budget larger than the range measures every value exactly once."""
+    result = experiment.adaptive_scan(600, 620, 2, budget=100, coarse_step=8)
+    assert result.values[: result.completed].tolist() == list(range(600, 621))
+
+
+def test_adaptive_scan_budget_below_coarse_pass(experiment):
+    """The coarse pass is always measured completely, even when it exceeds the budget."""
+    rows = adaptive_scan_size(0, 100, 3, 10)
+    assert rows == 12
+    result = experiment.adaptive_scan(0, 100, 1, budget=3, coarse_step=10)
+    assert result.values[: result.completed].tolist() == list(range(0, 101, 10))
+
+
+def test_adaptive_scan_single_value(experiment):
+    """A scan with equal start and stop measures that value once."""
+    result = experiment.adaptive_scan(700, 700, 3, budget=10, coarse_step=32)
+    assert result.values[: result.completed].tolist() == [700]
+
+
+def test_adaptive_scan_start_above_stop(experiment):
+    """A start above the stop is refused before anything is measured."""
+    with pytest.raises(ValueError):
+        experiment.adaptive_scan(700, 600, 3, budget=10)
+
+
+def test_adaptive_scan_writer_is_sorted(tmp_path, experiment):
+    """The points written during an adaptive scan end up in the order of the result."""
+    filepath = str(tmp_path / "adaptive.csv")
+    with ScanWriter(filepath) as writer:
+        result = experiment.adaptive_scan(0, 1023, 1, 30, 128, writer=writer)
+    voltages, currents, *_ = read_points(filepath)
+    np.testing.assert_allclose(voltages, result.voltages[: result.completed])
+    np.testing.assert_allclose(currents, result.currents[: result.completed])
+
+
+def test_monitor_sweeps(experiment):
+    """Every sweep is added to the buffer, and no sweep is measured after the last one."""
+    buffer = MonitorBuffer(range(600, 611, 5), capacity=4, chunk_size=2)
+    started = time.monotonic()
+    sweeps = [
+        timestamp
+        for timestamp, result in experiment.monitor(
+            600, 610, 2, 0.3, buffer, step=5, sweeps=3
+        )
+    ]
+    elapsed = time.monotonic() - started
+
+    assert len(sweeps) == 3 and buffer.sweeps == 3
+    # Two waits between three sweeps, none after the last
+    assert 0.6 <= elapsed < 0.85
+    times, points, counts = buffer.recent()
+    assert times.tolist() == sweeps
+    assert counts.tolist() == [[2, 2, 2]] * 3
+    assert experiment.arduino.get_output_value() == "0"
+
+
+def test_monitor_single_sweep_does_not_wait(experiment):
+    """A single sweep returns without waiting for the interval."""
+    started = time.monotonic()
+    sweeps = list(experiment.monitor(650, 650, 2, 60, sweeps=1))
+    assert time.monotonic() - started < 5
+    assert len(sweeps) == 1
+    assert sweeps[0][1].values.tolist() == [650]
+
+
+def test_monitor_without_sweeps(experiment):
+    """Zero sweeps measure nothing."""
+    assert list(experiment.monitor(600, 610, 2, 0.1, sweeps=0)) == []
+
+
+def test_monitor_duration(experiment):
+    """A duration stops after the last sweep that starts within it."""
+    sweeps = list(experiment.monitor(600, 600, 1, 0.1, duration=0.25))
+    assert len(sweeps) == 3
+
+
+def test_monitor_stopped_early_turns_output_off(experiment):
+    """Stopping the consumer turns the output off."""
+    for _ in experiment.monitor(700, 700, 1, 0.01):
+        assert experiment.arduino.get_output_value() == "700"
+        break
+    assert experiment.arduino.get_output_value() == "0"
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from pythondaq.fitting import (
+    BOLTZMANN_CONSTANT,
+    ELEMENTARY_CHARGE,
+    FitError,
+    fit_scan,
+    fit_shockley,
+    shockley_current,
+)
+from pythondaq.simulated_device import LEDCircuit
+
+# Temperature at which kT/q is the thermal voltage of the simulated LED
+TEMPERATURE = 0.02585 * ELEMENTARY_CHARGE / BOLTZMANN_CONSTANT
+
+
+def circuit_data(circuit, supply_voltages):
+    """Voltages over and currents through the LED of a circuit, without noise."""
+    points = np.array([circuit.solve(voltage) for voltage in supply_voltages])
+    return points[:, 0], points[:, 1]
+
+
+def test_recovers_simulated_led():
+    """Fitting n at the right temperature recovers I_s and n of the simulated LED."""
+    circuit = LEDCircuit()
+    voltages, currents = circuit_data(circuit, np.linspace(1.5, 3.3, 60))
+
+    fit = fit_shockley(voltages, currents, fit_ideality=True, temperature=TEMPERATURE)
+    assert fit.success
+    assert fit.ideality == pytest.approx(circuit.ideality, rel=1e-4)
+    assert fit.saturation_current == pytest.approx(circuit.saturation_current, rel=1e-3)
+    assert fit.thermal_voltage == pytest.approx(circuit.thermal_voltage)
+    np.testing.assert_allclose(fit.currents(voltages), currents, rtol=1e-3, atol=1e-9)
+
+
+def test_thermal_voltage_without_ideality():
+    """Without fit_ideality the product n * V_t is reported as V_t."""
+    circuit = LEDCircuit(saturation_current=1e-12, ideality=1.0)
+    voltages, currents = circuit_data(circuit, np.linspace(0.3, 3.3, 60))
+
+    fit = fit_shockley(voltages, currents)
+    assert fit.ideality == 1.0
+    assert fit.thermal_voltage == pytest.approx(0.02585, rel=1e-4)
+    assert fit.saturation_current == pytest.approx(1e-12, rel=1e-3)
+    assert fit.boltzmann_constant(TEMPERATURE) == pytest.approx(
+        BOLTZMANN_CONSTANT, rel=1e-4
+    )
+
+
+def test_weighted_noisy_data():
+    """Weighing by the standard errors still finds the parameters in noisy data."""
+    random = np.random.default_rng(3)
+    voltages = np.linspace(0.4, 0.7, 40)
+    currents = shockley_current(voltages, np.log(1e-10), 1 / (1.5 * 0.02585))
+    errors_currents = 0.01 * currents + 1e-9
+    noisy = currents + random.normal(0, errors_currents)
+
+    fit = fit_shockley(voltages, noisy, errors_currents)
+    assert fit.thermal_voltage == pytest.approx(1.5 * 0.02585, rel=0.02)
+    assert fit.errors["thermal_voltage"] > 0
+    assert fit.reduced_chi_square == pytest.approx(1, abs=0.6)
+
+
+def test_simulated_scan(experiment):
+    """A scan of the simulated LED fits close to the parameters of the simulation."""
+    result = experiment.scan(500, 1023, 10)
+    fit = fit_scan(result, fit_ideality=True, temperature=TEMPERATURE)
+    assert fit.ideality == pytest.approx(2.0, rel=0.1)
+
+
+def test_too_few_points():
+    """Fewer than 3 valid points cannot be fitted."""
+    with pytest.raises(FitError):
+        fit_shockley([0.5, 0.6, np.nan], [1e-3, 2e-3, 3e-3])
@@ -0,0 +1,112 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from pythondaq.catalog import RunCatalog
+from pythondaq.cli import resume_scan, scan_device
+from pythondaq.data_writer import read_points
+from pythondaq.diode_experiment import ScanCancelled
+from pythondaq.journal import ScanJournal, journal_path
+
+OPTIONS = {
+    "adaptive": False,
+    "budget": None,
+    "coarse_step": None,
+    "max_repeats": None,
+    "target_sem_voltage": None,
+    "target_sem_current": None,
+    "raw": None,
+}
+
+
+def interrupted_scan(port, directory, steps):
+    """Run 'diode scan' on port and cancel it after steps steps.
+
+    Returns:
+        dict: the interrupted run from the catalog
+    """
+    cancel = threading.Event()
+
+    def progress(completed, total):
+        if completed == steps:
+            cancel.set()
+
+    with pytest.raises(ScanCancelled):
+        scan_device(
+            port, 600, 700, 3, OPTIONS, "scan", directory, False, progress, cancel
+        )
+    (run,) = RunCatalog(directory).runs()
+    return run
+
+
+def test_resume_interrupted_scan(tmp_path, simulator):
+    """A resumed scan continues after the journaled steps and ends with every point."""
+    directory = str(tmp_path)
+    run = interrupted_scan(simulator, directory, 10)
+    assert run["status"] == "interrupted"
+    assert not os.path.exists(run["path"])
+    partial = read_points(f"{run['path']}.partial")
+    steps = len(partial[0])
+    assert run["points"] == steps
+    assert ScanJournal.resume(journal_path(run["path"])).steps == steps
+
+    result = resume_scan(run["id"], None, directory, keep_data=True)
+
+    run = RunCatalog(directory).get_run(run["id"])
+    assert run["status"] == "complete"
+    assert run["points"] == 101
+    assert not os.path.exists(f"{run['path']}.partial")
+    assert not os.path.exists(journal_path(run["path"]))
+
+    # The points measured before the interruption are kept as they were
+    voltages, currents, errors_voltages, errors_currents, counts = read_points(
+        run["path"]
+    )
+    assert len(voltages) == 101
+    measured = (voltages, currents, errors_voltages, errors_currents)
+    for before, after in zip(partial[:4], measured):
+        np.testing.assert_allclose(after[:steps], before)
+    np.testing.assert_allclose(voltages, result.voltages)
+    assert result.values.tolist() == list(range(600, 701))
+    assert counts.tolist() == [3] * 101
+
+
+def test_complete_run_cannot_be_resumed(tmp_path, simulator):
+    """Resuming a complete run is refused."""
+    import click
+
+    directory = str(tmp_path)
+    scan_device(simulator, 600, 610, 2, OPTIONS, "scan", directory, False)
+    (run,) = RunCatalog(directory).runs()
+    with pytest.raises(click.ClickException):
+        resume_scan(run["id"], None, directory, keep_data=False)
+
+
+def test_partly_written_row_is_dropped(tmp_path, experiment):
+    """A row that was cut off when the scan died is dropped on resume."""
+    path = str(tmp_path / "scan.csv.journal")
+    journal = ScanJournal(path, 3)
+    for index, _ in enumerate(experiment.iter_scan(600, 610, 3, journal=journal)):
+        if index == 4:
+            break
+    journal.close()
+    with open(path, "ab") as journal_file:
+        journal_file.write(b"\0" * 7)
+
+    journal = ScanJournal.resume(path)
+    assert journal.steps == 5
+    completed = journal.result()
+    assert completed.values.tolist() == [600, 601, 602, 603, 604]
+    assert completed.counts.tolist() == [3] * 5
+    journal.remove()
+    assert not os.path.exists(path)
+
+
+def test_not_a_journal(tmp_path):
+    """Other files are not resumed."""
+    path = tmp_path / "scan.csv.journal"
+    path.write_text("I (A),U (V)\n")
+    with pytest.raises(ValueError):
+        ScanJournal.resume(str(path))
@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+
+from pythondaq.arduino_device import ArduinoVisaDevice
+from pythondaq.scan_result import RunningStatistics, ScanResult
+
+
+def baseline_scan(arduino, start, stop, repeats):
+    """Measure like the original per-step loop of DiodeExperiment.scan.
+
+    Returns:
+        tuple: raw voltages of channel 1 and 2 per step, and the means and errors the loop calculated
+    """
+    channel_1, channel_2 = [], []
+    voltages, currents, errors_voltages, errors_currents = [], [], [], []
+    for voltage in range(start, stop + 1):
+        arduino.set_output_value(value=voltage)
+        voltage_LED_list, current_LED_list = [], []
+        step_1, step_2 = [], []
+        for _ in range(repeats):
+            voltage_resistor = float(arduino.get_input_voltage(channel=2))
+            voltage_channel_1 = float(arduino.get_input_voltage(channel=1))
+            step_1.append(voltage_channel_1)
+            step_2.append(voltage_resistor)
+            voltage_LED_list.append(voltage_channel_1 - voltage_resistor)
+            current_LED_list.append(voltage_resistor / 220)
+        channel_1.append(step_1)
+        channel_2.append(step_2)
+
+        voltage_LED_array = np.array(voltage_LED_list)
+        current_LED_array = np.array(current_LED_list)
+        voltages.append(float(np.mean(voltage_LED_array)))
+        currents.append(float(np.mean(current_LED_array)))
+        errors_voltages.append(float(np.std(voltage_LED_array) / np.sqrt(repeats)))
+        errors_currents.append(float(np.std(current_LED_array) / np.sqrt(repeats)))
+    arduino.set_output_value(value=0)
+    return channel_1, channel_2, (voltages, currents, errors_voltages, errors_currents)
+
+
+@pytest.fixture
+def measured(simulator):
+    """Raw measurements and statistics of a baseline scan on the simulator."""
+    arduino = ArduinoVisaDevice(simulator)
+    try:
+        yield baseline_scan(arduino, 600, 700, 5)
+    finally:
+        arduino.close()
+
+
+def test_scan_result_matches_baseline(measured):
+    """The vectorized statistics equal those of the per-step loop."""
+    channel_1, channel_2, expected = measured
+    result = ScanResult(range(600, 701), 5)
+    for index in range(len(channel_1)):
+        result.record(index, channel_1[index], channel_2[index])
+    result.compute_statistics()
+
+    assert len(result) == 101
+    for actual, wanted in zip(result, expected):
+        np.testing.assert_allclose(actual, wanted, rtol=1e-12, atol=1e-15)
+
+
+def test_scan_result_statistics_per_step(measured):
+    """Calculating the statistics one step at a time gives the same result as in one pass."""
+    channel_1, channel_2, expected = measured
+    result = ScanResult(range(600, 701), 5)
+    for index in range(len(channel_1)):
+        result.record(index, channel_1[index], channel_2[index])
+        result.compute_statistics(index, index + 1)
+
+    for actual, wanted in zip(result, expected):
+        np.testing.assert_allclose(actual, wanted, rtol=1e-12, atol=1e-15)
+
+
+def test_scan_result_fewer_repeats(measured):
+    """Steps with fewer measurements than repeats ignore the unused entries."""
+    channel_1, channel_2, _ = measured
+    result = ScanResult(range(600, 602), 5)
+    result.record(0, channel_1[0], channel_2[0])
+    result.record(1, channel_1[1][:3], channel_2[1][:3])
+    result.compute_statistics()
+
+    voltage_LED = np.array(channel_1[1][:3]) - np.array(channel_2[1][:3])
+    assert result.counts.tolist() == [5, 3]
+    assert result.voltages[1] == pytest.approx(np.mean(voltage_LED))
+    assert result.errors_voltages[1] == pytest.approx(np.std(voltage_LED) / np.sqrt(3))
+
+
+def test_running_statistics_matches_baseline(measured):
+    """Adding the measurements of a step in batches gives the mean and SEM of the loop."""
+    channel_1, channel_2, expected = measured
+    voltages, currents, errors_voltages, errors_currents = expected
+    for index in range(len(channel_1)):
+        voltage_LED = np.array(channel_1[index]) - np.array(channel_2[index])
+        statistics = RunningStatistics()
+        statistics.add(voltage_LED[:2])
+        statistics.add([])
+        statistics.add(voltage_LED[2:])
+
+        assert statistics.count == 5
+        assert statistics.mean == pytest.approx(voltages[index], rel=1e-12)
+        assert statistics.sem() == pytest.approx(
+            errors_voltages[index], rel=1e-9, abs=1e-15
+        )
+
+
+def test_running_statistics_without_samples():
+    """Without samples the standard error is infinite."""
+    assert RunningStatistics().sem() == np.inf
+
+
+def test_experiment_scan_matches_baseline(experiment):
+    """DiodeExperiment.scan calculates the statistics of its raw measurements like the loop did."""
+    result = experiment.scan(600, 650, 4)
+
+    voltage_LED = result.channel_1 - result.channel_2
+    current_LED = result.channel_2 / 220
+    voltages, currents, errors_voltages, errors_currents = result
+    np.testing.assert_allclose(voltages, voltage_LED.mean(axis=1))
+    np.testing.assert_allclose(currents, current_LED.mean(axis=1))
+    np.testing.assert_allclose(errors_voltages, voltage_LED.std(axis=1) / 2)
+    np.testing.assert_allclose(errors_currents, current_LED.std(axis=1) / 2)
+    assert result.values.tolist() == list(range(600, 651))